@@ -1,3 +1,4 @@
+import re
 from airflow.plugins_manager import AirflowPlugin
 from flask import Blueprint, request
 from flask_appbuilder import expose, BaseView as AppBuilderBaseView
@@ -26,10 +27,26 @@ def update_dag(old_pipeline, new_pipeline, dag):
         f.write(content)
 
 
+def tag_dag(dag):
+    """Adds the owner tag of the template to a DAG generated before it, returns False if it is already tagged"""
+    with open(f"dags/{dag}.py", "r") as f:
+        content = f.read()
+    owner = re.search(r'"owner": "([^"]*)"', content)
+    declaration = re.search(r"^with DAG\(.*\) as dag:$", content, re.MULTILINE)
+    if owner is None or declaration is None:
+        raise ValueError(f"{dag} was not generated by the factory")
+    if "tags=" in declaration.group(0):
+        return False
+    tagged = declaration.group(0)[:-len(") as dag:")] + f', tags=["owner:{owner.group(1)}"]) as dag:'
+    with open(f"dags/{dag}.py", "w") as f:
+        f.write(content[:declaration.start()] + tagged + content[declaration.end():])
+    return True
+
+
 class Factory(AppBuilderBaseView):
     default_view = "factory"
 
-    @expose("/", methods=["GET", "POST", "PUT"])
+    @expose("/", methods=["GET", "POST", "PUT", "PATCH"])
     @csrf.exempt
     def factory(self):
         if request.method == "POST":
@@ -50,6 +67,14 @@ class Factory(AppBuilderBaseView):
             except:
                 return Response(status=502)
 
+        elif request.method == "PATCH":
+            try:
+                return Response(status=201 if tag_dag(request.json["dag"]) else 200)
+            except (FileNotFoundError, ValueError):
+                return Response(status=404)
+            except:
+                return Response(status=502)
+
 
 v_appbuilder_view = Factory()
 v_appbuilder_package = {"view": v_appbuilder_view}
@@ -9,7 +9,7 @@ from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from datetime import datetime
 from utils.filename import gen_filename
-from utils.minio import client
+from utils.minio import client, list_objects_page
 from utils.keycloak_auth import get_current_user_id
 from rest_framework.parsers import MultiPartParser
 from django.core.cache import cache
@@ -18,7 +18,7 @@ import logging
 import requests
 from core.keycloak_impersonation import get_auth_token
 from django.http import StreamingHttpResponse, HttpResponseBadRequest, HttpResponseNotFound, HttpResponseServerError
-import pyclamd
+from utils.clamav import file_sha256, scanner
 import smtplib
 from email.mime.text import MIMEText
 from jinja2 import Template
@@ -34,6 +34,7 @@ from utils.keycloak_auth import get_keycloak_admin
 from django.conf import settings
 from django.http import HttpResponseBadRequest, HttpResponseServerError, HttpResponseNotFound
 from utils.keycloak_auth import get_current_user_id, get_keycloak_admin
+from utils.keycloak_roles import get_user_roles, invalidate_user_roles, user_has_role
 
 
 def homepage():
@@ -44,15 +45,8 @@ def has_admin_role(request):
     Check if the current user has admin rights
     """
     try:
-        keycloak_admin = get_keycloak_admin()
-        user_id = get_current_user_id(request)
-        client_id = keycloak_admin.get_client_id(settings.KEYCLOAK_CONFIG['KEYCLOAK_CLIENT_ID'])
-        client_roles = keycloak_admin.get_client_roles_of_user(user_id=user_id, client_id=client_id)
-        realm_roles = keycloak_admin.get_realm_roles_of_user(user_id=user_id)
-        all_roles = client_roles + realm_roles
         admin_roles = ['Administrator']
-        has_role = any(role['name'] in admin_roles for role in all_roles)
-        return has_role
+        return user_has_role(request, admin_roles)
     except Exception as err:
         return False
 
@@ -133,6 +127,7 @@ class UserListView(APIView):
             role = request.data.get("role", {})
             client_id = keycloak_admin.get_client_id(settings.KEYCLOAK_CONFIG['KEYCLOAK_CLIENT_ID'])
             keycloak_admin.assign_realm_roles(user_id=user_id, roles=[role])
+            invalidate_user_roles(user_id)
 
             user = {
                 "id": user_id,
@@ -188,9 +183,7 @@ class UserDetailView(APIView):
         try:
             keycloak_admin = get_keycloak_admin()
             user = keycloak_admin.get_user(kwargs['id'])
-            client_id = keycloak_admin.get_client_id(settings.KEYCLOAK_CONFIG['KEYCLOAK_CLIENT_ID'])
-            roles = keycloak_admin.get_client_roles_of_user(user_id=kwargs['id'], client_id=client_id)
-            user["roles"] = roles
+            user["roles"] = get_user_roles(kwargs['id'])['client']
             return Response(user, status=status.HTTP_200_OK)
         except Exception as err:
             return Response({'errorMessage': 'Unable to retrieve the user'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -296,6 +289,7 @@ class UserRolesView(APIView):
             roles = request.data.get("roles", [self.roleObject])
             client_id = keycloak_admin.get_client_id(settings.KEYCLOAK_CONFIG['KEYCLOAK_CLIENT_ID'])
             keycloak_admin.assign_client_role(client_id=client_id, user_id=kwargs['id'], roles=roles)
+            invalidate_user_roles(kwargs['id'])
             return Response({'message': 'Roles has been assigned successfully'}, status=status.HTTP_200_OK)
         except Exception as err:
             return Response({'errorMessage': 'Unable to assign roles to the user'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -305,9 +299,7 @@ class UserRolesView(APIView):
         Endpoint for listing the roles of a user 
         """
         try:
-            keycloak_admin = get_keycloak_admin()
-            client_id = keycloak_admin.get_client_id(settings.KEYCLOAK_CONFIG['KEYCLOAK_CLIENT_ID'])
-            roles = keycloak_admin.get_client_roles_of_user(user_id=kwargs['id'], client_id=client_id)
+            roles = get_user_roles(kwargs['id'])['client']
             return Response(roles, status=status.HTTP_200_OK)
         except Exception as err:
             return Response({'errorMessage': 'Unable to retrieve the user roles'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -340,9 +332,9 @@ class UserAvatarView(APIView):
 
             bucket_name = 'avatars'
             prefix = f'{user_id}/'
-            objects = client.list_objects(bucket_name, prefix=prefix)
+            objects, _ = list_objects_page(bucket_name, prefix=prefix, limit=1)
 
-            first_object = next(objects, None)
+            first_object = objects[0] if objects else None
             if not first_object:
                 return HttpResponseNotFound("Avatar not found.")
 
@@ -374,17 +366,15 @@ class UserAvatarView(APIView):
             return HttpResponseBadRequest("Bad request: User ID parameter is missing.")
 
         uploaded_file = request.FILES.get("uploadedFile")
+        if not uploaded_file:
+            return HttpResponseBadRequest("No file uploaded.")
 
-        cd = pyclamd.ClamdNetworkSocket(host="clamav", port=3310)
-        scan_result = cd.scan_stream(uploaded_file.read())
+        scan_result = scanner.scan_file(uploaded_file, sha256=file_sha256(uploaded_file))
         if scan_result is not None:
             logging.error(f"Malicious File Upload in Avatar : {scan_result}")
             return Response({'errorMessage': f'Malicious File Upload: {scan_result}'}, status=status.HTTP_400_BAD_REQUEST)
-        # seeking to 0 in the uploaded_file because scan_stream does not release the pointer 
         uploaded_file.seek(0)
 
-        if not uploaded_file:
-            return HttpResponseBadRequest("No file uploaded.")
         try:
             keycloak_admin = get_keycloak_admin()
             # Fetch the current user data to preserve existing attributes
@@ -37,6 +37,8 @@ urlpatterns = [
     # ---------------------- API Role Endpoints --------------------------
     path("role/", role_view.RoleApiView.as_view()),  # create role
     path("role/<str:name>/update", role_view.RoleApiView.as_view()),  # get role
+    path("role/policy/reload", role_view.AuthorizationPolicyApiView.as_view()),  # reload authorization policy
+    path("role/stats", role_view.StatsApiView.as_view()),  # cache and antivirus scan statistics
     # ---------------------- API Superset Endpoints --------------------------
     path("superset/list/", superset_view.ListDashboardsAPI.as_view()),  # list dashboards
         path("superset/list/<str:query>", superset_view.ListDashboardsAPI.as_view()),  # list dashboards
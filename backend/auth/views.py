@@ -22,6 +22,9 @@ from cryptography.hazmat.primitives import padding
 from cryptography.hazmat.backends import default_backend
 from base64 import b64decode
 from binascii import unhexlify
+from core.authz_policy import get_client_roles, policy_store
+from core.permission_cache import permission_cache
+from core.keycloak_impersonation import end_impersonation_session
 from utils.env_configs import (
     BASE_URL, APP_SECRET_KEY, APP_REALM, REST_REDIRECT_URI)
 
@@ -89,9 +92,14 @@ class Logout (APIView):
 
         response = requests.post(f"{BASE_URL}/realms/{APP_REALM}/protocol/openid-connect/logout",
                             data=form_data)
+        # Drop cached permissions of the session whatever the outcome of the logout
+        permission_cache.evict_session(serialToken)
 
         if not response.ok:
             return Response(response.json(), status=response.status_code)
+
+        # The Superset impersonation session of the user is logged out in the background
+        end_impersonation_session(jwt.decode(serialToken, options={"verify_signature": False}).get("sub"))
         
         return Response({'message': 'Logout was successful', 'success': True}, status=status.HTTP_200_OK)    
 
@@ -121,13 +129,14 @@ class KeyCloakLoginAPI(APIView):
                 scope="openid email profile offline_access roles",
             )
             if credentials:
-                keycloak_admin = get_keycloak_admin()
-                client_id = config['KEYCLOAK_CLIENT_ID']
-                client_id = keycloak_admin.get_client_id(client_id)
-                client_authz_settings = keycloak_admin.get_client_authz_settings(client_id=client_id)
-                keycloak.authorization.load_config(client_authz_settings)
-                user_permissions = keycloak.get_permissions(credentials['access_token'])
-                credentials["permissions"] = map(lambda p: {'name': p.name, 'scopes': p.scopes}, user_permissions)
+                # The token comes straight from Keycloak, no need to verify it again
+                token_info = jwt.decode(credentials['access_token'], options={"verify_signature": False})
+                policy = policy_store.get_policy()
+                if policy is None:
+                    return Response({"result": "Authorization policy not loaded yet, try again later"},
+                                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                    headers={"Retry-After": str(policy_store.retry_interval)})
+                credentials["permissions"] = policy.get_permissions(get_client_roles(token_info))
                 return Response(credentials, status=status.HTTP_200_OK)
 
             return Response({"result": "Login Failed"}, status=status.HTTP_401_UNAUTHORIZED)
@@ -158,7 +167,8 @@ class KeyCloakLoginAPI(APIView):
                             data=form_data)
 
         if res.status_code == 200:
-
+            # Permissions of the previous access token are resolved again on next use
+            permission_cache.evict_session(refresh_token)
             data = res.json()
             return Response(data, status=status.HTTP_200_OK)
 
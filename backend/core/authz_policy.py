@@ -0,0 +1,201 @@
+import ast
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Iterable, Union
+from django.conf import settings
+from django.core.cache import caches
+from utils.keycloak_auth import get_keycloak_admin
+
+_log = logging.getLogger('KeycloakAuthorizationPolicy')
+
+
+class AuthorizationPolicy:
+    """Keycloak client authorization settings compiled for lookups by role.
+
+    Only role policies and the scope/resource permissions applying them are considered, as in
+    `KeycloakOpenID.get_permissions`. Roles are client roles named `<client id>/<role name>`.
+    """
+    def __init__(self, authz_settings: dict):
+        role_policies = {}
+        for pol in authz_settings.get("policies", []):
+            if pol["type"] == "role":
+                role_policies[pol["name"]] = [role["id"] for role in json.loads(pol["config"]["roles"])]
+
+        # role -> {permission name: scopes}
+        self.permissions_by_role = {}
+        for pol in authz_settings.get("policies", []):
+            if pol["type"] not in ("scope", "resource") or "applyPolicies" not in pol["config"]:
+                continue
+            scopes = ast.literal_eval(pol["config"]["scopes"]) if pol["type"] == "scope" else []
+            for policy_name in ast.literal_eval(pol["config"]["applyPolicies"]):
+                for role in role_policies.get(policy_name, []):
+                    self.permissions_by_role.setdefault(role, {})[pol["name"]] = scopes
+
+        # scope -> roles granting it
+        self.roles_by_scope = {}
+        for role, permissions in self.permissions_by_role.items():
+            for scopes in permissions.values():
+                for scope in scopes:
+                    self.roles_by_scope.setdefault(scope, set()).add(role)
+
+    def get_permissions(self, roles: Iterable[str]) -> list:
+        permissions = {}
+        for role in roles:
+            permissions.update(self.permissions_by_role.get(role, {}))
+        return [{'name': name, 'scopes': scopes} for name, scopes in permissions.items()]
+
+    def get_scopes(self, roles: Iterable[str]) -> list:
+        roles = set(roles)
+        return sorted(scope for scope, scope_roles in self.roles_by_scope.items() if not roles.isdisjoint(scope_roles))
+
+
+def _settings_version(authz_settings: dict) -> str:
+    return hashlib.sha256(json.dumps(authz_settings, sort_keys=True).encode()).hexdigest()
+
+
+class PolicyNotLoaded(Exception):
+    """The authorization policy has not been loaded yet, e.g. Keycloak is unreachable and there is no snapshot"""
+
+
+class AuthorizationPolicyStore:
+    """Holds the compiled authorization policy of the Keycloak client.
+
+    The policy is loaded from the last good snapshot on disk at startup and refreshed from
+    Keycloak in the background, so that workers can boot even when Keycloak is slow or down.
+    Refreshed settings are published with their version in the `shared_cache`, which the other
+    workers check every `version_check_interval` seconds to pick up a reload without waiting
+    for their own background refresh. Until a first policy is loaded, requests wait for it at most
+    `wait_timeout` seconds and the refresh is retried every `retry_interval` seconds.
+    """
+    VERSION_KEY = 'authz-policy-version'
+    SETTINGS_KEY = 'authz-policy-settings'
+
+    def __init__(self, snapshot_path: str, refresh_interval: int, shared_cache=None, version_check_interval: int = 5,
+                 wait_timeout: float = 2, retry_interval: int = 5):
+        self.snapshot_path = snapshot_path
+        self.refresh_interval = refresh_interval
+        self.wait_timeout = wait_timeout
+        self.retry_interval = retry_interval
+        self.shared_cache = shared_cache
+        self.version_check_interval = version_check_interval
+        self._policy = None
+        self._version = None
+        self._version_checked = 0
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def start(self):
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._load_snapshot()
+            self._refresher = threading.Thread(target=self._refresh_loop, name='authz-policy-refresher', daemon=True)
+            self._refresher.start()
+
+    def get_policy(self, timeout: float = None) -> Union[AuthorizationPolicy, None]:
+        """Returns the current policy, or None if no policy could be loaded within `timeout` (`wait_timeout` by default)"""
+        self._sync()
+        self._ready.wait(self.wait_timeout if timeout is None else timeout)
+        return self._policy
+
+    def refresh(self) -> bool:
+        try:
+            config = settings.KEYCLOAK_CONFIG
+            keycloak_admin = get_keycloak_admin()
+            client_id = keycloak_admin.get_client_id(config['KEYCLOAK_CLIENT_ID'])
+            authz_settings = keycloak_admin.get_client_authz_settings(client_id=client_id)
+            policy = AuthorizationPolicy(authz_settings)
+        except Exception as err:
+            _log.error("Unable to refresh the authorization policy: %s", err)
+            return False
+        version = _settings_version(authz_settings)
+        self._set_policy(policy, version)
+        self._save_snapshot(authz_settings)
+        self._publish(authz_settings, version)
+        _log.debug("Authorization policy refreshed")
+        return True
+
+    def _set_policy(self, policy, version):
+        self._policy = policy
+        self._version = version
+        self._ready.set()
+
+    def _publish(self, authz_settings, version):
+        if self.shared_cache is None:
+            return
+        try:
+            # The settings are written first, so that a worker seeing the new version can read them
+            self.shared_cache.set(self.SETTINGS_KEY, authz_settings, None)
+            self.shared_cache.set(self.VERSION_KEY, version, None)
+        except Exception as err:
+            _log.error("Unable to publish the authorization policy: %s", err)
+
+    def _sync(self):
+        """Loads the policy published by another worker if it is not the current one"""
+        now = time.monotonic()
+        if self.shared_cache is None or now - self._version_checked < self.version_check_interval:
+            return
+        self._version_checked = now
+        try:
+            version = self.shared_cache.get(self.VERSION_KEY)
+            if version is None or version == self._version:
+                return
+            authz_settings = self.shared_cache.get(self.SETTINGS_KEY)
+            if authz_settings is None or _settings_version(authz_settings) != version:
+                # Being published, picked up at the next check
+                return
+            self._set_policy(AuthorizationPolicy(authz_settings), version)
+            _log.debug("Authorization policy %s loaded from the shared cache", version)
+        except Exception as err:
+            _log.error("Unable to load the shared authorization policy: %s", err)
+
+    def _refresh_loop(self):
+        while True:
+            refreshed = self.refresh()
+            # Retried sooner while requests are refused for lack of a policy
+            time.sleep(self.refresh_interval if refreshed or self._ready.is_set() else self.retry_interval)
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path, "r") as f:
+                authz_settings = json.load(f)
+            self._set_policy(AuthorizationPolicy(authz_settings), _settings_version(authz_settings))
+            _log.debug("Authorization policy loaded from %s", self.snapshot_path)
+        except FileNotFoundError:
+            pass
+        except Exception as err:
+            _log.error("Unable to load the authorization policy snapshot %s: %s", self.snapshot_path, err)
+
+    def _save_snapshot(self, authz_settings):
+        try:
+            tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(authz_settings, f)
+            # Atomic, other workers never read a partially written snapshot
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as err:
+            _log.error("Unable to save the authorization policy snapshot %s: %s", self.snapshot_path, err)
+
+
+# Shared between gunicorn workers when Redis is configured
+_alias = settings.KEYCLOAK_CONFIG.get('KEYCLOAK_PERMISSION_CACHE')
+policy_store = AuthorizationPolicyStore(
+    snapshot_path=settings.KEYCLOAK_CONFIG.get('KEYCLOAK_AUTHZ_SNAPSHOT', os.path.join(settings.BASE_DIR, 'authz_settings.json')),
+    refresh_interval=settings.KEYCLOAK_CONFIG.get('KEYCLOAK_AUTHZ_REFRESH_INTERVAL', 300),
+    shared_cache=caches[_alias] if _alias else None,
+    version_check_interval=settings.KEYCLOAK_CONFIG.get('KEYCLOAK_AUTHZ_VERSION_CHECK_INTERVAL', 5),
+    wait_timeout=settings.KEYCLOAK_CONFIG.get('KEYCLOAK_AUTHZ_WAIT_TIMEOUT', 2),
+    retry_interval=settings.KEYCLOAK_CONFIG.get('KEYCLOAK_AUTHZ_RETRY_INTERVAL', 5),
+)
+
+
+def get_client_roles(token_info: dict) -> list:
+    """Returns the client roles of a decoded or introspected token, named as in the authorization policy"""
+    client_id = settings.KEYCLOAK_CONFIG['KEYCLOAK_CLIENT_ID']
+    roles = token_info.get("resource_access", {}).get(client_id, {}).get("roles", [])
+    return [f"{client_id}/{role}" for role in roles]
@@ -0,0 +1,14 @@
+from django.middleware.gzip import GZipMiddleware
+
+
+class RangeAwareGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware leaving alone the responses served by byte ranges
+
+    Ranges refer to the uncompressed content, compressing a partial response or a response accepting ranges
+    would drop its Content-Length and make its ranges unusable.
+    """
+
+    def process_response(self, request, response):
+        if response.status_code == 206 or response.has_header("Content-Range") or response.get("Accept-Ranges") == "bytes":
+            return response
+        return super().process_response(request, response)
@@ -1,43 +1,178 @@
-from core.user_id import get_current_user_name
 import logging
 import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import caches
+from keycloak import KeycloakPostError
+from rest_framework.exceptions import NotAuthenticated
+from core.permission_cache import LRUCache
 from utils.keycloak_auth import get_keycloak_openid
-try:
-    from threading import local
-except:
-    from django.utils._threading_local import local
-
-_log = logging.getLogger('KeycloakImpersonationMiddleware')
-_thread_locals = local()
-
-class KeycloakImpersonationMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
-        response = self.get_response(request)
-        self.log_out_impersonated_sessions()
-        return response
-
-    def log_out_impersonated_sessions():
-        sessions = getattr(_thread_locals, 'keycloak_sessions', None)
-        if sessions is None or len(sessions) == 0:
-            return
-        _log.debug("Logging out of %d impersonation sessions after request")
-        oid = get_keycloak_openid()
-        for session in sessions:
+
+_log = logging.getLogger('KeycloakImpersonation')
+
+# Tokens are renewed this many seconds before they expire
+EXPIRY_MARGIN = 30
+# Interval in seconds between two batches of impersonation session logouts
+LOGOUT_INTERVAL = 30
+# Seconds after which the renewal lock of a worker that died is ignored, longer than a token request to Keycloak
+RENEWAL_LOCK_TIMEOUT = 10
+
+_lock = threading.Lock()
+# Exchanged tokens per user ID, shared between workers when a Keycloak cache (Redis) is configured
+_alias = settings.KEYCLOAK_CONFIG.get('KEYCLOAK_PERMISSION_CACHE')
+_tokens = caches[_alias] if _alias else LRUCache(settings.KEYCLOAK_CONFIG.get('KEYCLOAK_PERMISSION_CACHE_SIZE', 10000))
+# Refresh tokens of the impersonation sessions waiting to be logged out
+_pending_logouts = []
+_logout_worker = None
+# Lock per user ID serializing the renewal of their tokens in this process
+_renewal_locks = weakref.WeakValueDictionary()
+
+
+def _logout_loop():
+    while True:
+        time.sleep(LOGOUT_INTERVAL)
+        log_out_impersonated_sessions()
+
+
+def _schedule_logout(refresh_token):
+    global _logout_worker
+    with _lock:
+        _pending_logouts.append(refresh_token)
+        if _logout_worker is None:
+            _logout_worker = threading.Thread(target=_logout_loop, name='impersonation-logout', daemon=True)
+            _logout_worker.start()
+
+
+def log_out_impersonated_sessions():
+    """Logs out, in one batch, the impersonation sessions which are no longer used"""
+    with _lock:
+        sessions = _pending_logouts[:]
+        _pending_logouts.clear()
+    if len(sessions) == 0:
+        return
+    _log.debug("Logging out of %d impersonation sessions", len(sessions))
+    oid = get_keycloak_openid()
+    for session in sessions:
+        try:
             oid.logout(session)
+        except Exception as err:
+            _log.warning("Unable to log out of impersonation session: %s", err)
+
+
+def _cache_key(user_id):
+    return f'kc-impersonation:{user_id}'
+
+
+@contextmanager
+def _renewal_lock(user_id):
+    """Serializes the renewal of the tokens of a user, between the workers too when the token cache is shared"""
+    with _lock:
+        lock = _renewal_locks.get(user_id)
+        if lock is None:
+            lock = _renewal_locks[user_id] = threading.Lock()
+    with lock:
+        if not _alias:
+            yield
+            return
+        key = f'kc-impersonation-lock:{user_id}'
+        deadline = time.monotonic() + RENEWAL_LOCK_TIMEOUT
+        acquired = _tokens.add(key, True, RENEWAL_LOCK_TIMEOUT)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.05)
+            acquired = _tokens.add(key, True, RENEWAL_LOCK_TIMEOUT)
+        try:
+            yield
+        finally:
+            if acquired:
+                _tokens.delete(key)
+
+
+def _is_valid(entry, now):
+    return entry is not None and entry["expires_at"] - EXPIRY_MARGIN > now
 
-def get_auth_token ():
-    keycloak = get_keycloak_openid()
-    tokens = keycloak.token(
+
+def _store(user_id, tokens, refreshed=None):
+    """Caches the tokens of a user, scheduling the logout of the session they replace unless it is `refreshed`"""
+    previous = _tokens.get(_cache_key(user_id))
+    if previous is not None:
+        previous_token = previous["tokens"]["refresh_token"]
+        if refreshed is None or previous_token != refreshed["tokens"]["refresh_token"]:
+            _schedule_logout(previous_token)
+    now = time.time()
+    # A refresh expiry of 0 means the refresh token does not expire, keep it for an hour at most then
+    refresh_expires_in = tokens.get("refresh_expires_in") or 3600
+    entry = {
+        "tokens": tokens,
+        "expires_at": now + tokens.get("expires_in", 0),
+        "refresh_expires_at": now + refresh_expires_in,
+    }
+    _tokens.set(_cache_key(user_id), entry, refresh_expires_in)
+
+
+def _exchange_token(keycloak, user_name):
+    return keycloak.token(
         grant_type=["urn:ietf:params:oauth:grant-type:token-exchange"],
         client_id=os.getenv("APP_CLIENT_ID"),
         client_secret=os.getenv("APP_SECRET_KEY"),
-        requested_subject=get_current_user_name(),
+        requested_subject=user_name,
         requested_token_type="urn:ietf:params:oauth:token-type:refresh_token"
     )
-    sessions = getattr(_thread_locals, "keycloak_sessions", [])
-    sessions.append(tokens["refresh_token"])
-    _thread_locals.sessions = sessions
-    return tokens
+
+
+def _refresh_token(keycloak, refresh_token):
+    return keycloak.token(
+        grant_type=["refresh_token"],
+        client_id=os.getenv("APP_CLIENT_ID"),
+        client_secret=os.getenv("APP_SECRET_KEY"),
+        refresh_token=refresh_token
+    )
+
+
+def get_auth_token(request):
+    """Returns tokens impersonating the user making `request`.
+
+    Exchanged tokens are reused until shortly before they expire, then renewed with the refresh
+    token; a new token exchange only happens when the impersonation session can no longer be refreshed.
+    The renewal is done by one request at a time per user, the others wait for it and reuse its tokens.
+    """
+    userinfo = getattr(request, 'userinfo', None)
+    if not userinfo or not userinfo.get('sub'):
+        # Tokens are cached by user ID, they are never exchanged, cached or reused without one
+        raise NotAuthenticated("Unable to impersonate a user without a user ID")
+    user_id = userinfo['sub']
+    user_name = userinfo['preferred_username']
+    entry = _tokens.get(_cache_key(user_id))
+    if _is_valid(entry, time.time()):
+        return entry["tokens"]
+
+    with _renewal_lock(user_id):
+        # The tokens may have been renewed by another request while waiting for the lock
+        now = time.time()
+        entry = _tokens.get(_cache_key(user_id))
+        if _is_valid(entry, now):
+            return entry["tokens"]
+
+        keycloak = get_keycloak_openid()
+        if entry is not None and entry["refresh_expires_at"] - EXPIRY_MARGIN > now:
+            try:
+                tokens = _refresh_token(keycloak, entry["tokens"]["refresh_token"])
+                _store(user_id, tokens, refreshed=entry)
+                return tokens
+            except KeycloakPostError as err:
+                _log.debug("Unable to refresh impersonation token of %s: %s", user_name, err)
+
+        # The session of the previous entry, if any, is logged out when it is replaced
+        tokens = _exchange_token(keycloak, user_name)
+        _store(user_id, tokens)
+        return tokens
+
+
+def end_impersonation_session(user_id):
+    """Forgets the tokens impersonating the user `user_id` and schedules the logout of their session"""
+    entry = _tokens.get(_cache_key(user_id))
+    _tokens.delete(_cache_key(user_id))
+    if entry is not None:
+        _schedule_logout(entry["tokens"]["refresh_token"])
@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+from typing import Union
+from django.conf import settings
+from jose import jwt
+from utils.keycloak_auth import get_keycloak_openid
+
+_log = logging.getLogger('KeycloakRealmKeys')
+
+
+class RealmKeyCache:
+    """Process-wide cache of the realm signing keys (JWKS), indexed by `kid`.
+
+    Keys are refreshed by a daemon thread every `refresh_interval` seconds and
+    on demand when a token is signed with a `kid` we do not know yet. On-demand
+    refreshes are rate limited so forged `kid` values cannot hammer Keycloak.
+    """
+    def __init__(self, refresh_interval: int = 300, min_refresh_interval: int = 10):
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self._keys = {}
+        self._last_refresh = 0
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def get_key(self, kid: str) -> Union[dict, None]:
+        self._start_refresher()
+        key = self._keys.get(kid)
+        if key is None and time.monotonic() - self._last_refresh > self.min_refresh_interval:
+            _log.debug("Unknown key id %s, refreshing realm keys", kid)
+            self.refresh()
+            key = self._keys.get(kid)
+        return key
+
+    def refresh(self):
+        with self._lock:
+            self._last_refresh = time.monotonic()
+            try:
+                certs = get_keycloak_openid().certs()
+            except Exception as err:
+                _log.error("Unable to fetch realm keys: %s", err)
+                return
+            # Only replace the cached keys once a new set was fetched successfully
+            self._keys = {key['kid']: key for key in certs.get('keys', []) if key.get('use', 'sig') == 'sig'}
+            _log.debug("Loaded %d realm signing keys", len(self._keys))
+
+    def _start_refresher(self):
+        if self._refresher is not None:
+            return
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name='realm-keys-refresher', daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            self.refresh()
+
+
+_realm_keys = RealmKeyCache(
+    refresh_interval=settings.KEYCLOAK_CONFIG.get('KEYCLOAK_JWKS_REFRESH_INTERVAL', 300)
+)
+
+
+def get_token_issuer() -> str:
+    config = settings.KEYCLOAK_CONFIG
+    return config.get('KEYCLOAK_ISSUER') or f"{config['KEYCLOAK_SERVER_URL']}/realms/{config['KEYCLOAK_REALM']}"
+
+
+def get_token_key(token: str) -> dict:
+    """Returns the realm key that signed `token`, without calling Keycloak when the key is cached
+
+    Raises:
+        jose.JWTError: if the token header is malformed or signed with an unknown key
+    """
+    header = jwt.get_unverified_header(token)
+    key = _realm_keys.get_key(header.get('kid'))
+    if key is None:
+        raise jwt.JWTError(f"Token signed with unknown key {header.get('kid')}")
+    return key
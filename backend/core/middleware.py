@@ -22,8 +22,12 @@ from django.conf import settings
 from django.http.response import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 from keycloak.exceptions import KeycloakInvalidTokenError
+from rest_framework import status
 from rest_framework.exceptions import PermissionDenied, AuthenticationFailed, NotAuthenticated
-from utils.keycloak_auth import get_keycloak_admin, get_keycloak_openid
+from utils.keycloak_auth import get_keycloak_openid
+from core.authz_policy import PolicyNotLoaded, get_client_roles, policy_store
+from core.keycloak_keys import get_token_issuer, get_token_key
+from core.permission_cache import permission_cache
 
 logger = logging.getLogger(__name__)
 
@@ -33,12 +37,8 @@ class KeycloakMiddleware(MiddlewareMixin):
         """
         :param get_response:
         """
-        # Initialize Keycloak
-        config = settings.KEYCLOAK_CONFIG
-        client_id = config['KEYCLOAK_CLIENT_ID']
-        keycloak_admin = get_keycloak_admin()
-        client_id = keycloak_admin.get_client_id(client_id)
-        self.client_authz_settings = keycloak_admin.get_client_authz_settings(client_id=client_id)
+        # Load the authorization policy from its last snapshot and keep it up to date in the background
+        policy_store.start()
         # Django
         self.get_response = get_response
 
@@ -51,7 +51,9 @@ class KeycloakMiddleware(MiddlewareMixin):
 
     def process_view(self, request, view_func, view_args, view_kwargs):
         """
-        Validate only the token introspect.
+        Validate the bearer token and check the scope required by the view.
+        Tokens are verified locally against the cached realm keys (DECODE) unless
+        KEYCLOAK_METHOD_VALIDATE_TOKEN is set to INTROSPECT.
         :param request: django request
         :param view_func:
         :param view_args: view args
@@ -77,12 +79,8 @@ class KeycloakMiddleware(MiddlewareMixin):
             return JsonResponse({"detail": NotAuthenticated.default_detail},
                                 status=NotAuthenticated.status_code)
 
-        keycloak = get_keycloak_openid(request)
-        keycloak.authorization.load_config(self.client_authz_settings)
         config = settings.KEYCLOAK_CONFIG
         default_access = config.get('KEYCLOAK_DEFAULT_ACCESS', "DENY")
-        method_validate_token = config.get('KEYCLOAK_METHOD_VALIDATE_TOKEN', "INTROSPECT")
-        client_public_key = "-----BEGIN PUBLIC KEY-----\n" + keycloak.public_key() + "\n-----END PUBLIC KEY-----"
 
         auth_header = request.META.get('HTTP_AUTHORIZATION').split()
         token = auth_header[1] if len(auth_header) == 2 else auth_header[0]
@@ -96,28 +94,59 @@ class KeycloakMiddleware(MiddlewareMixin):
             return JsonResponse({"detail": PermissionDenied.default_detail},
                                 status=PermissionDenied.status_code)
 
-        try:
-            user_permissions = keycloak.get_permissions(token,
-                                                             method_token_info=method_validate_token.lower(),
-                                                             key=client_public_key,
-                                                             options={"verify_aud": False})
-        except:
-            return JsonResponse({"detail": AuthenticationFailed.default_detail},
-                                status=AuthenticationFailed.status_code)
-
-        has_scope_permission = False
-        for perm in user_permissions:
-            if required_scope in perm.scopes:
-                has_scope_permission = True
-
-        if has_scope_permission:
-            # Add to userinfo to the view
+        keycloak = get_keycloak_openid(request)
+        cached = permission_cache.get(token)
+        if cached is None:
+            logger.debug('Permission cache miss (%s)', permission_cache.stats())
             try:
-                request.userinfo = keycloak.userinfo(token)
-            except Exception as e:
+                user_scopes = self._get_user_scopes(keycloak, token)
+            except PolicyNotLoaded:
+                # The refresher keeps fetching it in the background, fail fast instead of holding the worker
+                return JsonResponse({"detail": "Authorization policy not loaded yet, try again later."},
+                                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                    headers={"Retry-After": str(policy_store.retry_interval)})
+            except:
                 return JsonResponse({"detail": AuthenticationFailed.default_detail},
                                     status=AuthenticationFailed.status_code)
+            cached = {'scopes': user_scopes, 'userinfo': None}
+            permission_cache.set(token, user_scopes)
+
+        if required_scope in cached['scopes']:
+            # Add to userinfo to the view
+            if cached['userinfo'] is None:
+                try:
+                    cached['userinfo'] = keycloak.userinfo(token)
+                except Exception as e:
+                    return JsonResponse({"detail": AuthenticationFailed.default_detail},
+                                        status=AuthenticationFailed.status_code)
+                permission_cache.set(token, cached['scopes'], cached['userinfo'])
+            request.userinfo = cached['userinfo']
         else:
             # User Permission Denied
             return JsonResponse({"detail": PermissionDenied.default_detail},
                                 status=PermissionDenied.status_code)
+
+    def _get_user_scopes(self, keycloak, token):
+        """
+        Validate the token and resolve the set of scopes granted to its user.
+        :param keycloak: KeycloakOpenID instance
+        :param token: bearer token
+        :return: list of scope names
+        """
+        method_validate_token = settings.KEYCLOAK_CONFIG.get('KEYCLOAK_METHOD_VALIDATE_TOKEN', "DECODE")
+        if method_validate_token == "INTROSPECT":
+            token_info = keycloak.introspect(token)
+            if not token_info.get("active"):
+                raise KeycloakInvalidTokenError("Token expired or invalid.")
+        else:
+            # Verify signature, expiry and issuer locally against the cached realm keys
+            key = get_token_key(token)
+            token_info = keycloak.decode_token(token,
+                                               key=key,
+                                               algorithms=[key.get('alg', 'RS256')],
+                                               issuer=get_token_issuer(),
+                                               options={"verify_aud": False})
+        policy = policy_store.get_policy()
+        if policy is None:
+            raise PolicyNotLoaded("Authorization policy not loaded.")
+        return policy.get_scopes(get_client_roles(token_info))
@@ -0,0 +1,149 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Union
+from django.conf import settings
+from django.core.cache import caches
+from jose import jwt
+
+_log = logging.getLogger('KeycloakPermissionCache')
+
+
+class LRUCache:
+    """Small thread-safe in-process LRU cache exposing the subset of the Django cache API we need"""
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (value, time.time() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_many(self, keys) -> dict:
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'size': len(self._entries), 'evictions': self.evictions}
+
+
+class TokenPermissionCache:
+    """Caches the resolved scope set and userinfo of a bearer token until the token expires.
+
+    Entries are keyed by the SHA-256 of the token. Logging out or refreshing a Keycloak session stores
+    the time of its eviction, and entries of tokens of the session cached before that time are treated
+    as missing. Every write is a single key, so concurrent requests of a session sharing a Redis cache
+    cannot lose each other's updates.
+    """
+    # Longer than the lifetime of the access tokens, so that no entry cached before an eviction outlives it
+    SESSION_EVICTION_TIMEOUT = 24 * 60 * 60  # seconds
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        # Shared by the threads of a gunicorn worker
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        return 'kc-token:' + hashlib.sha256(token.encode()).hexdigest()
+
+    @staticmethod
+    def _session_key(session_id: str) -> str:
+        return f'kc-session-evicted:{session_id}'
+
+    @staticmethod
+    def _session_id(claims: dict) -> Union[str, None]:
+        return claims.get('sid') or claims.get('session_state')
+
+    def get(self, token: str) -> Union[dict, None]:
+        token_key = self._token_key(token)
+        try:
+            session_id = self._session_id(jwt.get_unverified_claims(token))
+        except jwt.JWTError:
+            session_id = None
+        keys = [token_key, self._session_key(session_id)] if session_id else [token_key]
+        # A single round trip to the cache
+        values = self.backend.get_many(keys)
+        entry = values.get(token_key)
+        evicted = values.get(keys[-1]) if session_id else None
+        if entry is not None and evicted is not None and entry['cached'] <= evicted:
+            self.backend.delete(token_key)
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def set(self, token: str, scopes: list, userinfo: Union[dict, None] = None):
+        """Caches an entry for an already validated token"""
+        claims = jwt.get_unverified_claims(token)
+        timeout = int(claims.get('exp', 0) - time.time())
+        if timeout <= 0:
+            return
+        entry = {'scopes': scopes, 'userinfo': userinfo, 'cached': time.time()}
+        self.backend.set(self._token_key(token), entry, timeout)
+
+    def evict_session(self, token: str):
+        """Evicts all entries of the session `token` (access or refresh token) belongs to"""
+        try:
+            claims = jwt.get_unverified_claims(token)
+        except jwt.JWTError:
+            return
+        self.backend.delete(self._token_key(token))
+        session_id = self._session_id(claims)
+        if not session_id:
+            return
+        self.backend.set(self._session_key(session_id), time.time(), self.SESSION_EVICTION_TIMEOUT)
+        _log.debug("Evicted cached permissions of session %s", session_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {'hits': self.hits, 'misses': self.misses}
+        if isinstance(self.backend, LRUCache):
+            stats.update(self.backend.stats())
+        return stats
+
+
+def _get_backend():
+    config = settings.KEYCLOAK_CONFIG
+    alias = config.get('KEYCLOAK_PERMISSION_CACHE')
+    if alias:
+        # Shared between gunicorn workers, e.g. a Redis cache
+        return caches[alias]
+    return LRUCache(config.get('KEYCLOAK_PERMISSION_CACHE_SIZE', 10000))
+
+
+permission_cache = TokenPermissionCache(_get_backend())
@@ -81,7 +81,7 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "core.middleware.KeycloakMiddleware",
     "core.user_id.UserIdMiddleware",
-    "django.middleware.gzip.GZipMiddleware"
+    "core.gzip.RangeAwareGZipMiddleware"
 ]
 
 ROOT_URLCONF = "core.urls"
@@ -194,12 +194,63 @@ KEYCLOAK_BEARER_AUTHENTICATION_EXEMPT_PATHS = [
     "admin",
     "accounts",
 ]
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+}
+if os.getenv("REDIS_URL"):
+    # Shared by all gunicorn workers
+    CACHES["keycloak"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL"),
+    }
+# Cache alias for state that all the gunicorn workers must see, per-process when Redis is not configured
+SHARED_CACHE = "keycloak" if os.getenv("REDIS_URL") else "default"
+
+CLAMAV_CONFIG = {
+    "CLAMAV_HOST": os.getenv("CLAMAV_HOST", "clamav"),
+    "CLAMAV_PORT": int(os.getenv("CLAMAV_PORT", 3310)),
+    "CLAMAV_POOL_SIZE": int(os.getenv("CLAMAV_POOL_SIZE", 4)),  # idle connections kept per process
+    "CLAMAV_MAX_CONCURRENT_SCANS": int(os.getenv("CLAMAV_MAX_CONCURRENT_SCANS", 4)),  # per process
+    "CLAMAV_VERDICT_CACHE_TTL": int(os.getenv("CLAMAV_VERDICT_CACHE_TTL", 86400)),  # seconds
+}
+
+AIRFLOW_MAX_CONCURRENT_REQUESTS = int(os.getenv("AIRFLOW_MAX_CONCURRENT_REQUESTS", 8))
+AIRFLOW_CONFIG = {
+    "AIRFLOW_API": os.getenv("AIRFLOW_API"),
+    "AIRFLOW_USER": os.getenv("AIRFLOW_USER"),
+    "AIRFLOW_PASSWORD": os.getenv("AIRFLOW_PASSWORD"),
+    "AIRFLOW_MAX_CONCURRENT_REQUESTS": AIRFLOW_MAX_CONCURRENT_REQUESTS,  # per process list
+    # connections kept per process, a sync gunicorn worker serves one request at a time
+    "AIRFLOW_POOL_SIZE": int(os.getenv("AIRFLOW_POOL_SIZE", AIRFLOW_MAX_CONCURRENT_REQUESTS)),
+    "AIRFLOW_CONNECT_TIMEOUT": float(os.getenv("AIRFLOW_CONNECT_TIMEOUT", 3.05)),  # seconds
+    "AIRFLOW_READ_TIMEOUT": float(os.getenv("AIRFLOW_READ_TIMEOUT", 30)),  # seconds
+    "AIRFLOW_RETRIES": int(os.getenv("AIRFLOW_RETRIES", 2)),  # idempotent calls only
+    "AIRFLOW_RETRY_BACKOFF": float(os.getenv("AIRFLOW_RETRY_BACKOFF", 0.5)),  # seconds
+    "AIRFLOW_BREAKER_THRESHOLD": int(os.getenv("AIRFLOW_BREAKER_THRESHOLD", 5)),  # consecutive failures
+    "AIRFLOW_BREAKER_RESET_TIMEOUT": float(os.getenv("AIRFLOW_BREAKER_RESET_TIMEOUT", 30)),  # seconds
+}
+
 CONFIG_DIR = os.path.join(os.path.dirname(__file__), os.pardir)
 KEYCLOAK_CONFIG = {
     "KEYCLOAK_REALM": os.getenv("KEYCLOAK_REALM"),
     "KEYCLOAK_CLIENT_ID": os.getenv("CLIENT_ID"),
     "KEYCLOAK_DEFAULT_ACCESS": "ALLOW",  # DENY or ALLOW
-    "KEYCLOAK_METHOD_VALIDATE_TOKEN": "DECODE",
+    "KEYCLOAK_METHOD_VALIDATE_TOKEN": os.getenv("KEYCLOAK_METHOD_VALIDATE_TOKEN", "DECODE"),  # DECODE or INTROSPECT
+    "KEYCLOAK_JWKS_REFRESH_INTERVAL": int(os.getenv("KEYCLOAK_JWKS_REFRESH_INTERVAL", 300)),  # seconds
+    "KEYCLOAK_ISSUER": os.getenv("KEYCLOAK_ISSUER"),  # defaults to KEYCLOAK_SERVER_URL/realms/KEYCLOAK_REALM
+    "KEYCLOAK_PERMISSION_CACHE": "keycloak" if os.getenv("REDIS_URL") else None,  # cache alias, in-process LRU if None
+    "KEYCLOAK_PERMISSION_CACHE_SIZE": int(os.getenv("KEYCLOAK_PERMISSION_CACHE_SIZE", 10000)),
+    "KEYCLOAK_ROLE_CACHE_TTL": int(os.getenv("KEYCLOAK_ROLE_CACHE_TTL", 60)),  # seconds
+    "KEYCLOAK_AUTHZ_REFRESH_INTERVAL": int(os.getenv("KEYCLOAK_AUTHZ_REFRESH_INTERVAL", 300)),  # seconds
+    # seconds between two checks of the policy reloaded by other workers, in Redis
+    "KEYCLOAK_AUTHZ_VERSION_CHECK_INTERVAL": int(os.getenv("KEYCLOAK_AUTHZ_VERSION_CHECK_INTERVAL", 5)),
+    # seconds a request waits for the policy when none is loaded yet, before being answered with a 503
+    "KEYCLOAK_AUTHZ_WAIT_TIMEOUT": float(os.getenv("KEYCLOAK_AUTHZ_WAIT_TIMEOUT", 2)),
+    # seconds between two attempts to fetch the policy while none is loaded
+    "KEYCLOAK_AUTHZ_RETRY_INTERVAL": int(os.getenv("KEYCLOAK_AUTHZ_RETRY_INTERVAL", 5)),
+    "KEYCLOAK_AUTHZ_SNAPSHOT": os.getenv("KEYCLOAK_AUTHZ_SNAPSHOT", os.path.join(BASE_DIR, "authz_settings.json")),
     "KEYCLOAK_SERVER_URL": os.getenv("KEYCLOAK_SERVER_URL"),
     "KEYCLOAK_INTERNAL_SERVER_URL": os.getenv(
         "BASE_URL"
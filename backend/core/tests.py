@@ -0,0 +1,250 @@
+import json
+import threading
+import time
+from unittest import mock
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from jose import jwt
+from keycloak import KeycloakOpenID, KeycloakPostError
+from .authz_policy import AuthorizationPolicy, AuthorizationPolicyStore
+from .gzip import RangeAwareGZipMiddleware
+from .permission_cache import LRUCache, TokenPermissionCache
+
+
+def make_token(**claims):
+    return jwt.encode({'exp': time.time() + 300, **claims}, 'secret', algorithm='HS256')
+
+
+class LRUCacheTest(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.get('a')
+        cache.set('c', 3, 60)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats(), {'size': 2, 'evictions': 1})
+
+    def test_expired_entries_are_not_returned(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1, 60)
+        with mock.patch('core.permission_cache.time.time', return_value=time.time() + 61):
+            self.assertEqual(cache.get('a', 'default'), 'default')
+
+
+class TokenPermissionCacheTest(SimpleTestCase):
+    def test_counts_hits_and_misses(self):
+        cache = TokenPermissionCache(LRUCache(max_size=10))
+        token = make_token(sid='session')
+        self.assertIsNone(cache.get(token))
+        cache.set(token, ['pipeline:read'])
+        self.assertEqual(cache.get(token)['scopes'], ['pipeline:read'])
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'size': 1, 'evictions': 0})
+
+    def test_counters_are_exact_under_concurrency(self):
+        cache = TokenPermissionCache(LRUCache(max_size=10))
+        token = make_token()
+
+        def lookup():
+            for _ in range(1000):
+                cache.get(token)
+
+        threads = [threading.Thread(target=lookup) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.stats()['misses'], 8000)
+
+    def test_evict_session_removes_all_its_tokens(self):
+        cache = TokenPermissionCache(LRUCache(max_size=10))
+        access_token = make_token(sid='session', typ='Bearer')
+        other_token = make_token(sid='session', typ='ID')
+        cache.set(access_token, ['a'])
+        cache.set(other_token, ['b'])
+        cache.evict_session(make_token(sid='session', typ='Refresh'))
+        self.assertIsNone(cache.get(access_token))
+        self.assertIsNone(cache.get(other_token))
+
+    def test_tokens_cached_concurrently_are_evicted(self):
+        backend = LocMemCache('permissions-test', {})
+        caches = [TokenPermissionCache(backend) for _ in range(8)]
+        tokens = [make_token(sid='session', jti=str(i)) for i in range(8)]
+        threads = [threading.Thread(target=cache.set, args=(token, ['a'])) for cache, token in zip(caches, tokens)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with mock.patch('core.permission_cache.time.time', return_value=time.time() + 1):
+            caches[0].evict_session(make_token(sid='session', typ='Refresh'))
+        self.assertEqual([caches[0].get(token) for token in tokens], [None] * 8)
+
+    def test_tokens_cached_after_eviction_are_kept(self):
+        cache = TokenPermissionCache(LRUCache(max_size=10))
+        cache.evict_session(make_token(sid='session', typ='Refresh'))
+        token = make_token(sid='session')
+        with mock.patch('core.permission_cache.time.time', return_value=time.time() + 1):
+            cache.set(token, ['a'])
+        self.assertEqual(cache.get(token)['scopes'], ['a'])
+
+
+class ImpersonationTokenTest(SimpleTestCase):
+    def setUp(self):
+        from . import keycloak_impersonation
+        self.impersonation = keycloak_impersonation
+        patcher = mock.patch.object(keycloak_impersonation, '_tokens', LRUCache(max_size=10))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, user_id, user_name):
+        return mock.Mock(userinfo={'sub': user_id, 'preferred_username': user_name})
+
+    def test_refuses_requests_without_user(self):
+        from rest_framework.exceptions import NotAuthenticated
+        with self.assertRaises(NotAuthenticated):
+            self.impersonation.get_auth_token(mock.Mock(spec=[]))
+
+    def test_tokens_are_cached_per_request_user(self):
+        def exchange(keycloak, user_name):
+            return {'access_token': user_name, 'refresh_token': user_name, 'expires_in': 300}
+
+        with mock.patch.object(self.impersonation, 'get_keycloak_openid'), \
+                mock.patch.object(self.impersonation, '_exchange_token', side_effect=exchange) as exchange_token:
+            alice = self.impersonation.get_auth_token(self.request('1', 'alice'))
+            bob = self.impersonation.get_auth_token(self.request('2', 'bob'))
+            self.assertEqual(self.impersonation.get_auth_token(self.request('1', 'alice')), alice)
+        self.assertEqual((alice['access_token'], bob['access_token']), ('alice', 'bob'))
+        self.assertEqual(exchange_token.call_count, 2)
+
+    def test_concurrent_renewals_exchange_once(self):
+        def exchange(keycloak, user_name):
+            time.sleep(0.05)
+            return {'access_token': user_name, 'refresh_token': user_name, 'expires_in': 300}
+
+        with mock.patch.object(self.impersonation, 'get_keycloak_openid'), \
+                mock.patch.object(self.impersonation, '_exchange_token', side_effect=exchange) as exchange_token:
+            threads = [threading.Thread(target=self.impersonation.get_auth_token, args=(self.request('1', 'alice'),))
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(exchange_token.call_count, 1)
+
+    def test_replaced_session_is_logged_out(self):
+        self.impersonation._store('1', {'access_token': 'old', 'refresh_token': 'old', 'expires_in': 0})
+        with mock.patch.object(self.impersonation, 'get_keycloak_openid'), \
+                mock.patch.object(self.impersonation, '_refresh_token', return_value={
+                    'access_token': 'refreshed', 'refresh_token': 'refreshed', 'expires_in': 0}), \
+                mock.patch.object(self.impersonation, '_exchange_token', return_value={
+                    'access_token': 'new', 'refresh_token': 'new', 'expires_in': 300}), \
+                mock.patch.object(self.impersonation, '_schedule_logout') as schedule_logout:
+            # Refreshing keeps the session
+            self.impersonation.get_auth_token(self.request('1', 'alice'))
+            schedule_logout.assert_not_called()
+            self.impersonation._refresh_token.side_effect = KeycloakPostError('expired')
+            self.assertEqual(self.impersonation.get_auth_token(self.request('1', 'alice'))['access_token'], 'new')
+        schedule_logout.assert_called_once_with('refreshed')
+
+
+class RangeAwareGZipMiddlewareTest(SimpleTestCase):
+    def compress(self, response):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        return RangeAwareGZipMiddleware(lambda request: response)(request)
+
+    def test_compresses_other_responses(self):
+        response = self.compress(HttpResponse(b'a' * 1000))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_leaves_ranged_responses_alone(self):
+        partial = HttpResponse(b'a' * 1000, status=206)
+        partial['Content-Range'] = 'bytes 0-999/2000'
+        whole = HttpResponse(b'a' * 1000)
+        whole['Accept-Ranges'] = 'bytes'
+        for response in [partial, whole]:
+            response = self.compress(response)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(response.content, b'a' * 1000)
+
+
+def make_policy(name, type, **config):
+    return {"name": name, "type": type, "logic": "POSITIVE", "decisionStrategy": "UNANIMOUS", "config": config}
+
+
+AUTHZ_SETTINGS = {
+    "policies": [
+        make_policy("Admin Policy", "role", roles=json.dumps([{"id": "app/admin", "required": False}])),
+        make_policy("User Policy", "role", roles=json.dumps([
+            {"id": "app/user", "required": False}, {"id": "app/admin", "required": False},
+        ])),
+        make_policy("Read Permission", "scope", scopes='["pipeline:read", "process:read"]', applyPolicies='["User Policy"]'),
+        make_policy("Write Permission", "scope", scopes='["pipeline:add"]', applyPolicies='["Admin Policy"]'),
+        make_policy("Resource Permission", "resource", resources='["Pipelines"]', applyPolicies='["User Policy"]'),
+        make_policy("Unapplied Permission", "scope", scopes='["user:delete"]'),
+    ]
+}
+
+
+class AuthorizationPolicyTest(SimpleTestCase):
+    def keycloak_scopes(self, roles):
+        """Scopes granted by `KeycloakOpenID.get_permissions` with `load_config`, which the policy replaces"""
+        keycloak = KeycloakOpenID(server_url="http://keycloak", realm_name="realm", client_id="app")
+        keycloak.authorization.load_config(AUTHZ_SETTINGS)
+        token_info = {"resource_access": {"app": {"roles": roles}}}
+        with mock.patch.object(keycloak, "_token_info", return_value=token_info):
+            permissions = keycloak.get_permissions("token", method_token_info="decode")
+        return sorted({scope for permission in permissions for scope in permission.scopes})
+
+    def test_scopes_match_load_config(self):
+        policy = AuthorizationPolicy(AUTHZ_SETTINGS)
+        for roles in [["admin"], ["user"], ["user", "admin"], ["other"]]:
+            self.assertEqual(policy.get_scopes(f"app/{role}" for role in roles), self.keycloak_scopes(roles), roles)
+
+    def test_permissions_by_role(self):
+        permissions = AuthorizationPolicy(AUTHZ_SETTINGS).get_permissions(["app/user"])
+        self.assertEqual(
+            sorted(permissions, key=lambda permission: permission["name"]),
+            [
+                {"name": "Read Permission", "scopes": ["pipeline:read", "process:read"]},
+                {"name": "Resource Permission", "scopes": []},
+            ],
+        )
+
+
+class AuthorizationPolicyStoreTest(SimpleTestCase):
+    def make_store(self, shared_cache):
+        store = AuthorizationPolicyStore("/nonexistent/authz_settings.json", 300, shared_cache, version_check_interval=0)
+        patcher = mock.patch.object(store, "_save_snapshot")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return store
+
+    def test_reload_reaches_other_workers(self):
+        shared_cache = LocMemCache("authz-test", {})
+        reloading, other = self.make_store(shared_cache), self.make_store(shared_cache)
+        other._set_policy(AuthorizationPolicy({"policies": []}), "old")
+
+        keycloak_admin = mock.Mock()
+        keycloak_admin.get_client_authz_settings.return_value = AUTHZ_SETTINGS
+        with mock.patch("core.authz_policy.get_keycloak_admin", return_value=keycloak_admin):
+            self.assertTrue(reloading.refresh())
+        self.assertEqual(other.get_policy().get_scopes(["app/admin"]), ["pipeline:add", "pipeline:read", "process:read"])
+        self.assertEqual(other._version, reloading._version)
+
+    def test_requests_fail_fast_until_a_policy_is_loaded(self):
+        from .middleware import KeycloakMiddleware
+        store = AuthorizationPolicyStore("/nonexistent/authz_settings.json", 300, wait_timeout=0.1, retry_interval=7)
+        view = mock.Mock(cls=mock.Mock(keycloak_scopes={"GET": "process:read"}))
+        request = RequestFactory().get("/api/process", HTTP_AUTHORIZATION="Bearer token")
+        with mock.patch("core.middleware.policy_store", store), mock.patch.object(store, "start"), \
+                mock.patch("core.middleware.get_keycloak_openid"), \
+                mock.patch("core.middleware.get_token_key", return_value={}), \
+                mock.patch("core.middleware.get_token_issuer"), \
+                mock.patch("core.middleware.permission_cache", TokenPermissionCache(LRUCache(max_size=10))):
+            started = time.monotonic()
+            response = KeycloakMiddleware(lambda request: None).process_view(request, view, (), {})
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "7")
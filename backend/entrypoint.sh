@@ -1,4 +1,4 @@
-#!/bin/sh
+#!/bin/bash
 
 if [ "$DATABASE" = "postgres" ]
 then
@@ -11,7 +11,24 @@ then
     echo "PostgreSQL started"
 fi
 
-python manage.py flush --no-input
-python manage.py migrate
+python manage.py migrate || exit 1
 
-exec "$@"
\ No newline at end of file
+# The app and its workers run side by side: when any of them exits, the others are stopped and the container
+# exits with its status, so that it is restarted instead of running without a worker
+stop_children() {
+    kill -TERM $(jobs -p) 2>/dev/null
+}
+trap 'stop_children; wait; exit 0' TERM INT
+
+# Keeps the pipeline catalog in sync with the pipelines bucket
+python manage.py sync_pipeline_catalog &
+# Scans the asynchronous uploads waiting in quarantine
+python manage.py process_upload_scans &
+"$@" &
+
+wait -n
+status=$?
+echo "A backend process exited with status $status, stopping the others"
+stop_children
+wait
+exit $status
@@ -0,0 +1,300 @@
+import json
+import logging
+from contextlib import contextmanager
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta, timezone
+from typing import Tuple, Union
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from minio.error import S3Error
+from utils.minio import client, iter_objects
+from .metadata_helper import get_pipeline_metadata
+from .models import CatalogReconciliation, PipelineCatalogEntry
+
+_log = logging.getLogger('PipelineCatalog')
+
+
+class ObjectExists(Exception):
+    """Raised when reserving an object that already exists or is being written"""
+
+BUCKET = "pipelines"
+PIPELINES_PREFIX = "pipelines-created/"
+TEMPLATES_PREFIX = "templates/"
+# Entries are dated with the clock of MinIO, tolerate this much skew with the clock of the backend
+CLOCK_SKEW = timedelta(minutes=1)
+
+
+def parse_object_name(object_name: str) -> Union[Tuple[str, Union[str, None], str], None]:
+    """Returns the (kind, owner, name) of a catalogued object, or None for any other object of the bucket"""
+    if not object_name.endswith(".hpl"):
+        return None
+    if object_name.startswith(PIPELINES_PREFIX):
+        parts = object_name.removeprefix(PIPELINES_PREFIX).removesuffix(".hpl").split("/")
+        if len(parts) == 2:
+            return PipelineCatalogEntry.PIPELINE, parts[0], parts[1]
+    elif object_name.startswith(TEMPLATES_PREFIX):
+        parts = object_name.removeprefix(TEMPLATES_PREFIX).removesuffix(".hpl").split("/")
+        if len(parts) == 1:
+            return PipelineCatalogEntry.TEMPLATE, None, parts[0]
+        if len(parts) == 2:
+            return PipelineCatalogEntry.TEMPLATE, parts[0], parts[1]
+    return None
+
+
+def _parse_created(value, default):
+    try:
+        created = parse_datetime(value) if value else None
+    except ValueError:
+        created = None
+    if created is not None and created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    # Always set, as entries are paginated on it
+    return created or default or datetime.now(timezone.utc)
+
+
+def _entry_fields(kind, owner, name, size, etag, last_modified, user_metadata) -> dict:
+    if kind == PipelineCatalogEntry.PIPELINE:
+        metadata = get_pipeline_metadata(client, owner, name, user_metadata=user_metadata or {})
+    else:
+        metadata = {}
+    return {
+        "kind": kind,
+        "owner": owner,
+        "name": name,
+        "size": size or 0,
+        "etag": etag or "",
+        "description": metadata.get("description") or "",
+        "check_status": metadata.get("check_status") or "failed",
+        "check_text": metadata.get("check_text") or "",
+        "created": _parse_created(metadata.get("created"), last_modified),
+        "updated": last_modified,
+    }
+
+
+def upsert_entry(object_name: str, size: int, etag: str, last_modified, user_metadata) -> Union[PipelineCatalogEntry, None]:
+    """Creates or updates the catalog entry of an object from its listing, stat or notification data"""
+    parsed = parse_object_name(object_name)
+    if parsed is None:
+        return None
+    entry, _ = PipelineCatalogEntry.objects.update_or_create(
+        object_name=object_name,
+        defaults=_entry_fields(*parsed, size, etag, last_modified, user_metadata),
+    )
+    return entry
+
+
+def sync_object(object_name: str):
+    """Refreshes the catalog entry of an object from MinIO, removing it when the object no longer exists"""
+    if parse_object_name(object_name) is None:
+        return
+    try:
+        stat = client.stat_object(BUCKET, object_name)
+    except S3Error as err:
+        if err.code != "NoSuchKey":
+            raise
+        remove_entry(object_name)
+        return
+    upsert_entry(object_name, stat.size, stat.etag, stat.last_modified, stat.metadata)
+
+
+def remove_entry(object_name: str):
+    PipelineCatalogEntry.objects.filter(object_name=object_name).delete()
+
+
+def reconcile():
+    """Repairs any drift between the catalog and the bucket by listing all catalogued prefixes
+
+    Entries updated after the listing started are kept, as their objects may have been created meanwhile.
+    """
+    started = datetime.now(timezone.utc)
+    seen = set()
+    for prefix in (PIPELINES_PREFIX, TEMPLATES_PREFIX):
+        for object in iter_objects(BUCKET, prefix=prefix, suffix=".hpl", recursive=True, include_user_meta=True):
+            if parse_object_name(object.object_name) is None:
+                continue
+            seen.add(object.object_name)
+            upsert_entry(object.object_name, object.size, object.etag, object.last_modified, object.metadata)
+    stale = PipelineCatalogEntry.objects.exclude(object_name__in=seen).filter(
+        Q(updated__lt=started - CLOCK_SKEW) | Q(updated__isnull=True)
+    )
+    removed, _ = stale.delete()
+    CatalogReconciliation.objects.create(started=started, objects_seen=len(seen), entries_removed=removed)
+    _log.info("Catalog reconciled: %d objects, %d stale entries removed", len(seen), removed)
+
+
+def is_reconciled() -> bool:
+    """Whether the catalog has been reconciled with the bucket since the database was created"""
+    return CatalogReconciliation.objects.exists()
+
+
+def object_exists(object_name: str) -> bool:
+    """Whether an object exists, from the catalog once it has been reconciled and from MinIO before that"""
+    if PipelineCatalogEntry.objects.filter(object_name=object_name).exists():
+        return True
+    if is_reconciled():
+        return False
+    try:
+        client.stat_object(BUCKET, object_name)
+    except S3Error as err:
+        if err.code != "NoSuchKey":
+            raise
+        return False
+    return True
+
+
+@contextmanager
+def reserve_entry(object_name: str):
+    """Reserves the catalog entry of an object before writing it, so that concurrent writers of the same name conflict
+
+    The unique entry is created before the object is written, raising `ObjectExists` if it is already there, and
+    removed again if the write fails.
+    """
+    if object_exists(object_name):
+        raise ObjectExists(object_name)
+    kind, owner, name = parse_object_name(object_name)
+    now = datetime.now(timezone.utc)
+    try:
+        with transaction.atomic():
+            PipelineCatalogEntry.objects.create(
+                object_name=object_name, kind=kind, owner=owner, name=name, created=now, updated=now
+            )
+    except IntegrityError:
+        raise ObjectExists(object_name)
+    try:
+        yield
+    except BaseException:
+        remove_entry(object_name)
+        raise
+
+
+def get_version_token(queryset) -> Union[str, None]:
+    """Cheap token of a set of entries, changing whenever one of them is added, removed or updated
+
+    None until the catalog has been reconciled, as lists are read from the bucket until then.
+    """
+    if not is_reconciled():
+        return None
+    stats = queryset.aggregate(count=Count("id"), last_id=Max("id"), last_updated=Max("updated"))
+    return f"{stats['count']}:{stats['last_id']}:{stats['last_updated']}"
+
+
+def search_entries(queryset, query: str, match: str = "substring"):
+    """Filters catalog entries on their name and description, without running any user-supplied regex
+
+    `match` is "prefix" (name starting with the query), "substring" (name or description containing the query)
+    or "token" (name or description containing every word of the query).
+    """
+    if not query:
+        return queryset
+    if match == "prefix":
+        return queryset.filter(name__istartswith=query)
+    if match == "token":
+        for token in query.split():
+            queryset = queryset.filter(Q(name__icontains=token) | Q(description__icontains=token))
+        return queryset
+    return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+
+
+# Sort parameter -> (field, descending)
+SORTS = {
+    "name": ("name", False),
+    "-name": ("name", True),
+    "created": ("created", False),
+    "-created": ("created", True),
+}
+
+
+def _encode_cursor(sort: str, value, id) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return urlsafe_b64encode(json.dumps([sort, value, id]).encode()).decode()
+
+
+def _decode_cursor(cursor: str, sort: str):
+    """Returns the (sort value, id) of a cursor, raises ValueError if it was not issued for the `sort` order"""
+    cursor_sort, value, id = json.loads(urlsafe_b64decode(cursor.encode()))
+    if cursor_sort != sort:
+        raise ValueError(f"Cursor issued for sort {cursor_sort}")
+    if SORTS[sort][0] == "created":
+        value = parse_datetime(value)
+    if value is None:
+        raise ValueError("Cursor without a sort value")
+    return value, int(id)
+
+
+def paginate(request, queryset, default_sort="name") -> Tuple[list, Union[str, None]]:
+    """Paginates catalog entries with the `cursor`, `limit` and `sort` query parameters
+
+    Pages are selected with the (sort field, id) of the last entry of the previous page, so that any page is
+    read from the index in constant time. Everything is returned without `limit`. Returns the entries of the
+    page and the cursor of the next one, None on the last page.
+    """
+    sort = request.GET.get("sort")
+    if sort not in SORTS:
+        sort = default_sort
+    field, descending = SORTS[sort]
+    queryset = queryset.annotate(sort_value=F(field))
+    order = "-" if descending else ""
+    queryset = queryset.order_by(f"{order}sort_value", f"{order}id")
+
+    cursor = request.GET.get("cursor")
+    if cursor:
+        try:
+            value, id = _decode_cursor(cursor, sort)
+        except (ValueError, TypeError):
+            raise ValidationError("Invalid cursor")
+        after = "lt" if descending else "gt"
+        queryset = queryset.filter(Q(**{f"sort_value__{after}": value}) | Q(sort_value=value, **{f"id__{after}": id}))
+
+    try:
+        limit = int(request.GET.get("limit", 0))
+    except ValueError:
+        raise ValidationError("Invalid limit")
+    if limit <= 0:
+        return list(queryset), None
+    entries = list(queryset[:limit + 1])
+    if len(entries) <= limit:
+        return entries, None
+    last = entries[limit - 1]
+    return entries[:limit], _encode_cursor(sort, last.sort_value, last.id)
+
+
+def _bucket_entries(prefixes) -> list:
+    """Unsaved catalog entries of the objects directly under `prefixes`, read from the bucket"""
+    entries = []
+    for prefix in prefixes:
+        for object in iter_objects(BUCKET, prefix=prefix, suffix=".hpl", include_user_meta=True):
+            parsed = parse_object_name(object.object_name)
+            if parsed is not None:
+                entries.append(PipelineCatalogEntry(
+                    object_name=object.object_name,
+                    **_entry_fields(*parsed, object.size, object.etag, object.last_modified, object.metadata),
+                ))
+    return entries
+
+
+def _matches(entry, query: str, match: str) -> bool:
+    # Same matching as search_entries
+    name, description = entry.name.lower(), entry.description.lower()
+    if match == "prefix":
+        return name.startswith(query.lower())
+    tokens = query.lower().split() if match == "token" else [query.lower()]
+    return all(token in name or token in description for token in tokens)
+
+
+def list_entries(request, queryset, prefixes, query: str = None, default_sort="name") -> Tuple[list, Union[str, None]]:
+    """Searches and paginates catalog entries, see `search_entries` and `paginate`
+
+    Until the catalog has been reconciled, e.g. on the first start, the entries are read from the objects directly
+    under `prefixes` instead and are searched and sorted the same way, but returned on a single page.
+    """
+    query = query or request.GET.get("q")
+    match = request.GET.get("match", "substring")
+    if is_reconciled():
+        return paginate(request, search_entries(queryset, query, match), default_sort)
+    entries = [entry for entry in _bucket_entries(prefixes) if not query or _matches(entry, query, match)]
+    sort = request.GET.get("sort")
+    field, descending = SORTS[sort if sort in SORTS else default_sort]
+    return sorted(entries, key=lambda entry: getattr(entry, field), reverse=descending), None
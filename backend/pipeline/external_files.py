@@ -0,0 +1,59 @@
+import logging
+import os
+import time
+from utils.minio import client, iter_objects
+
+_log = logging.getLogger('ExternalFiles')
+
+BUCKET = "pipelines"
+EXTERNAL_FILES_PREFIX = "external_files/"
+# hop-server reads the external files of the pipelines it runs from its local volume
+LOCAL_DIR = "/hop/pipelines"
+# Local files modified more recently may belong to an upload in progress
+UPLOAD_GRACE_PERIOD = 3600  # seconds
+# Suffixes of the partial copies written by the upload view and by `fget_object`
+PARTIAL_SUFFIXES = (".part", ".part.minio")
+
+
+def is_external_file(object_name: str) -> bool:
+    return object_name.startswith(EXTERNAL_FILES_PREFIX)
+
+
+def local_path(object_name: str) -> str:
+    return os.path.join(LOCAL_DIR, object_name)
+
+
+def copy_to_local(object_name: str):
+    """Downloads an external file to its local copy, which is replaced at once by `fget_object`"""
+    client.fget_object(BUCKET, object_name, local_path(object_name))
+
+
+def remove_local_copy(object_name: str):
+    try:
+        os.remove(local_path(object_name))
+    except FileNotFoundError:
+        pass
+
+
+def prune_local_copies():
+    """Removes the local copies of the external files no longer in the bucket, and partial copies left behind
+
+    The objects are the reference: their copies are removed with them by the `sync_pipeline_catalog` command,
+    this repairs the copies left when a removal was missed. Files younger than `UPLOAD_GRACE_PERIOD` are kept.
+    """
+    directory = local_path(EXTERNAL_FILES_PREFIX)
+    if not os.path.isdir(directory):
+        return
+    modified_before = time.time() - UPLOAD_GRACE_PERIOD
+    object_names = {
+        object.object_name for object in iter_objects(BUCKET, prefix=EXTERNAL_FILES_PREFIX, recursive=True)
+    }
+    for root, _, files in os.walk(directory):
+        for file in files:
+            path = os.path.join(root, file)
+            if os.path.getmtime(path) > modified_before:
+                continue
+            object_name = os.path.relpath(path, LOCAL_DIR).replace(os.sep, "/")
+            if file.endswith(PARTIAL_SUFFIXES) or object_name not in object_names:
+                _log.info(f"Removing the stale local copy {path}")
+                os.remove(path)
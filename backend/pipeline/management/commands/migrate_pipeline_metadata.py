@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from minio.error import S3Error
+from utils.minio import client, iter_objects
+from pipeline.catalog import parse_object_name
+from pipeline.metadata_helper import from_user_metadata, get_sidecar_metadata, save_pipeline_metadata
+
+
+class Command(BaseCommand):
+    help = "Moves the metadata of pipelines from their JSON sidecar files to the user-metadata of the .hpl objects"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delete-sidecars",
+            action="store_true",
+            help="Delete the JSON sidecar files once their metadata has been migrated",
+        )
+
+    def handle(self, *args, **options):
+        migrated = 0
+        objects = iter_objects(
+            "pipelines", prefix="pipelines-created/", suffix=".hpl", recursive=True, include_user_meta=True
+        )
+        for object in objects:
+            parsed = parse_object_name(object.object_name)
+            if parsed is None:
+                self.stdout.write(f"{object.object_name} is not a pipeline of a user, skipping")
+                continue
+            _, user_id, pipeline_name = parsed
+            metadata = from_user_metadata(object.metadata)
+            if metadata is None:
+                metadata = get_sidecar_metadata(client, user_id, pipeline_name)
+                if metadata is None:
+                    self.stdout.write(f"No metadata found for {object.object_name}, skipping")
+                    continue
+                if not save_pipeline_metadata(client, user_id, pipeline_name, metadata):
+                    self.stderr.write(f"Unable to migrate the metadata of {object.object_name}")
+                    continue
+                migrated += 1
+
+            if options["delete_sidecars"]:
+                try:
+                    client.remove_object("pipelines", f"pipelines-created/{user_id}/{pipeline_name}.json")
+                except S3Error as err:
+                    self.stderr.write(f"Unable to delete the sidecar of {object.object_name}: {err}")
+
+        self.stdout.write(self.style.SUCCESS(f"Migrated the metadata of {migrated} pipelines"))
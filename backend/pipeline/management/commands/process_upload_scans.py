@@ -0,0 +1,72 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from pipeline.models import UploadScanJob
+from pipeline.quarantine import ORPHAN_GRACE_PERIOD, process_job, remove_orphans
+
+_log = logging.getLogger('UploadQuarantine')
+
+
+class Command(BaseCommand):
+    help = "Scans the uploads waiting in quarantine and promotes the clean ones to their final objects"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=2,
+            help="Number of uploads scanned concurrently",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2,
+            help="Seconds to wait before looking for new uploads when there are none",
+        )
+
+    def handle(self, *args, **options):
+        # Scans interrupted by a restart are started again
+        UploadScanJob.objects.filter(status=UploadScanJob.SCANNING).update(status=UploadScanJob.PENDING)
+        remove_orphans()
+        orphans_removed = time.monotonic()
+
+        workers = options["workers"]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                close_old_connections()
+                jobs = [
+                    job for job in UploadScanJob.objects.filter(status=UploadScanJob.PENDING).order_by("created")[:workers]
+                    if self._claim(job)
+                ]
+                if not jobs:
+                    # Uploads kept by the grace period are removed once it is over
+                    if time.monotonic() - orphans_removed > ORPHAN_GRACE_PERIOD.total_seconds():
+                        self._remove_orphans()
+                        orphans_removed = time.monotonic()
+                    time.sleep(options["interval"])
+                    continue
+                list(executor.map(self._process, jobs))
+
+    def _remove_orphans(self):
+        try:
+            remove_orphans()
+        except Exception as e:
+            _log.error(f"Unable to remove the orphaned uploads: {e}")
+
+    def _claim(self, job):
+        claimed = UploadScanJob.objects.filter(id=job.id, status=UploadScanJob.PENDING).update(
+            status=UploadScanJob.SCANNING
+        )
+        job.status = UploadScanJob.SCANNING
+        return claimed == 1
+
+    def _process(self, job):
+        try:
+            process_job(job)
+        except Exception as e:
+            _log.error(f"Unable to process upload {job.id}: {e}")
+        finally:
+            # Worker threads open their own database connection
+            connection.close()
@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+from urllib.parse import unquote_plus
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from utils.minio import client
+from pipeline.catalog import BUCKET, reconcile, remove_entry, sync_object
+from pipeline.external_files import is_external_file, prune_local_copies, remove_local_copy
+
+_log = logging.getLogger('PipelineCatalog')
+
+
+class Command(BaseCommand):
+    help = (
+        "Keeps the pipeline catalog, and the local copies of the external files, in sync with the pipelines bucket "
+        "using MinIO bucket notifications"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reconcile-interval",
+            type=int,
+            default=3600,
+            help="Seconds between two full reconciliations of the catalog with the bucket",
+        )
+        parser.add_argument(
+            "--retry-interval",
+            type=int,
+            default=5,
+            help="Seconds to wait before listening again after a notification stream error",
+        )
+
+    def handle(self, *args, **options):
+        # Uploads check for existing pipelines in MinIO directly until the catalog has been reconciled once
+        delay = options["retry_interval"]
+        while True:
+            try:
+                reconcile()
+                break
+            except Exception as e:
+                _log.error(f"Initial catalog reconciliation failed, retrying in {delay} seconds: {e}")
+            close_old_connections()
+            time.sleep(delay)
+            delay = min(delay * 2, options["reconcile_interval"])
+        self.stdout.write(self.style.SUCCESS("Pipeline catalog reconciled"))
+
+        threading.Thread(
+            target=self._reconcile_loop, args=(options["reconcile_interval"],), daemon=True
+        ).start()
+
+        while True:
+            try:
+                with client.listen_bucket_notification(
+                    BUCKET, events=["s3:ObjectCreated:*", "s3:ObjectRemoved:*"]
+                ) as events:
+                    for event in events:
+                        for record in event.get("Records", []):
+                            self._handle_record(record)
+            except Exception as e:
+                _log.error(f"Bucket notification stream failed: {e}")
+            time.sleep(options["retry_interval"])
+
+    def _reconcile_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            close_old_connections()
+            try:
+                reconcile()
+            except Exception as e:
+                _log.error(f"Catalog reconciliation failed: {e}")
+            try:
+                prune_local_copies()
+            except Exception as e:
+                _log.error(f"Unable to prune the local copies of the external files: {e}")
+
+    def _handle_record(self, record):
+        close_old_connections()
+        object = record["s3"]["object"]
+        object_name = unquote_plus(object["key"])
+        try:
+            if is_external_file(object_name):
+                # Not catalogued, only their local copy read by hop-server follows them
+                if record["eventName"].startswith("s3:ObjectRemoved:"):
+                    remove_local_copy(object_name)
+            elif object_name.endswith(".json"):
+                # Metadata of a pipeline not migrated yet changed, refresh its entry
+                sync_object(object_name.removesuffix(".json") + ".hpl")
+            elif record["eventName"].startswith("s3:ObjectRemoved:"):
+                remove_entry(object_name)
+            else:
+                sync_object(object_name)
+        except Exception as e:
+            _log.error(f"Unable to sync {object_name} in the catalog: {e}")
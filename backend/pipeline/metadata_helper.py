@@ -1,48 +1,119 @@
+from minio.commonconfig import CopySource, REPLACE
 from minio.error import S3Error
+from urllib.parse import quote, unquote
 import json
-from io import BytesIO
+import logging
 
+_log = logging.getLogger('PipelineMetadata')
 
-def save_pipeline_metadata(minio_client, user_id, pipeline_name: str, metadata: dict):
-    """Saves metadata as a JSON file in MinIO."""
-    json_data = json.dumps(metadata, indent=4)
-    json_bytes = json_data.encode("utf-8")
-    json_buffer = BytesIO(json_bytes)
-    json_object_name = f"pipelines-created/{user_id}/{pipeline_name}.json"
-    
-    try:
-        minio_client.put_object(
-            "pipelines", json_object_name, json_buffer, len(json_bytes), content_type="application/json"
-        )
-        print(f"Metadata saved for {pipeline_name}")
-    except S3Error as e:
-        print(f"Error saving metadata: {e}")
+# Pipeline metadata is stored as user-metadata of the .hpl object, so that listing the pipelines
+# with `include_user_meta=True` returns it without any additional request.
+# Metadata field -> user-metadata key (no underscores, as some proxies drop such headers)
+METADATA_KEYS = {
+    "description": "description",
+    "check_status": "check-status",
+    "check_text": "check-text",
+    "created": "created",
+}
+# S3 limits the user-metadata of an object to 2 KB, keys and (percent-encoded) values included
+MAX_USER_METADATA_SIZE = 2048
+# Room left for the description once the other fields are encoded
+MAX_ENCODED_DESCRIPTION_SIZE = 1536
+
+
+class MetadataTooLarge(ValueError):
+    pass
+
+
+class MetadataNotSaved(Exception):
+    pass
+
+
+def is_description_too_long(description) -> bool:
+    """Whether a description does not fit in the user-metadata of a pipeline once percent-encoded"""
+    return len(quote(str(description or ""), safe="")) > MAX_ENCODED_DESCRIPTION_SIZE
 
-def get_pipeline_metadata(minio_client, user_id: str, pipeline_name: str):
-    """Retrieves metadata JSON file from MinIO."""
+def empty_metadata():
+    return {
+        "description": "",
+        "check_status": "failed",
+        "check_text": "",
+        "created": ""
+    }
+
+def to_user_metadata(metadata: dict) -> dict:
+    """Encodes metadata as object user-metadata, percent-encoded as HTTP headers only allow ASCII.
+
+    Raises MetadataTooLarge if it exceeds the user-metadata size limit of S3, or if the description does not fit
+    in the room left for it.
+    """
+    if is_description_too_long(metadata.get("description")):
+        raise MetadataTooLarge(f"Pipeline description is more than {MAX_ENCODED_DESCRIPTION_SIZE} bytes once encoded")
+    user_metadata = {key: quote(str(metadata.get(field) or ""), safe="") for field, key in METADATA_KEYS.items()}
+    size = sum(len(f"x-amz-meta-{key}") + len(value) for key, value in user_metadata.items())
+    if size > MAX_USER_METADATA_SIZE:
+        raise MetadataTooLarge(f"Pipeline metadata is {size} bytes once encoded, at most {MAX_USER_METADATA_SIZE} are allowed")
+    return user_metadata
+
+def from_user_metadata(user_metadata) -> dict:
+    """Decodes metadata from the user-metadata of a listed or stat'ed object, None if it has none."""
+    if not user_metadata:
+        return None
+    headers = {key.lower(): value for key, value in user_metadata.items()}
+    if f"x-amz-meta-{METADATA_KEYS['check_status']}" not in headers:
+        return None
+    return {field: unquote(headers.get(f"x-amz-meta-{key}") or "") for field, key in METADATA_KEYS.items()}
+
+def get_sidecar_metadata(minio_client, user_id: str, pipeline_name: str):
+    """Retrieves metadata from the legacy JSON sidecar file, None if there is none."""
     json_object_name = f"pipelines-created/{user_id}/{pipeline_name}.json"
     try:
-        ## optimize this by using stat_object instead of get_object to check if the file exists
-        ## as get_objects tries to download the file first
-        minio_client.stat_object("pipelines", json_object_name)
         response = minio_client.get_object("pipelines", json_object_name)
-        metadata = json.loads(response.read().decode("utf-8"))
-        response.close()
-        response.release_conn()
-        return metadata
-
-    except S3Error as e:
-        # If the metadata file does not exist, return an empty dictionary
-        metadata = {
-                    "description": "",
-                    "check_status": "failed",
-                    "check_text": "",
-                    "created": ""
-                }
-        return metadata
+        try:
+            return json.loads(response.read().decode("utf-8"))
+        finally:
+            response.close()
+            response.release_conn()
+    except S3Error:
+        return None
+
+def save_pipeline_metadata(minio_client, user_id, pipeline_name: str, metadata: dict):
+    """Replaces the user-metadata of an existing pipeline with `metadata`, returns whether it has been saved."""
+    object_name = f"pipelines-created/{user_id}/{pipeline_name}.hpl"
+    try:
+        minio_client.copy_object(
+            "pipelines",
+            object_name,
+            CopySource("pipelines", object_name),
+            metadata=to_user_metadata(metadata),
+            metadata_directive=REPLACE,
+        )
+        _log.debug(f"Metadata saved for {object_name}")
+        return True
+    except (S3Error, MetadataTooLarge) as e:
+        _log.error(f"Error saving metadata of {object_name}: {e}")
+        return False
+
+def get_pipeline_metadata(minio_client, user_id: str, pipeline_name: str, user_metadata=None):
+    """Retrieves the metadata of a pipeline.
+
+    `user_metadata` can be given when already known from a listing, to avoid stat'ing the object.
+    Pipelines not migrated yet fall back to their JSON sidecar file.
+    """
+    if user_metadata is None:
+        try:
+            user_metadata = minio_client.stat_object(
+                "pipelines", f"pipelines-created/{user_id}/{pipeline_name}.hpl"
+            ).metadata
+        except S3Error:
+            user_metadata = None
+    metadata = from_user_metadata(user_metadata)
+    if metadata is None:
+        metadata = get_sidecar_metadata(minio_client, user_id, pipeline_name) or empty_metadata()
+    return metadata
 
 def update_pipeline_metadata(client, user_id, pipeline_name: str, new_metadata: dict):
-    """Updates the metadata JSON file in MinIO."""
+    """Updates the metadata of a pipeline, returns whether it has been saved."""
     existing_metadata = get_pipeline_metadata(client, user_id, pipeline_name) or {}
     existing_metadata.update(new_metadata)
-    save_pipeline_metadata(client, user_id, pipeline_name, existing_metadata)
+    return save_pipeline_metadata(client, user_id, pipeline_name, existing_metadata)
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineCatalogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_name', models.CharField(max_length=1024, unique=True, verbose_name='Object Name')),
+                ('kind', models.CharField(choices=[('pipeline', 'Pipeline'), ('template', 'Template')], max_length=20, verbose_name='Kind')),
+                ('owner', models.CharField(blank=True, max_length=64, null=True, verbose_name='Owner')),
+                ('name', models.CharField(max_length=255, verbose_name='Name')),
+                ('size', models.BigIntegerField(default=0, verbose_name='Size')),
+                ('etag', models.CharField(blank=True, default='', max_length=64, verbose_name='ETag')),
+                ('description', models.TextField(blank=True, default='', verbose_name='Description')),
+                ('check_status', models.CharField(default='failed', max_length=20, verbose_name='Check Status')),
+                ('check_text', models.CharField(blank=True, default='', max_length=255, verbose_name='Check Text')),
+                ('created', models.DateTimeField(blank=True, null=True, verbose_name='Created')),
+                ('updated', models.DateTimeField(blank=True, null=True, verbose_name='Updated')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'owner', 'name'], name='pipeline_pi_kind_a47881_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:00
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pipeline', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadScanJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('pipeline', 'Pipeline'), ('external_file', 'External File')], max_length=20, verbose_name='Kind')),
+                ('owner', models.CharField(max_length=64, verbose_name='Owner')),
+                ('name', models.CharField(max_length=255, verbose_name='Name')),
+                ('object_name', models.CharField(max_length=1024, verbose_name='Object Name')),
+                ('description', models.TextField(blank=True, default='', verbose_name='Description')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('scanning', 'Scanning'), ('promoted', 'Promoted'), ('infected', 'Infected'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='Status')),
+                ('verdict', models.CharField(blank=True, default='', max_length=255, verbose_name='Verdict')),
+                ('message', models.CharField(blank=True, default='', max_length=255, verbose_name='Message')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Created')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Updated')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created'], name='pipeline_up_status_f3ac22_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pipeline', '0002_uploadscanjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pipelinecatalogentry',
+            index=models.Index(fields=['kind', 'owner', 'created'], name='pipeline_pi_kind_8e7286_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pipeline', '0003_pipelinecatalogentry_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogReconciliation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started', models.DateTimeField(verbose_name='Started')),
+                ('finished', models.DateTimeField(auto_now_add=True, verbose_name='Finished')),
+                ('objects_seen', models.IntegerField(default=0, verbose_name='Objects Seen')),
+                ('entries_removed', models.IntegerField(default=0, verbose_name='Entries Removed')),
+            ],
+        ),
+    ]
@@ -0,0 +1,92 @@
+import uuid
+from django.db import models
+
+
+class PipelineCatalogEntry(models.Model):
+    """Pipeline or template stored in the `pipelines` bucket, kept in sync by the `sync_pipeline_catalog` command"""
+    PIPELINE = "pipeline"
+    TEMPLATE = "template"
+    KIND_CHOICES = [
+        (PIPELINE, "Pipeline"),
+        (TEMPLATE, "Template"),
+    ]
+
+    object_name = models.CharField("Object Name", max_length=1024, unique=True)
+    kind = models.CharField("Kind", max_length=20, choices=KIND_CHOICES)
+    # User ID of the owner, empty for global templates
+    owner = models.CharField("Owner", max_length=64, null=True, blank=True)
+    name = models.CharField("Name", max_length=255)
+    size = models.BigIntegerField("Size", default=0)
+    etag = models.CharField("ETag", max_length=64, blank=True, default="")
+    description = models.TextField("Description", blank=True, default="")
+    check_status = models.CharField("Check Status", max_length=20, default="failed")
+    check_text = models.CharField("Check Text", max_length=255, blank=True, default="")
+    created = models.DateTimeField("Created", null=True, blank=True)
+    updated = models.DateTimeField("Updated", null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["kind", "owner", "name"]),
+            models.Index(fields=["kind", "owner", "created"]),
+        ]
+
+    def __str__(self):
+        return self.object_name
+
+
+class CatalogReconciliation(models.Model):
+    """Full reconciliation of the catalog with the bucket, until one has completed the catalog may miss objects"""
+    started = models.DateTimeField("Started")
+    finished = models.DateTimeField("Finished", auto_now_add=True)
+    objects_seen = models.IntegerField("Objects Seen", default=0)
+    entries_removed = models.IntegerField("Entries Removed", default=0)
+
+    def __str__(self):
+        return f"{self.started} - {self.finished}"
+
+
+class UploadScanJob(models.Model):
+    """Upload waiting in quarantine for its antivirus scan, processed by the `process_upload_scans` command"""
+    PIPELINE = "pipeline"
+    EXTERNAL_FILE = "external_file"
+    KIND_CHOICES = [
+        (PIPELINE, "Pipeline"),
+        (EXTERNAL_FILE, "External File"),
+    ]
+    PENDING = "pending"
+    SCANNING = "scanning"
+    PROMOTED = "promoted"
+    INFECTED = "infected"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SCANNING, "Scanning"),
+        (PROMOTED, "Promoted"),
+        (INFECTED, "Infected"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField("Kind", max_length=20, choices=KIND_CHOICES)
+    owner = models.CharField("Owner", max_length=64)
+    name = models.CharField("Name", max_length=255)
+    # Final object name, the upload is stored under `quarantine/{id}` until it is scanned
+    object_name = models.CharField("Object Name", max_length=1024)
+    description = models.TextField("Description", blank=True, default="")
+    status = models.CharField("Status", max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    verdict = models.CharField("Verdict", max_length=255, blank=True, default="")
+    message = models.CharField("Message", max_length=255, blank=True, default="")
+    created = models.DateTimeField("Created", auto_now_add=True)
+    updated = models.DateTimeField("Updated", auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created"]),
+        ]
+
+    @property
+    def quarantine_object_name(self):
+        return f"quarantine/{self.id}"
+
+    def __str__(self):
+        return f"{self.object_name} ({self.status})"
@@ -0,0 +1,112 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from minio.commonconfig import CopySource, REPLACE
+from minio.error import S3Error
+from utils.clamav import scanner
+from utils.minio import client, ObjectFile
+from .catalog import ObjectExists, reserve_entry, sync_object
+from .external_files import copy_to_local
+from .metadata_helper import to_user_metadata
+from .models import UploadScanJob
+from .validator import PipelineValidator, cache_pipeline_validity, get_verdict
+
+_log = logging.getLogger('UploadQuarantine')
+
+BUCKET = "pipelines"
+QUARANTINE_PREFIX = "quarantine/"
+# Uploads are stored before their job is saved, younger quarantined objects may still get one
+ORPHAN_GRACE_PERIOD = timedelta(hours=1)
+
+
+def quarantine_upload(uploaded_file, kind, owner, name, object_name, description="") -> UploadScanJob:
+    """Stores an upload in quarantine, it is promoted to `object_name` by the `process_upload_scans` command once scanned"""
+    job = UploadScanJob(
+        kind=kind, owner=owner, name=name, object_name=object_name, description=description or ""
+    )
+    # The job is saved once its upload is complete, so that it is never picked up before
+    client.put_object(BUCKET, job.quarantine_object_name, uploaded_file, length=uploaded_file.size)
+    try:
+        job.save()
+    except BaseException:
+        client.remove_object(BUCKET, job.quarantine_object_name)
+        raise
+    return job
+
+
+def process_job(job: UploadScanJob):
+    """Scans a quarantined upload, then promotes it to its final object or deletes it"""
+    try:
+        validator = PipelineValidator(stop_at_first_violation=True) if job.kind == UploadScanJob.PIPELINE else None
+        signature = scanner.scan_file(
+            ObjectFile(BUCKET, job.quarantine_object_name), consumers=[validator.feed] if validator else ()
+        )
+        if signature is not None:
+            _log.error(f"Malicious file uploaded for {job.object_name}: {signature}")
+            job.status = UploadScanJob.INFECTED
+            job.verdict = signature
+        elif job.kind == UploadScanJob.PIPELINE:
+            _promote_pipeline(job, validator)
+        else:
+            _promote_external_file(job)
+    except Exception as e:
+        _log.error(f"Unable to process the upload of {job.object_name}: {e}")
+        job.status = UploadScanJob.FAILED
+        job.message = str(e)[:255]
+
+    try:
+        client.remove_object(BUCKET, job.quarantine_object_name)
+    except S3Error as e:
+        _log.error(f"Unable to remove {job.quarantine_object_name}: {e}")
+    job.save()
+
+
+def _promote_pipeline(job: UploadScanJob, validator: PipelineValidator):
+    valid_pipeline, check_text = get_verdict(validator.close())
+    metadata = {
+        "description": job.description,
+        "created": f"{datetime.utcnow()}",
+        "check_status": "success" if valid_pipeline else "failed",
+        "check_text": check_text
+    }
+    # The catalog entry is reserved first, so that a concurrent upload of the same name cannot be overwritten
+    try:
+        with reserve_entry(job.object_name):
+            result = client.copy_object(
+                BUCKET,
+                job.object_name,
+                CopySource(BUCKET, job.quarantine_object_name),
+                metadata=to_user_metadata(metadata),
+                metadata_directive=REPLACE,
+            )
+    except ObjectExists:
+        job.status = UploadScanJob.FAILED
+        job.message = f"file already exists with the name {job.name}.hpl"
+        return
+    cache_pipeline_validity(result.etag, (valid_pipeline, check_text))
+    sync_object(job.object_name)
+    job.status = UploadScanJob.PROMOTED
+    job.message = check_text
+
+
+def _promote_external_file(job: UploadScanJob):
+    client.copy_object(BUCKET, job.object_name, CopySource(BUCKET, job.quarantine_object_name))
+    copy_to_local(job.object_name)
+    job.status = UploadScanJob.PROMOTED
+
+
+def remove_orphans():
+    """Removes the quarantined uploads without a job waiting for them, e.g. after the database has been flushed
+
+    Uploads younger than `ORPHAN_GRACE_PERIOD` are kept, as their job may not have been saved yet.
+    """
+    uploaded_before = datetime.now(timezone.utc) - ORPHAN_GRACE_PERIOD
+    waiting = {
+        str(id) for id in UploadScanJob.objects.filter(
+            status__in=[UploadScanJob.PENDING, UploadScanJob.SCANNING]
+        ).values_list("id", flat=True)
+    }
+    for object in client.list_objects(BUCKET, prefix=QUARANTINE_PREFIX):
+        if object.last_modified is not None and object.last_modified > uploaded_before:
+            continue
+        if object.object_name.removeprefix(QUARANTINE_PREFIX) not in waiting:
+            client.remove_object(BUCKET, object.object_name)
@@ -0,0 +1,3 @@
+# Importing the rule modules registers their rule sets
+from .registry import RULE_SETS
+from . import parquet_file_output_rule
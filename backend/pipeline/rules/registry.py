@@ -0,0 +1,20 @@
+# Rule sets validating pipeline transforms, keyed by transform type
+RULE_SETS = {}
+
+
+def register(rule_set_class):
+    """Class decorator registering a TransformRuleSet for the transforms of its `transform_type`"""
+    RULE_SETS.setdefault(rule_set_class.transform_type, []).append(rule_set_class())
+    return rule_set_class
+
+
+class TransformRuleSet:
+    transform_type = None
+    # Whether a pipeline must contain at least one transform of this type
+    required = False
+    missing_error_text = None
+    rules = []
+
+    def check(self, fields: dict):
+        """Returns the error texts of the rules not satisfied by the indexed children of a transform"""
+        return [rule.error_text for rule in self.rules if not rule.is_satisfied(fields)]
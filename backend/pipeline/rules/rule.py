@@ -3,3 +3,6 @@ class Rule:
         self.name = name
         self.value = value
         self.error_text = error_text
+
+    def is_satisfied(self, fields: dict):
+        return fields.get(self.name) == self.value
@@ -0,0 +1,340 @@
+import os
+import tempfile
+import time
+from unittest import mock
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+from datetime import datetime, timezone
+from django.test import RequestFactory
+from rest_framework.request import Request
+from minio.error import S3Error
+from rest_framework.exceptions import ValidationError
+from utils.clamav import ClamdScanner
+from utils.minio import upload_scanned_file
+from .catalog import _decode_cursor, _encode_cursor, get_version_token, list_entries, paginate
+from .rules import RULE_SETS
+from .rules.registry import TransformRuleSet, register
+from .rules.rule import Rule
+from .validator import PipelineValidator, get_pipeline_violations, get_verdict
+from .catalog import ObjectExists
+from . import external_files
+from .views import PipelineDownloadView, PipelineUploadView
+from .metadata_helper import (
+    MAX_USER_METADATA_SIZE, MetadataTooLarge, from_user_metadata, is_description_too_long, save_pipeline_metadata,
+    to_user_metadata,
+)
+
+
+class PipelineMetadataTest(SimpleTestCase):
+    def metadata(self, description):
+        return {"description": description, "check_status": "success", "check_text": "ValidPipeline", "created": "2024-01-01"}
+
+    def test_round_trip(self):
+        metadata = self.metadata("Données de test")
+        user_metadata = {f"X-Amz-Meta-{key}": value for key, value in to_user_metadata(metadata).items()}
+        self.assertEqual(from_user_metadata(user_metadata), metadata)
+
+    def test_long_non_ascii_description_is_rejected(self):
+        # Each "é" is percent-encoded to 6 bytes
+        description = "é" * 300
+        self.assertTrue(is_description_too_long(description))
+        with self.assertRaises(MetadataTooLarge):
+            to_user_metadata(self.metadata(description))
+
+    def test_description_within_limit_fits(self):
+        description = "a" * 1500
+        self.assertFalse(is_description_too_long(description))
+        self.assertLessEqual(sum(len(value) for value in to_user_metadata(self.metadata(description)).values()), MAX_USER_METADATA_SIZE)
+
+    def test_failed_save_is_reported(self):
+        minio_client = mock.Mock()
+        minio_client.copy_object.side_effect = S3Error("InternalError", "error", "resource", "request", "host", None)
+        self.assertFalse(save_pipeline_metadata(minio_client, "user", "pipeline", self.metadata("description")))
+        self.assertFalse(save_pipeline_metadata(mock.Mock(), "user", "pipeline", self.metadata("é" * 300)))
+
+
+class CatalogCursorTest(SimpleTestCase):
+    def test_round_trip_for_each_sort(self):
+        created = datetime(2024, 1, 1, 12, 30, tzinfo=timezone.utc)
+        self.assertEqual(_decode_cursor(_encode_cursor("name", "pipeline", 7), "name"), ("pipeline", 7))
+        self.assertEqual(_decode_cursor(_encode_cursor("-name", "pipeline", 7), "-name"), ("pipeline", 7))
+        self.assertEqual(_decode_cursor(_encode_cursor("created", created, 7), "created"), (created, 7))
+        self.assertEqual(_decode_cursor(_encode_cursor("-created", created, 7), "-created"), (created, 7))
+
+    def test_cursor_of_another_sort_is_rejected(self):
+        with self.assertRaises(ValueError):
+            _decode_cursor(_encode_cursor("name", "pipeline", 7), "created")
+        with self.assertRaises(ValueError):
+            _decode_cursor(_encode_cursor("created", datetime.now(timezone.utc), 7), "-created")
+
+    def test_invalid_cursor_is_a_validation_error(self):
+        cursors = [
+            _encode_cursor("name", "pipeline", 7),
+            _encode_cursor("created", "not a date", 7),
+            "not base64!",
+        ]
+        for cursor in cursors:
+            request = RequestFactory().get("/", {"sort": "created", "cursor": cursor, "limit": 10})
+            with self.assertRaises(ValidationError):
+                paginate(request, mock.MagicMock())
+
+
+class CatalogFallbackTest(SimpleTestCase):
+    def list(self, **params):
+        objects = [
+            mock.Mock(object_name=f"templates/{name}.hpl", size=1, etag="etag", metadata={},
+                      last_modified=datetime(2024, 1, day, tzinfo=timezone.utc))
+            for day, name in [(2, "b-template"), (1, "a-template"), (3, "other")]
+        ]
+        queryset = mock.MagicMock()
+        with mock.patch("pipeline.catalog.is_reconciled", return_value=False), \
+                mock.patch("pipeline.catalog.iter_objects", return_value=objects):
+            entries, next_cursor = list_entries(RequestFactory().get("/", params), queryset, ["templates/"])
+        self.assertIsNone(next_cursor)
+        self.assertFalse(queryset.method_calls)
+        return [entry.name for entry in entries]
+
+    def test_lists_the_bucket_until_reconciled(self):
+        self.assertEqual(self.list(), ["a-template", "b-template", "other"])
+        self.assertEqual(self.list(q="template", sort="-created"), ["b-template", "a-template"])
+        self.assertEqual(self.list(q="a-", match="prefix"), ["a-template"])
+
+    def test_no_version_token_until_reconciled(self):
+        with mock.patch("pipeline.catalog.is_reconciled", return_value=False):
+            self.assertIsNone(get_version_token(mock.MagicMock()))
+
+
+class PipelineDownloadRangeTest(SimpleTestCase):
+    def test_parse_range(self):
+        parse_range = PipelineDownloadView()._parse_range
+        self.assertEqual(parse_range("bytes=0-4", 10), (0, 4))
+        self.assertEqual(parse_range("bytes=5-", 10), (5, 9))
+        self.assertEqual(parse_range("bytes=5-100", 10), (5, 9))
+        self.assertEqual(parse_range("bytes=-3", 10), (7, 9))
+        self.assertEqual(parse_range("bytes=-100", 10), (0, 9))
+
+    def test_ignored_ranges(self):
+        parse_range = PipelineDownloadView()._parse_range
+        for range_header in ["items=0-4", "bytes=0-1,4-5", "bytes=4-1", "bytes=a-b", "bytes=-", "bytes=4"]:
+            self.assertIsNone(parse_range(range_header, 10), range_header)
+
+    def test_unsatisfiable_ranges(self):
+        parse_range = PipelineDownloadView()._parse_range
+        for range_header, size in [("bytes=10-", 10), ("bytes=-0", 10), ("bytes=-5", 0)]:
+            with self.assertRaises(ValueError):
+                parse_range(range_header, size)
+
+    def download(self, stat_error=None, get_errors=(), **headers):
+        stat = mock.Mock(size=10, etag="etag", last_modified=datetime(2024, 1, 1, tzinfo=timezone.utc))
+        object_response = mock.Mock()
+        object_response.stream.return_value = iter([b"2345"])
+        with mock.patch("pipeline.views.client") as minio_client, \
+                mock.patch("pipeline.views.get_current_user_id", return_value="user"):
+            minio_client.stat_object.side_effect = stat_error
+            minio_client.stat_object.return_value = stat
+            minio_client.get_object.side_effect = [*get_errors, object_response]
+            response = PipelineDownloadView().get(Request(RequestFactory().get("/", **headers)), name="pipeline")
+        return response, minio_client
+
+    def s3_error(self, code):
+        return S3Error(code, "error", "resource", "request", "host", None)
+
+    def test_missing_pipeline(self):
+        response, _ = self.download(stat_error=self.s3_error("NoSuchKey"))
+        self.assertEqual(response.status_code, 404)
+        response, _ = self.download(get_errors=[self.s3_error("NoSuchKey")])
+        self.assertEqual(response.status_code, 404)
+
+    def test_pipeline_replaced_after_the_stat(self):
+        response, minio_client = self.download(get_errors=[self.s3_error("PreconditionFailed")])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(minio_client.stat_object.call_count, 2)
+        response, _ = self.download(get_errors=[self.s3_error("PreconditionFailed")] * 2)
+        self.assertEqual(response.status_code, 412)
+
+    def test_minio_errors_are_not_a_missing_pipeline(self):
+        response, _ = self.download(stat_error=self.s3_error("InternalError"))
+        self.assertEqual(response.status_code, 502)
+        response, _ = self.download(get_errors=[ConnectionError("refused")])
+        self.assertEqual(response.status_code, 502)
+
+    def test_partial_content(self):
+        response, minio_client = self.download(HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response["Content-Length"], "4")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(minio_client.get_object.call_args.kwargs["offset"], 2)
+        self.assertEqual(minio_client.get_object.call_args.kwargs["length"], 4)
+
+    def test_range_not_satisfiable(self):
+        response, minio_client = self.download(HTTP_RANGE="bytes=10-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+        minio_client.get_object.assert_not_called()
+
+    def test_range_of_another_version_sends_the_whole_file(self):
+        response, _ = self.download(HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Length"], "10")
+
+
+class UploadScanCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.scanner = ClamdScanner("clamav", 3310, pool_size=1, max_concurrent_scans=1,
+                                    cache=LocMemCache("clamav-test", {}), cache_ttl=60)
+        self.scanner._database_version = "26885"
+        self.scanner._database_version_checked = float("inf")
+        self.connection = mock.Mock(last_used=float("inf"))
+        self.connection.end_stream.return_value = "stream: OK"
+        for patcher in [
+            mock.patch("utils.minio.scanner", self.scanner),
+            mock.patch.object(self.scanner, "_connect", return_value=self.connection),
+            mock.patch("utils.minio.client"),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def upload(self):
+        uploaded = bytearray()
+        uploaded_file = SimpleUploadedFile("pipeline.hpl", b"<pipeline></pipeline>")
+        with mock.patch("utils.minio.client.put_object", side_effect=lambda *args, **kwargs: uploaded.extend(args[2].read())):
+            scan_result, _ = upload_scanned_file(uploaded_file, "pipelines", "pipeline.hpl")
+        self.assertIsNone(scan_result)
+        self.assertEqual(bytes(uploaded), b"<pipeline></pipeline>")
+
+    def test_identical_upload_is_not_scanned_again(self):
+        self.upload()
+        self.assertEqual(self.scanner._connect.call_count, 1)
+        self.upload()
+        self.assertEqual(self.scanner._connect.call_count, 1)
+        self.assertEqual(self.connection.start_stream.call_count, 1)
+        self.assertEqual(self.scanner.stats()["hits"], 1)
+
+    def test_scan_time_histogram(self):
+        self.scanner._record(hit=False, scan_time=0.2)
+        self.scanner._record(hit=False, scan_time=45)
+        stats = self.scanner.stats()
+        self.assertEqual(stats["scan_time_sum"], 45.2)
+        self.assertEqual(stats["scan_time_buckets"]["0.1"], 0)
+        self.assertEqual(stats["scan_time_buckets"]["0.25"], 1)
+        self.assertEqual(stats["scan_time_buckets"]["30"], 1)
+        self.assertEqual(stats["scan_time_buckets"]["+Inf"], 2)
+
+
+class PipelineUploadConflictTest(SimpleTestCase):
+    def test_reserved_name_is_a_conflict(self):
+        uploaded_file = SimpleUploadedFile("pipeline.hpl", b"<pipeline></pipeline>")
+        request = RequestFactory().post("/", {"name": "pipeline", "description": "", "uploadedFile": uploaded_file})
+        with mock.patch("pipeline.views.get_current_user_id", return_value="user"), \
+                mock.patch("pipeline.views.reserve_entry", side_effect=ObjectExists("pipeline")), \
+                mock.patch("pipeline.views.upload_scanned_file") as upload_scanned_file:
+            response = PipelineUploadView.as_view()(request)
+        self.assertEqual(response.status_code, 409)
+        upload_scanned_file.assert_not_called()
+
+
+def make_pipeline(*transforms):
+    return ("<pipeline><info><name>test</name></info>" + "".join(transforms) + "</pipeline>").encode()
+
+
+def make_transform(type, name="output", **fields):
+    children = "".join(f"<{tag}>{value}</{tag}>" for tag, value in fields.items())
+    return f"<transform><name>{name}</name><type>{type}</type>{children}</transform>"
+
+
+PARQUET_FIELDS = {
+    "filename_base": "out", "filename_ext": "parquet", "filename_include_copy": "N", "filename_include_date": "N",
+    "filename_include_datetime": "N", "filename_include_split": "N", "filename_include_time": "N",
+}
+
+
+class PipelineValidatorTest(SimpleTestCase):
+    def verdict(self, pipeline):
+        return get_verdict(get_pipeline_violations("pipeline", source=pipeline))
+
+    def test_valid_pipeline(self):
+        self.assertEqual(self.verdict(make_pipeline(make_transform("ParquetFileOutput", **PARQUET_FIELDS))), (True, "ValidPipeline"))
+
+    def test_missing_required_transform(self):
+        self.assertEqual(self.verdict(make_pipeline(make_transform("Dummy"))), (False, "ValidationFailed"))
+
+    def test_first_violation_is_reported(self):
+        fields = {**PARQUET_FIELDS, "filename_base": " ", "filename_ext": "csv"}
+        violations = get_pipeline_violations("pipeline", source=make_pipeline(make_transform("ParquetFileOutput", **fields)))
+        self.assertEqual(violations, [("output", "InvalidFilenameBase"), ("output", "InvalidFilenameExtension")])
+        self.assertEqual(get_verdict(violations), (False, "InvalidFilenameBase"))
+
+    def test_stop_at_first_violation(self):
+        fields = {**PARQUET_FIELDS, "filename_base": " ", "filename_ext": "csv"}
+        pipeline = make_pipeline(
+            make_transform("ParquetFileOutput", **fields), make_transform("ParquetFileOutput", name="second", **fields)
+        )
+        violations = get_pipeline_violations("pipeline", source=pipeline, stop_at_first_violation=True)
+        self.assertEqual(violations, [("output", "InvalidFilenameBase"), ("output", "InvalidFilenameExtension")])
+        self.assertEqual(get_verdict(violations), self.verdict(pipeline))
+
+    def test_stopped_validator_ignores_the_rest_of_the_pipeline(self):
+        validator = PipelineValidator(stop_at_first_violation=True)
+        validator.feed(make_pipeline(make_transform("Dummy")).removesuffix(b"</pipeline>"))
+        self.assertFalse(validator.stopped)
+        validator.feed(make_transform("ParquetFileOutput", **{**PARQUET_FIELDS, "filename_ext": "csv"}).encode())
+        self.assertTrue(validator.stopped)
+        # The malformed end of the pipeline is never parsed
+        validator.feed(b"<not closed>")
+        self.assertEqual(validator.close(), [("output", "InvalidFilenameExtension")])
+
+    def test_malformed_pipeline(self):
+        self.assertEqual(self.verdict(b"<pipeline><transform>"), (False, "ValidationFailed"))
+
+    def test_chunked_feed(self):
+        pipeline = make_pipeline(make_transform("ParquetFileOutput", **{**PARQUET_FIELDS, "filename_ext": "csv"}))
+        validator = PipelineValidator()
+        for i in range(len(pipeline)):
+            validator.feed(pipeline[i:i + 1])
+        self.assertEqual(validator.close(), [("output", "InvalidFilenameExtension")])
+
+    def test_registered_rule_set(self):
+        with mock.patch.dict(RULE_SETS):
+            @register
+            class DummyRuleSet(TransformRuleSet):
+                transform_type = "Dummy"
+                rules = [Rule("mode", "strict", "InvalidMode")]
+
+            pipeline = make_pipeline(
+                make_transform("ParquetFileOutput", **PARQUET_FIELDS), make_transform("Dummy", name="dummy", mode="lax")
+            )
+            self.assertEqual(self.verdict(pipeline), (False, "InvalidMode"))
+        self.assertNotIn("Dummy", RULE_SETS)
+
+
+class ExternalFileLocalCopiesTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(external_files, "LOCAL_DIR", directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        os.makedirs(external_files.local_path("external_files/"))
+
+    def write(self, object_name, age):
+        path = external_files.local_path(object_name)
+        with open(path, "w") as file:
+            file.write("data")
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+        return path
+
+    def test_copies_without_object_are_pruned(self):
+        kept = self.write("external_files/kept.csv", age=7200)
+        removed = self.write("external_files/removed.csv", age=7200)
+        partial = self.write("external_files/failed.csv.part", age=7200)
+        uploading = self.write("external_files/uploading.csv.part", age=10)
+        listed = [mock.Mock(object_name="external_files/kept.csv")]
+        with mock.patch.object(external_files, "iter_objects", return_value=listed):
+            external_files.prune_local_copies()
+        self.assertTrue(os.path.exists(kept))
+        self.assertTrue(os.path.exists(uploading))
+        self.assertFalse(os.path.exists(removed))
+        self.assertFalse(os.path.exists(partial))
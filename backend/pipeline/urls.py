@@ -1,14 +1,17 @@
 from django.urls import path
-from .views import TemplateView, PipelineDeleteView, PipelineUploadView, PipelineUploadExternalFilesView, PipelineDownloadView, PipelineListView, PipelineDetailView
+from .views import TemplateView, PipelineDeleteView, PipelineBulkDeleteView, PipelineUploadView, PipelineBulkImportView, PipelineUploadExternalFilesView, PipelineDownloadView, PipelineListView, PipelineDetailView, UploadScanStatusView
 
 urlpatterns = [
     path("", PipelineListView.as_view()),
     path("/list/", PipelineListView.as_view()),
     path("/upload/", PipelineUploadView.as_view()),
+    path("/upload/status/<uuid:job_id>", UploadScanStatusView.as_view()),
+    path("/import/", PipelineBulkImportView.as_view()),
     path("/upload-external-files/", PipelineUploadExternalFilesView.as_view()),
     path("/list/<str:query>", PipelineListView.as_view()),
     path("/<str:name>", PipelineDetailView.as_view()),
     path("/download/<str:name>", PipelineDownloadView.as_view()),
+    path("/delete/", PipelineBulkDeleteView.as_view()),
     path("/delete/<str:name>", PipelineDeleteView.as_view()),
     path("/template/", TemplateView.as_view()),
     path("/template/<str:query>", TemplateView.as_view()),
@@ -1,24 +1,152 @@
+import hashlib
+import io
+import os
 import xml.etree.ElementTree as ET
+from django.core.cache import cache
 from utils.minio import client
 
-from .rules.parquet_file_output_rule import ParquetFileOutputRule
+from .rules import RULE_SETS
+
+VALIDATION_CACHE_TIMEOUT = 24 * 60 * 60  # seconds
+
+def _get_ruleset_version():
+    """Hash of the validation code, so that cached verdicts are discarded whenever the rules change"""
+    digest = hashlib.sha256()
+    rules_dir = os.path.join(os.path.dirname(__file__), "rules")
+    paths = [__file__] + sorted(
+        os.path.join(rules_dir, file_name) for file_name in os.listdir(rules_dir) if file_name.endswith(".py")
+    )
+    for path in paths:
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:12]
+
+RULESET_VERSION = _get_ruleset_version()
+
 # A XML Schema validation check should be implemented in the future to ensure that the XML data is valid
-def check_pipeline_validity(name, user_id=None):
-    valid_pipeline = False
-    check_text = "ValidationFailed"
-    # Download the pipeline in /tmp
-    f = client.fget_object("pipelines", f"/pipelines-created/{user_id}/{name}.hpl", file_path=f"/tmp/{name}.hpl")
-    # Read the .hpl file
-    with open(f"/tmp/{name}.hpl", "r") as file:
-        xml_data = file.read()
-
-    # Parse the XML data
-    root = ET.fromstring(xml_data)
-    for transform in root.iter("transform"):
-        parquet_output_rule = ParquetFileOutputRule(transform)
-        # Ensure to run the validation only for ParquetFileOutput transforms
-        if(parquet_output_rule.is_parquet_transform()):
-            valid_pipeline, check_text = parquet_output_rule.is_valid()
-        # New rules can be added here to check for other types of transforms
-        ############################################
-    return valid_pipeline, check_text
+def check_pipeline_validity(name, user_id=None, source=None, etag=None):
+    """Validates a pipeline, returning whether it is valid and the text of its first violation.
+
+    `source` can be the pipeline content (bytes or a file-like object) or a local file path, the pipeline
+    is streamed from MinIO when it is not given. Verdicts are cached by object `etag` and rule-set version,
+    the ETag is looked up when the pipeline is read from MinIO.
+    """
+    if source is None and etag is None:
+        etag = client.stat_object("pipelines", f"pipelines-created/{user_id}/{name}.hpl").etag
+    if etag:
+        verdict = cache.get(f"pipeline-validity:{RULESET_VERSION}:{etag}")
+        if verdict is not None:
+            return tuple(verdict)
+
+    # Only the first violation is reported, the pipeline is not read past it
+    verdict = get_verdict(get_pipeline_violations(name, user_id, source, stop_at_first_violation=True))
+    if etag:
+        cache_pipeline_validity(etag, verdict)
+    return verdict
+
+def get_pipeline_violations(name, user_id=None, source=None, stop_at_first_violation=False):
+    """Returns the (transform name, error text) violations of a pipeline, see `check_pipeline_validity`
+
+    All of them are returned unless `stop_at_first_violation`, which stops reading the pipeline at the first one.
+    """
+    if source is None:
+        response = client.get_object("pipelines", f"pipelines-created/{user_id}/{name}.hpl")
+        try:
+            return _find_violations(response, stop_at_first_violation)
+        finally:
+            response.close()
+            response.release_conn()
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    if isinstance(source, str):
+        with open(source, "rb") as file:
+            return _find_violations(file, stop_at_first_violation)
+    return _find_violations(source, stop_at_first_violation)
+
+def get_verdict(violations):
+    """Returns the (valid, check_text) verdict of a pipeline from its violations"""
+    return not violations, violations[0][1] if violations else "ValidPipeline"
+
+def cache_pipeline_validity(etag, verdict):
+    cache.set(f"pipeline-validity:{RULESET_VERSION}:{etag}", verdict, VALIDATION_CACHE_TIMEOUT)
+
+def _find_violations(stream, stop_at_first_violation=False):
+    validator = PipelineValidator(stop_at_first_violation)
+    for chunk in iter(lambda: stream.read(64 * 1024), b""):
+        validator.feed(chunk)
+        if validator.stopped:
+            break
+    return validator.close()
+
+class PipelineValidator:
+    """Evaluates the registered rule sets of every transform in a single incremental pass over a pipeline.
+
+    The pipeline is fed chunk by chunk, so that it can be validated while it is being uploaded. Every violation
+    is collected, unless `stop_at_first_violation` in which case the rest of the pipeline is ignored once one is
+    found. The verdict is the same either way, as it only reports the first violation.
+    """
+
+    def __init__(self, stop_at_first_violation=False):
+        self.stop_at_first_violation = stop_at_first_violation
+        self.violations = []
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._transform_types = set()
+        self._root = None
+        self._depth = 0
+        self._malformed = False
+
+    @property
+    def stopped(self) -> bool:
+        """Whether the rest of the pipeline is ignored"""
+        return self._malformed or (self.stop_at_first_violation and bool(self.violations))
+
+    def feed(self, chunk: bytes):
+        if self.stopped:
+            return
+        try:
+            self._parser.feed(chunk)
+            self._process_events()
+        except ET.ParseError:
+            self._set_malformed()
+
+    def close(self):
+        """Ends the pipeline and returns all its (transform name, error text) violations"""
+        if not self.stopped:
+            try:
+                self._parser.close()
+                self._process_events()
+            except ET.ParseError:
+                self._set_malformed()
+        if self.stopped:
+            return self.violations
+        for transform_type, rule_sets in RULE_SETS.items():
+            for rule_set in rule_sets:
+                if rule_set.required and transform_type not in self._transform_types:
+                    self.violations.append((None, rule_set.missing_error_text))
+        return self.violations
+
+    def _set_malformed(self):
+        # Not a well-formed XML document, nothing else can be checked
+        self._malformed = True
+        self.violations = [(None, "ValidationFailed")]
+
+    def _process_events(self):
+        for event, element in self._parser.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = element
+                self._depth += 1
+                continue
+            self._depth -= 1
+            if element.tag == "transform":
+                # Index the children of the transform once for all its rules
+                fields = {child.tag: child.text for child in element}
+                transform_type = fields.get("type")
+                self._transform_types.add(transform_type)
+                for rule_set in RULE_SETS.get(transform_type, []):
+                    self.violations.extend((fields.get("name"), error_text) for error_text in rule_set.check(fields))
+                if self.stopped:
+                    return
+            if self._depth == 1:
+                # Drop the top-level elements already processed to keep memory flat
+                self._root.clear()
@@ -1,29 +1,49 @@
 import os
+import io
 import json
 import re
-import requests
+import zipfile
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from utils.minio import client
+from utils.minio import InfectedUpload, client, presign_client, upload_scanned_file
+from django.http import HttpResponse, HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags
+from utils.clamav import scanner
 from minio.commonconfig import CopySource, REPLACE
+from minio.deleteobjects import DeleteObject
+from minio.error import S3Error
 from datetime import datetime
 from utils.keycloak_auth import get_current_user_id
+from utils.conditional import conditional_get
+from utils.airflow import airflow_client
 from rest_framework.parsers import MultiPartParser
-from .validator import check_pipeline_validity
+from rest_framework.exceptions import ValidationError
+from .validator import PipelineValidator, cache_pipeline_validity, check_pipeline_validity, get_verdict
 from minio import Minio
-import pyclamd
 import time
 import logging
 from datetime import datetime, timedelta
-from .metadata_helper import get_pipeline_metadata, save_pipeline_metadata, update_pipeline_metadata
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection
+from django.db.models import Q
+from .metadata_helper import (
+    MetadataNotSaved, get_pipeline_metadata, is_description_too_long, save_pipeline_metadata, update_pipeline_metadata,
+    to_user_metadata,
+)
+from .models import PipelineCatalogEntry, UploadScanJob
+from .quarantine import quarantine_upload
+from .external_files import EXTERNAL_FILES_PREFIX, local_path
+from .catalog import (
+    PIPELINES_PREFIX, TEMPLATES_PREFIX, ObjectExists, get_version_token, list_entries, object_exists, remove_entry,
+    reserve_entry, sync_object,
+)
+
+
+class TemplateNotFound(Exception):
+    pass
 
 
-class AirflowInstance:
-    url = os.getenv("AIRFLOW_API")
-    username = os.getenv("AIRFLOW_USER")
-    password = os.getenv("AIRFLOW_PASSWORD")
-
 class EditAccessProcess:
     def __init__(self, file):
         self.file = file
@@ -59,42 +79,33 @@ class PipelineListView(APIView):
     def __init__(self):
         self.permitted_characters_regex = re.compile(r'^[^\s!@#$%^&*()+=[\]{}\\|;:\'",<>/?]*$')
 
+    def get_queryset(self, request):
+        return PipelineCatalogEntry.objects.filter(
+            kind=PipelineCatalogEntry.PIPELINE, owner=get_current_user_id(request)
+        )
+
+    def get_version_token(self, request, *args, **kwargs):
+        return get_version_token(self.get_queryset(request))
+
+    @conditional_get()
     def get(self, request , query = None):
         """Endpoint for getting pipelines created by a user"""
-        user_id = get_current_user_id(request)
-        pipelines: list[str] = []
-
-        objects = client.list_objects(
-            "pipelines", prefix=f"pipelines-created/{user_id}/", include_user_meta=True
+        entries, next_cursor = list_entries(
+            request, self.get_queryset(request), [f"{PIPELINES_PREFIX}{get_current_user_id(request)}/"], query
         )
-        for object in objects:
-            if object.object_name.endswith(".hpl"):
-                object_name = object.object_name.removeprefix(
-                            f"pipelines-created/{user_id}/"
-                        ).removesuffix(".hpl")
-                
-                metadata = get_pipeline_metadata(client, user_id, object_name)
-                if query:
-                    if (re.search(query, object_name, re.IGNORECASE)):
-                        pipelines.append(
-                            {
-                                "name": object_name,
-                                "description": metadata.get("description", ""),
-                                "check_status": metadata.get("check_status", "failed"),
-                                "check_text": metadata.get("check_text", ""),    
-                            })
-                else:
-                    pipelines.append(
-                    {
-                        "name": object_name,
-                        "description": metadata.get("description", ""),
-                        "check_status": metadata.get("check_status", "failed"),
-                        "check_text": metadata.get("check_text", ""),
-                    }
-                )
 
+        pipelines = [
+            {
+                "name": entry.name,
+                "description": entry.description,
+                "check_status": entry.check_status,
+                "check_text": entry.check_text,
+                "created": entry.created,
+            }
+            for entry in entries
+        ]
         return Response(
-            {"status": "success", "data": pipelines}, status=status.HTTP_200_OK
+            {"status": "success", "data": pipelines, "next_cursor": next_cursor}, status=status.HTTP_200_OK
         )
 
     def post(self, request):
@@ -108,13 +119,45 @@ class PipelineListView(APIView):
                 {"status": "Fail", "message": "Pipeline name contains unpermitted characters"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        try:
-            # Checks if an object with the same name exits
-            client_response = client.get_object(
-                "pipelines", f"pipelines-created/{user_id}/{name}"
+        if is_description_too_long(description):
+            return Response(
+                {"status": "Fail", "message": "Pipeline description is too long"},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            client_response.close()
-            client_response.release_conn()
+        object_name = f"pipelines-created/{user_id}/{name}.hpl"
+        metadata = {
+            "description": description,
+            "created": datetime.utcnow().isoformat(),
+            "check_status": "success",
+            "check_text": "ValidPipeline"
+        }
+
+        #user could use a private template /templates/user_id/name or a public template /templates/name
+        possible_sources = [
+        f"templates/{template}",
+        f"templates/{user_id}/{template}"
+        ]
+
+        # The catalog entry is reserved first, so that a concurrent creation of the same name cannot be overwritten
+        try:
+            with reserve_entry(object_name):
+                for source in possible_sources:
+                    try:
+                        client.stat_object("pipelines", source)
+
+                        client.copy_object(
+                            "pipelines",
+                            object_name,
+                            CopySource("pipelines", source),
+                            metadata=to_user_metadata(metadata),
+                            metadata_directive=REPLACE,
+                        )
+                    except:
+                        continue  # Try the next source if this one doesn't exist
+                    break
+                else:
+                    raise TemplateNotFound(template)
+        except ObjectExists:
             return Response(
                 {
                     "status": "Fail",
@@ -122,38 +165,13 @@ class PipelineListView(APIView):
                 },
                 status=409,
             )
-        except:
-            metadata = {
-                "description": description,
-                "created": datetime.utcnow().isoformat(),
-                "check_status": "success",
-                "check_text": "ValidPipeline"
-            }
-
-            #user could use a private template /templates/user_id/name or a public template /templates/name
-            possible_sources = [
-            f"templates/{template}",
-            f"templates/{user_id}/{template}"
-            ]
-
-            for source in possible_sources:
-                try:
-                    client.stat_object("pipelines", source)
-
-                    client.copy_object(
-                        "pipelines",
-                        f"pipelines-created/{user_id}/{name}.hpl",
-                        CopySource("pipelines", source)
-                    )
-                    save_pipeline_metadata(client, user_id, name, metadata)
-                    return Response({"status": "success"}, status=status.HTTP_200_OK)
-                except:
-                    continue  # Try the next source if this one doesn't exist
-
+        except TemplateNotFound:
             return Response(
                 {"status": "Fail", "message": "Template not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
+        sync_object(object_name)
+        return Response({"status": "success"}, status=status.HTTP_200_OK)
 
 
 class PipelineDetailView(APIView):
@@ -208,6 +226,11 @@ class PipelineDetailView(APIView):
     def put(self, request, name=None):
         user_id = get_current_user_id(request)
         name = request.data.get("name")
+        if is_description_too_long(request.data.get("description")):
+            return Response(
+                {"status": "Fail", "message": "Pipeline description is too long"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         valid_pipeline, check_text = check_pipeline_validity(name, user_id)
         metadata = {
                 "description": request.data.get("description"),
@@ -215,7 +238,12 @@ class PipelineDetailView(APIView):
                 "check_status": "success" if valid_pipeline else "failed",
                 "check_text": check_text
         }
-        update_pipeline_metadata(client, user_id, name, metadata)           
+        if not update_pipeline_metadata(client, user_id, name, metadata):
+            return Response(
+                {"status": "error", "message": "Unable to save the pipeline metadata"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        sync_object(f"pipelines-created/{user_id}/{name}.hpl")
         return Response(
                 {
                     "status": "success",
@@ -227,30 +255,126 @@ class PipelineDownloadView(APIView):
     keycloak_scopes = {
         "GET": "pipeline:read",
     }
+    presigned_url_expiry = timedelta(minutes=5)
+
+    # Reads of an object replaced between its stat and its read are attempted again
+    max_attempts = 2
 
     def get(self, request, name=None):
-        """Download a specific pipeline."""
+        """Download a specific pipeline, streamed from MinIO with Range and conditional request support."""
+        for attempt in range(self.max_attempts):
+            try:
+                return self._download(request, name)
+            except S3Error as e:
+                if e.code == "NoSuchKey":
+                    return Response(
+                        {"status": "Fail", "message": f"Pipeline {name} not found"},
+                        status=status.HTTP_404_NOT_FOUND,
+                    )
+                if e.code != "PreconditionFailed":
+                    logging.error(f"Failed to download pipeline {name}: {str(e)}")
+                    return Response(
+                        {"status": "Fail", "message": f"Failed to download pipeline {name}"},
+                        status=status.HTTP_502_BAD_GATEWAY,
+                    )
+            except Exception as e:
+                logging.error(f"Failed to download pipeline {name}: {str(e)}")
+                return Response(
+                    {"status": "Fail", "message": f"Failed to download pipeline {name}"},
+                    status=status.HTTP_502_BAD_GATEWAY,
+                )
+        return Response(
+            {"status": "Fail", "message": f"Pipeline {name} changed during the download, please retry"},
+            status=status.HTTP_412_PRECONDITION_FAILED,
+        )
+
+    def _download(self, request, name):
         user_id = get_current_user_id(request)
-        try:
-            # Check if the pipeline exists
-            client_response = client.get_object("pipelines", f"pipelines-created/{user_id}/{name}.hpl")
+        object_name = f"pipelines-created/{user_id}/{name}.hpl"
+        stat = client.stat_object("pipelines", object_name)
+        content_disposition = f'attachment; filename="{name}.hpl"'
 
-            # Read the data from the response
-            data = client_response.read()
+        if request.query_params.get("redirect") == "true" and presign_client is not None:
+            # The file is downloaded from MinIO directly, without going through the backend
+            url = presign_client.presigned_get_object(
+                "pipelines",
+                object_name,
+                expires=self.presigned_url_expiry,
+                response_headers={"response-content-disposition": content_disposition},
+            )
+            return HttpResponseRedirect(url)
 
-            # Set response headers for file download
-            response = Response(data, content_type='application/octet-stream')
-            response["Content-Disposition"] = f'attachment; filename="{name}.hpl"'
+        etag = f'"{stat.etag}"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": http_date(stat.last_modified.timestamp()),
+            "Accept-Ranges": "bytes",
+        }
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+            for header, value in headers.items():
+                response[header] = value
             return response
-        except Exception as e:
-            return Response(
-                {"status": "Fail", "message": f"Failed to download pipeline {name}: {str(e)}"},
-                status=status.HTTP_404_NOT_FOUND,
-            )
+
+        offset, length, status_code = 0, stat.size, status.HTTP_200_OK
+        range_header = request.headers.get("Range")
+        # A range only applies to the version of the file identified by If-Range
+        if range_header and request.headers.get("If-Range", etag) == etag:
+            try:
+                byte_range = self._parse_range(range_header, stat.size)
+            except ValueError:
+                response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response["Content-Range"] = f"bytes */{stat.size}"
+                return response
+            if byte_range is not None:
+                first, last = byte_range
+                offset, length, status_code = first, last - first + 1, status.HTTP_206_PARTIAL_CONTENT
+                headers["Content-Range"] = f"bytes {first}-{last}/{stat.size}"
+
+        # If-Match ensures that the streamed content is the version described by the headers,
+        # MinIO answers PreconditionFailed when the object has been replaced since the stat
+        client_response = client.get_object(
+            "pipelines", object_name, offset=offset, length=length, request_headers={"If-Match": stat.etag}
+        )
+
+        response = StreamingHttpResponse(
+            self._stream(client_response), status=status_code, content_type="application/octet-stream"
+        )
+        for header, value in headers.items():
+            response[header] = value
+        response["Content-Length"] = str(length)
+        response["Content-Disposition"] = content_disposition
+        return response
+
+    def _stream(self, client_response):
+        try:
+            yield from client_response.stream(64 * 1024)
         finally:
             client_response.close()
             client_response.release_conn()
 
+    def _parse_range(self, range_header, size):
+        """Returns the (first, last) bytes of a single range, None if the header is ignored, ValueError if not satisfiable"""
+        unit, _, ranges = range_header.partition("=")
+        if unit.strip() != "bytes" or "," in ranges:
+            # Multiple ranges are not supported, the whole file is sent instead
+            return None
+        first, separator, last = ranges.strip().partition("-")
+        if not separator or not (first or last) or not (first or "0").isdigit() or not (last or "0").isdigit():
+            return None
+        if not first:
+            # Suffix range, e.g. the last 500 bytes with bytes=-500
+            if int(last) == 0 or size == 0:
+                raise ValueError("Range not satisfiable")
+            return max(size - int(last), 0), size - 1
+        first = int(first)
+        if last and int(last) < first:
+            return None
+        if first >= size:
+            raise ValueError("Range not satisfiable")
+        return first, min(int(last), size - 1) if last else size - 1
+
 class PipelineUploadView(APIView):
     parser_classes = (MultiPartParser,)
     keycloak_scopes = {
@@ -269,63 +393,177 @@ class PipelineUploadView(APIView):
         description = request.data.get("description")
         uploaded_file = request.FILES.get("uploadedFile")
 
-        cd = pyclamd.ClamdNetworkSocket(host="clamav", port=3310)
-        scan_result = cd.scan_stream(uploaded_file.read())
-        if scan_result is not None:
-            logging.error(f"Malicious Pipeline uploaded : {scan_result}")
-            return Response({'errorMessage': f'Malicious File Upload: {scan_result}'}, status=status.HTTP_400_BAD_REQUEST)
-        # seeking to 0 in the uploaded_file because scan_stream does not release the pointer 
-        uploaded_file.seek(0)
-
         if not self.permitted_characters_regex.search(name):
             return Response(
                 {"status": "Fail", "message": "Pipeline name contains unpermitted characters"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if is_description_too_long(description):
+            return Response(
+                {"status": "Fail", "message": "Pipeline description is too long"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         if uploaded_file:
-            # To check if file is valid we first have to have it saved on the local file system
-            # todo: needs to be optimized no need to save pipeline locally for checking
-            with open(f"/hop/pipelines/{name}.hpl", 'wb') as f:
-                for chunk in uploaded_file.chunks():
-                    f.write(chunk)
+            object_name = f"pipelines-created/{user_id}/{name}.hpl"
+            conflict = Response(
+                {
+                "status": "Fail",
+                "message": f"file already exists with the name {name}.hpl",
+                },
+                status=409,
+            )
+            if request.query_params.get("async") == "true":
+                # Checks if a pipeline with the same name exists, its entry is only reserved once the upload is scanned
+                if object_exists(object_name):
+                    return conflict
+                # Scanned and validated in the background, see UploadScanStatusView for the outcome
+                job = quarantine_upload(uploaded_file, UploadScanJob.PIPELINE, user_id, name, object_name, description)
+                return Response({"status": "pending", "job_id": str(job.id)}, status=status.HTTP_202_ACCEPTED)
+            # The catalog entry is reserved first, so that a concurrent upload of the same name cannot be overwritten.
+            # It is released again if the pipeline is not stored.
             try:
-                # Checks if an object with the same name exists
-                client_response = client.get_object(
-                    "pipelines", f"pipelines-created/{user_id}/{name}.hpl"
-                )
-                client_response.close()
-                client_response.release_conn()
+                with reserve_entry(object_name):
+                    # The pipeline is scanned, uploaded and validated while it is streamed to MinIO
+                    validator = PipelineValidator(stop_at_first_violation=True)
+                    scan_result, client_result = upload_scanned_file(
+                        uploaded_file, "pipelines", object_name, consumers=[validator.feed]
+                    )
+                    if scan_result is not None:
+                        raise InfectedUpload(scan_result)
+                    valid_pipeline, check_text = get_verdict(validator.close())
+                    cache_pipeline_validity(client_result.etag, (valid_pipeline, check_text))
+                    metadata = {
+                        "description": description, # no need to quote the description as it is now saved in a json files
+                        "created": f"{datetime.utcnow()}",
+                        "check_status": "success" if valid_pipeline else "failed",
+                        "check_text": check_text
+                        }
+                    if not save_pipeline_metadata(client, user_id, name, metadata):
+                        # Removed so that the upload can be retried
+                        client.remove_object("pipelines", object_name)
+                        raise MetadataNotSaved(object_name)
+            except ObjectExists:
+                return conflict
+            except InfectedUpload as e:
+                logging.error(f"Malicious Pipeline uploaded : {e.signature}")
+                return Response({'errorMessage': f'Malicious File Upload: {e.signature}'}, status=status.HTTP_400_BAD_REQUEST)
+            except MetadataNotSaved:
                 return Response(
-                    {
-                    "status": "Fail",
-                    "message": f"file already exists with the name {name}.hpl",
-                    },
-                    status=409,
+                    {"status": "Fail", "message": "Unable to save the pipeline metadata"},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
-            except:
-                with open(f"/hop/pipelines/{name}.hpl", 'rb') as f:
-                    
-                    client_result = client.put_object(
-                    bucket_name='pipelines',
-                    object_name=f"pipelines-created/{user_id}/{name}.hpl",
-                    data=f,
-                    length=os.path.getsize(f.name)
-                    )
-                # Upload new pipeline
-                valid_pipeline, check_text = check_pipeline_validity(name, user_id)
-                metadata = {
-                    "description": description, # no need to quote the description as it is now saved in a json files
-                    "created": f"{datetime.utcnow()}",
-                    "check_status": "success" if valid_pipeline else "failed",
-                    "check_text": check_text
-                    }
-                save_pipeline_metadata(client, user_id, name, metadata)
-                local_file_path = f"/hop/pipelines/{name}.hpl"
-
-                if os.path.exists(local_file_path):
-                    os.remove(local_file_path)
+            sync_object(object_name)
         return Response({"status": "success"}, status=status.HTTP_200_OK)
 
+class PipelineBulkImportView(APIView):
+    parser_classes = (MultiPartParser,)
+    keycloak_scopes = {
+        "POST": "pipeline:add",
+    }
+    max_workers = int(os.getenv("PIPELINE_IMPORT_WORKERS", 4))
+    max_pipeline_size = 50 * 1024 * 1024  # bytes
+
+    def __init__(self):
+        self.permitted_characters_regex = re.compile(r'^[^\s!@#$%^&*()+=[\]{}\\|;:\'",<>/?]*$')
+
+    def post(self, request, format=None):
+        """
+        Endpoint for importing all the pipelines of a zip archive, returns a report per file
+        """
+        user_id = get_current_user_id(request)
+        description = request.data.get("description", "")
+        uploaded_file = request.FILES.get("uploadedFile")
+        if not uploaded_file or not zipfile.is_zipfile(uploaded_file):
+            return Response(
+                {"status": "Fail", "message": "Uploaded file is not a zip archive"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if is_description_too_long(description):
+            return Response(
+                {"status": "Fail", "message": "Pipeline description is too long"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        uploaded_file.seek(0)
+
+        report = []
+        entries = []
+        names = set()
+        with zipfile.ZipFile(uploaded_file) as archive:
+            for entry in archive.infolist():
+                if entry.is_dir():
+                    continue
+                file_name = os.path.basename(entry.filename)
+                name = file_name.removesuffix(".hpl")
+                if not file_name.endswith(".hpl"):
+                    report.append({"file": entry.filename, "status": "Fail", "message": "Not a pipeline file"})
+                elif not name or not self.permitted_characters_regex.search(name):
+                    report.append({"file": entry.filename, "status": "Fail", "message": "Pipeline name contains unpermitted characters"})
+                elif entry.file_size > self.max_pipeline_size:
+                    report.append({"file": entry.filename, "status": "Fail", "message": "Pipeline file is too large"})
+                elif name in names:
+                    report.append({"file": entry.filename, "status": "Conflict", "message": f"Duplicate pipeline name {name} in the archive"})
+                else:
+                    names.add(name)
+                    entries.append((entry, name))
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = executor.map(
+                    lambda item: self._import_pipeline(archive, item[0], item[1], user_id, description), entries
+                )
+                report.extend(results)
+
+        return Response({"status": "success", "data": report}, status=status.HTTP_200_OK)
+
+    def _import_pipeline(self, archive, entry, name, user_id, description):
+        try:
+            return self._import_entry(archive, entry, name, user_id, description)
+        finally:
+            # Worker threads open their own database connection
+            connection.close()
+
+    def _import_entry(self, archive, entry, name, user_id, description):
+        """Scans, validates and uploads one pipeline of the archive, nothing is stored if any step fails"""
+        object_name = f"pipelines-created/{user_id}/{name}.hpl"
+        try:
+            if object_exists(object_name):
+                return {"file": entry.filename, "name": name, "status": "Conflict", "message": f"file already exists with the name {name}.hpl"}
+
+            data = archive.read(entry)
+            scan_result = scanner.scan_bytes(data)
+            if scan_result is not None:
+                logging.error(f"Malicious Pipeline uploaded : {scan_result}")
+                return {"file": entry.filename, "name": name, "status": "Fail", "message": f"Malicious File Upload: {scan_result}"}
+
+            valid_pipeline, check_text = check_pipeline_validity(name, user_id, source=data)
+            metadata = {
+                "description": description,
+                "created": f"{datetime.utcnow()}",
+                "check_status": "success" if valid_pipeline else "failed",
+                "check_text": check_text
+            }
+            # The metadata is written with the pipeline, so that a file is either fully imported or not at all.
+            # The catalog entry is reserved first, so that a concurrent upload of the same name cannot be overwritten
+            try:
+                with reserve_entry(object_name):
+                    client.put_object(
+                        bucket_name="pipelines",
+                        object_name=object_name,
+                        data=io.BytesIO(data),
+                        length=len(data),
+                        metadata=to_user_metadata(metadata),
+                    )
+            except ObjectExists:
+                return {"file": entry.filename, "name": name, "status": "Conflict", "message": f"file already exists with the name {name}.hpl"}
+        except Exception as e:
+            logging.error(f"Error importing pipeline {entry.filename}: {str(e)}")
+            return {"file": entry.filename, "name": name, "status": "Fail", "message": "Error processing the pipeline file"}
+        try:
+            sync_object(object_name)
+        except Exception as e:
+            # The catalog worker also picks up the new pipeline from the bucket notifications
+            logging.error(f"Unable to add pipeline {object_name} to the catalog: {str(e)}")
+        return {"file": entry.filename, "name": name, "status": "success", **metadata}
+
 class PipelineUploadExternalFilesView(APIView):
     parser_classes = (MultiPartParser,)
     keycloak_scopes = {
@@ -352,18 +590,6 @@ class PipelineUploadExternalFilesView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        local_save_path = f"/hop/pipelines/external_files/{name}{file_extension}"
-
-        # Scan the file for viruses
-        cd = pyclamd.ClamdNetworkSocket(host="clamav", port=3310)
-        scan_result = cd.scan_stream(uploaded_file.read())
-        if scan_result is not None:
-            logging.error(f"Malicious Pipeline uploaded: {scan_result}")
-            return Response({'errorMessage': f'Malicious File Upload: {scan_result}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Reset the file pointer after scanning
-        uploaded_file.seek(0)
-
         # Check for unpermitted characters in the name
         if not self.permitted_characters_regex.search(name):
             return Response(
@@ -371,19 +597,36 @@ class PipelineUploadExternalFilesView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        if request.query_params.get("async") == "true":
+            # Scanned in the background, see UploadScanStatusView for the outcome
+            job = quarantine_upload(
+                uploaded_file,
+                UploadScanJob.EXTERNAL_FILE,
+                get_current_user_id(request),
+                name,
+                f"{EXTERNAL_FILES_PREFIX}{name}{file_extension}",
+            )
+            return Response({"status": "pending", "job_id": str(job.id)}, status=status.HTTP_202_ACCEPTED)
+
+        # hop-server reads the external files from its local volume, the local copy follows the object,
+        # see pipeline/external_files.py
+        object_name = f"{EXTERNAL_FILES_PREFIX}{name}{file_extension}"
+        local_save_path = local_path(object_name)
+        partial_save_path = f"{local_save_path}.part"
         try:
             os.makedirs(os.path.dirname(local_save_path), exist_ok=True)
-            with open(local_save_path, "wb") as local_file:
-                for chunk in uploaded_file.chunks():
-                    local_file.write(chunk)
-           
-            object_name = f"external_files/{name}{file_extension}"
-            client.put_object(
-                bucket_name="pipelines",
-                object_name=object_name,
-                data=open(local_save_path, "rb"),
-                length=os.path.getsize(local_save_path)
-            )
+            with open(partial_save_path, "wb") as local_file:
+                # The file is written locally while it is scanned and uploaded
+                scan_result, _ = upload_scanned_file(
+                    uploaded_file,
+                    "pipelines",
+                    object_name,
+                    consumers=[local_file.write],
+                )
+            if scan_result is not None:
+                logging.error(f"Malicious Pipeline uploaded: {scan_result}")
+                return Response({'errorMessage': f'Malicious File Upload: {scan_result}'}, status=status.HTTP_400_BAD_REQUEST)
+            os.replace(partial_save_path, local_save_path)
             return Response({"status": "success"}, status=status.HTTP_200_OK)
         except Exception as e:
             logging.error(f"Error uploading file: {str(e)}")
@@ -391,12 +634,51 @@ class PipelineUploadExternalFilesView(APIView):
                 {"status": "Fail", "message": "Error processing the uploaded file"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        finally:
+            if os.path.exists(partial_save_path):
+                os.remove(partial_save_path)
+
+
+class UploadScanStatusView(APIView):
+    keycloak_scopes = {
+        "GET": "pipeline:read",
+    }
+
+    def get(self, request, job_id=None):
+        """
+        Endpoint for getting the progress of an asynchronous upload
+        """
+        user_id = get_current_user_id(request)
+        try:
+            job = UploadScanJob.objects.get(id=job_id, owner=user_id)
+        except UploadScanJob.DoesNotExist:
+            return Response(
+                {"status": "Fail", "message": f"Upload {job_id} not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(
+            {
+                "status": "success",
+                "data": {
+                    "job_id": str(job.id),
+                    "name": job.name,
+                    "status": job.status,
+                    "verdict": job.verdict,
+                    "message": job.message,
+                    "created": job.created,
+                    "updated": job.updated,
+                },
+            },
+            status=status.HTTP_200_OK,
+        )
 
 
 class PipelineDeleteView(APIView):
     keycloak_scopes = {
         "DELETE": "pipeline:delete",
     }
+    # Bounds the concurrent Airflow and MinIO requests of a deletion
+    max_workers = int(os.getenv("PIPELINE_DELETE_WORKERS", 8))
 
     def delete(self, request, name=None):
         """
@@ -414,98 +696,118 @@ class PipelineDeleteView(APIView):
 
         # Back up and then delete the pipeline
         user_id = get_current_user_id(request)
-        hpl_object_name = f"pipelines-created/{user_id}/{name}.hpl"
-        json_object_name = f"pipelines-created/{user_id}/{name}.json"
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        backup_hpl_object_name = (
-            f"pipelines-deleted/{user_id}/{name}_{timestamp}.hpl"
-        )
-        backup_json_object_name = (
-            f"pipelines-deleted/{user_id}/{name}_{timestamp}.json"
+        result = self._delete_pipelines(user_id, [name])[0]
+        if result["status"] == "success":
+            return Response({"status": "success"}, status=status.HTTP_200_OK)
+        return Response(
+            {"status": "error", "message": result["message"]},
+            status=status.HTTP_404_NOT_FOUND if result.get("not_found") else status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
-        try:
-            hpl_meta_data = client.stat_object("pipelines", hpl_object_name)
-            json_meta_data = client.stat_object("pipelines", json_object_name)
-        except Exception:
-            return Response(
-                {
-                    "status": "error",
-                    "message": f"Files {name}.hpl and/or {name}.json not found",
-                },
-                status=status.HTTP_404_NOT_FOUND,
-            )
+    def _delete_pipelines(self, user_id, names):
+        """Backs up and then deletes the pipelines of a user, returns a result per pipeline"""
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        results = {name: {"name": name, "status": "success"} for name in names}
+        # Object name -> backup object name, per pipeline
+        objects = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            stats = {
+                name: [
+                    executor.submit(self._object_exists, f"pipelines-created/{user_id}/{name}.{extension}")
+                    for extension in ("hpl", "json")
+                ]
+                for name in names
+            }
+            for name in names:
+                has_hpl, has_json_sidecar = (future.result() for future in stats[name])
+                if not has_hpl:
+                    results[name] = {"name": name, "status": "error", "message": f"File {name}.hpl not found", "not_found": True}
+                    continue
+                # Metadata is kept in the .hpl user-metadata, only pipelines not migrated yet have a JSON sidecar
+                extensions = ("hpl", "json") if has_json_sidecar else ("hpl",)
+                objects[name] = {
+                    f"pipelines-created/{user_id}/{name}.{extension}": f"pipelines-deleted/{user_id}/{name}_{timestamp}.{extension}"
+                    for extension in extensions
+                }
 
+            copies = {
+                name: [
+                    executor.submit(client.copy_object, "pipelines", backup_object_name, CopySource("pipelines", object_name))
+                    for object_name, backup_object_name in backups.items()
+                ]
+                for name, backups in objects.items()
+            }
+            for name, futures in copies.items():
+                try:
+                    for future in futures:
+                        future.result()
+                except Exception:
+                    results[name] = {"name": name, "status": "error", "message": "Unable to backup files"}
+                    del objects[name]
+
+        # The objects of all the pipelines are removed with a single request per 1000 objects
         try:
-            client.copy_object(
+            errors = client.remove_objects(
                 "pipelines",
-                backup_hpl_object_name,
-                CopySource("pipelines", hpl_object_name),
-            )
-            client.copy_object(
-                "pipelines",
-                backup_json_object_name,
-                CopySource("pipelines", json_object_name),
+                [DeleteObject(object_name) for backups in objects.values() for object_name in backups],
             )
+            failed = {error.name for error in errors}
         except Exception:
-            return Response(
-                {
-                    "status": "error",
-                    "message": f"Unable to backup files",
-                },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+            failed = {object_name for backups in objects.values() for object_name in backups}
+
+        for name, backups in objects.items():
+            if failed.intersection(backups):
+                results[name] = {"name": name, "status": "error", "message": "Unable to delete the pipeline"}
+                continue
+            try:
+                remove_entry(f"pipelines-created/{user_id}/{name}.hpl")
+            except Exception as e:
+                # The catalog is reconciled with the bucket by the sync_pipeline_catalog command
+                logging.error(f"Unable to remove {name} from the pipeline catalog: {e}")
+        return [results[name] for name in names]
 
+    def _object_exists(self, object_name):
         try:
-            client.remove_object("pipelines", hpl_object_name)
-            client.remove_object("pipelines", json_object_name)
-            return Response({"status": "success"}, status=status.HTTP_200_OK)
+            client.stat_object("pipelines", object_name)
+            return True
         except Exception:
-            return Response(
-                {
-                    "status": "error",
-                    "message": "Unable to delete the pipeline",
-                },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+            return False
 
     def _deactivate_processes(self, dag_ids):
         if dag_ids is not None and dag_ids:
-            all_successful = True
             messages = []
             deactivated_processes = []
 
-            for dag_id in dag_ids:
-                result = self._set_process_status(dag_id, True)
-                if result["status"] == "failed":
-                    all_successful = False
-                    messages.append(result["message"])
-                else:
-                    deactivated_processes.append(dag_id)
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(dag_ids))) as executor:
+                results = executor.map(lambda dag_id: self._set_process_status(dag_id, True), dag_ids)
+                for dag_id, result in zip(dag_ids, results):
+                    if result["status"] == "failed":
+                        messages.append(result["message"])
+                    else:
+                        deactivated_processes.append(dag_id)
 
-            if all_successful:
-                return {"status": "success"}
-            else:
+                if not messages:
+                    return {"status": "success"}
                 # reactivate all deactivated processes
-                for dag_id in deactivated_processes:
-                    reactivation_result = self._set_process_status(dag_id, False)
-                    messages.append(reactivation_result["message"])
-                return {
-                    "status": "failed",
-                    "message": "One or more process deactivation failed.",
-                    "errors": messages,
-                }
+                reactivation_results = executor.map(
+                    lambda dag_id: self._set_process_status(dag_id, False), deactivated_processes
+                )
+                messages.extend(result["message"] for result in reactivation_results if result["status"] == "failed")
+            return {
+                "status": "failed",
+                "message": "One or more process deactivation failed.",
+                "errors": messages,
+            }
         return {"status": "success"}
 
     def _set_process_status(self, dag_id, is_deactivated):
-        route = f"{AirflowInstance.url}/dags/{dag_id}"
-
         try:
             # deactivate the process status
-            airflow_toggle_response = requests.patch(
-                route,
-                auth=(AirflowInstance.username, AirflowInstance.password),
+            airflow_toggle_response = airflow_client.patch(
+                f"/dags/{dag_id}",
                 json={"is_paused": is_deactivated},
+                idempotent=True,
             )
 
             if airflow_toggle_response.ok:
@@ -522,36 +824,66 @@ class PipelineDeleteView(APIView):
             }
 
 
+class PipelineBulkDeleteView(PipelineDeleteView):
+    max_pipelines = 100
+
+    def delete(self, request):
+        """
+        Endpoint for deleting several pipelines at once, returns a result per pipeline
+        """
+        names = request.data.get("pipelines", [])
+        if not isinstance(names, list) or not names or len(names) > self.max_pipelines:
+            return Response(
+                {"status": "failed", "message": f"Between 1 and {self.max_pipelines} pipelines can be deleted at once"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Disable all dags using the pipelines
+        result = self._deactivate_processes(request.data.get("dags", []))
+        if result["status"] == "failed":
+            return Response(
+                {"status": "failed", "message": result["message"]},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        user_id = get_current_user_id(request)
+        results = self._delete_pipelines(user_id, list(dict.fromkeys(names)))
+        for result in results:
+            result.pop("not_found", None)
+        return Response({"status": "success", "data": results}, status=status.HTTP_200_OK)
+
+
 class TemplateView(APIView):
     keycloak_scopes = {
         "GET": "pipeline:read",
         "POST": "pipeline:add",
     }
 
+    def get_queryset(self, request):
+        # Global templates and the user-specific ones
+        return PipelineCatalogEntry.objects.filter(
+            Q(owner__isnull=True) | Q(owner=get_current_user_id(request)), kind=PipelineCatalogEntry.TEMPLATE
+        )
+
+    def get_version_token(self, request, *args, **kwargs):
+        return get_version_token(self.get_queryset(request))
+
+    @conditional_get()
     def get(self, request, query: str = None):
         """ Return hop templates from minio bucket """
-        user_id = get_current_user_id(request)
-        pipelines_templates = []
-
         try:
-            # Function to process template objects
-            def process_templates(templates, prefix):
-                return [
-                    {"name": template.object_name.removeprefix(prefix)}
-                    for template in templates
-                    if template.object_name.endswith('.hpl') and (not query or re.search(query, template.object_name.removeprefix(prefix), re.IGNORECASE))
-                ]
-
-            # Fetch global templates
-            global_templates = client.list_objects("pipelines", prefix="templates/")
-            pipelines_templates.extend(process_templates(global_templates, "templates/"))
-
-            # Fetch user-specific templates
-            if user_id:
-                user_templates = client.list_objects('pipelines', prefix=f'templates/{user_id}/')
-                pipelines_templates.extend(process_templates(user_templates, f'templates/{user_id}/'))
+            templates, next_cursor = list_entries(
+                request,
+                self.get_queryset(request),
+                [TEMPLATES_PREFIX, f"{TEMPLATES_PREFIX}{get_current_user_id(request)}/"],
+                query,
+            )
 
-            return Response({'status': 'success', "data": pipelines_templates}, status=200)
+            pipelines_templates = [{"name": f"{template.name}.hpl"} for template in templates]
+            return Response({'status': 'success', "data": pipelines_templates, "next_cursor": next_cursor}, status=200)
+        except ValidationError:
+            # Invalid pagination parameters are reported as bad requests
+            raise
         except Exception as e:
             return Response(
                 {
@@ -564,14 +896,25 @@ class TemplateView(APIView):
     def post(self, request):
         user_id = get_current_user_id(request)
         name = request.data.get("name", None)
+        object_name = f"templates/{user_id}/{name}.hpl"
         try:
-            # save pipeline file as Template in Minio
-            client.copy_object(
-            "pipelines",
-            f"templates/{user_id}/{name}.hpl",
-            CopySource("pipelines", f"pipelines-created/{user_id}/{name}.hpl"))
+            # save pipeline file as Template in Minio, reserving its catalog entry so that concurrent saves conflict
+            with reserve_entry(object_name):
+                client.copy_object(
+                "pipelines",
+                object_name,
+                CopySource("pipelines", f"pipelines-created/{user_id}/{name}.hpl"))
+            sync_object(object_name)
 
             return Response({"status": "success"}, status=status.HTTP_200_OK)
+        except ObjectExists:
+            return Response(
+                {
+                    "status": "Fail",
+                    "message": f"template already exists with the name {name}.hpl",
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
         except Exception as e:
             return Response(
                 {
@@ -0,0 +1,53 @@
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from utils.airflow import AirflowClient
+
+
+class AirflowFetcher:
+    """Sends the GET requests made to Airflow while building one response on a bounded thread pool
+
+    Identical requests are only sent once, their response is shared by all the callers. At most `max_workers`
+    requests are sent concurrently, so that one list call does not overwhelm Airflow.
+    """
+
+    def __init__(self, client: AirflowClient, max_workers):
+        self.client = client
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._requests = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, path, params=None) -> Future:
+        """Sends `GET {path}` unless the same request has already been sent, returns the future of its response"""
+        key = (path, json.dumps(params, sort_keys=True))
+        with self._lock:
+            future = self._requests.get(key)
+            if future is None:
+                future = self._executor.submit(self.client.get, path, params=params)
+                self._requests[key] = future
+        return future
+
+    def get(self, path, params=None) -> requests.Response:
+        return self.submit(path, params).result()
+
+    def map(self, fn, items) -> list:
+        """Calls `fn` on each item concurrently and returns the results in order
+
+        `fn` may wait for responses of the fetcher, it runs on its own threads so that it never blocks the requests.
+        """
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            return list(executor.map(fn, items))
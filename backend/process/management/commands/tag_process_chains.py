@@ -0,0 +1,85 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from utils.airflow import airflow_client
+from process.owner_tags import mark_owner_tags_ready, owner_tag, owner_tags_ready
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds the owner tag to the DAGs generated before it, then lets the process list filter the DAGs by owner tag. "
+        "Until it has completed, the process list filters all the DAGs of Airflow by owners."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=600,
+            help="Seconds to wait for Airflow to parse the tagged DAG files",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=15,
+            help="Seconds between two checks of the tags of the DAGs",
+        )
+        parser.add_argument(
+            "--allow-untagged",
+            action="store_true",
+            help="Filter by owner tag even if some DAGs could not be tagged, they are no longer listed",
+        )
+
+    def handle(self, *args, **options):
+        if owner_tags_ready():
+            self.stdout.write("The DAGs are already filtered by owner tag")
+            return
+
+        deadline = time.monotonic() + options["timeout"]
+        patched = set()
+        untaggable = set()
+        while True:
+            untagged = [dag for dag in self._list_dags() if not self._is_tagged(dag)]
+            for dag in untagged:
+                if dag["dag_id"] not in patched | untaggable:
+                    self._tag(dag, patched, untaggable)
+            waiting = [dag["dag_id"] for dag in untagged if dag["dag_id"] not in untaggable]
+            if not waiting:
+                break
+            if time.monotonic() > deadline:
+                raise CommandError(f"Airflow has not parsed the tags of {len(waiting)} DAGs yet: {', '.join(waiting)}")
+            time.sleep(options["interval"])
+
+        if untaggable and not options["allow_untagged"]:
+            raise CommandError(
+                f"{len(untaggable)} DAGs could not be tagged, use --allow-untagged to hide them from the process list: "
+                f"{', '.join(sorted(untaggable))}"
+            )
+        mark_owner_tags_ready()
+        self.stdout.write(self.style.SUCCESS(f"Tagged {len(patched)} DAGs, the process list now filters by owner tag"))
+
+    def _list_dags(self):
+        dags = []
+        offset = 0
+        while True:
+            response = airflow_client.get(
+                "/dags", params={"limit": 100, "offset": offset, "fields": ["dag_id", "owners", "tags"]}
+            )
+            response.raise_for_status()
+            page = response.json()
+            dags.extend(page["dags"])
+            offset += len(page["dags"])
+            if not page["dags"] or offset >= page["total_entries"]:
+                return dags
+
+    def _is_tagged(self, dag):
+        tags = {tag["name"] for tag in dag.get("tags") or []}
+        return any(owner_tag(owner) in tags for owner in dag["owners"])
+
+    def _tag(self, dag, patched, untaggable):
+        response = airflow_client.patch(airflow_client.factory_url, json={"dag": dag["dag_id"]}, idempotent=True)
+        if response.status_code == 404:
+            self.stderr.write(f"{dag['dag_id']} was not generated by the factory and cannot be tagged")
+            untaggable.add(dag["dag_id"])
+            return
+        response.raise_for_status()
+        patched.add(dag["dag_id"])
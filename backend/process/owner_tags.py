@@ -0,0 +1,30 @@
+from django.core.cache import cache
+from utils.airflow import airflow_client
+
+# Airflow variable set by the `tag_process_chains` command once every DAG carries its owner tag
+OWNER_TAGS_VARIABLE = "process_chains_owner_tagged"
+# Until then, seconds before asking Airflow again
+OWNER_TAGS_CHECK_INTERVAL = 60
+_CACHE_KEY = "process-owner-tags-ready"
+
+
+def owner_tag(user_name):
+    """Tag stamped by the DAG factory on the DAGs of a user, see dag_template.jinja2"""
+    return f"owner:{user_name}"
+
+
+def owner_tags_ready() -> bool:
+    """Whether the DAGs can be filtered by owner tag, i.e. whether the DAGs generated before the tag have been tagged"""
+    ready = cache.get(_CACHE_KEY)
+    if ready is None:
+        response = airflow_client.get(f"/variables/{OWNER_TAGS_VARIABLE}")
+        ready = response.ok and response.json().get("value") == "true"
+        # Once set, the variable is never unset
+        cache.set(_CACHE_KEY, ready, None if ready else OWNER_TAGS_CHECK_INTERVAL)
+    return ready
+
+
+def mark_owner_tags_ready():
+    response = airflow_client.post("/variables", json={"key": OWNER_TAGS_VARIABLE, "value": "true"}, idempotent=True)
+    response.raise_for_status()
+    cache.set(_CACHE_KEY, True, None)
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import cache, caches
+
+# Changes made to DAG files outside of the factory are picked up when entries expire
+STRUCTURE_CACHE_TIMEOUT = 10 * 60  # seconds
+
+# Write times of DAG files are seen by all the workers, not only by the one which called the factory
+_written = caches[settings.SHARED_CACHE]
+
+
+def _cache_key(dag_id):
+    return f"dag-structure:{dag_id}"
+
+
+def _written_key(dag_id):
+    return f"dag-structure-written:{dag_id}"
+
+
+def _parsed_time(dag):
+    last_parsed_time = dag.get("last_parsed_time")
+    return datetime.fromisoformat(last_parsed_time) if last_parsed_time else None
+
+
+def _is_stale(dag_id, parsed_time):
+    """Whether a structure read when the DAG file was last parsed at `parsed_time` predates the last write of its file"""
+    written_time = _written.get(_written_key(dag_id))
+    return written_time is not None and (parsed_time is None or parsed_time <= written_time)
+
+
+def get_cached_structure(dag):
+    """Returns the cached tasks, Hop pipeline task id and start date of a DAG of the `/dags` endpoint, if still valid"""
+    entry = cache.get(_cache_key(dag["dag_id"]))
+    if entry is None or _is_stale(dag["dag_id"], entry["parsed_time"]):
+        return None
+    return entry["structure"]
+
+
+def cache_structure(dag, structure):
+    # Until Airflow parses the file written by the factory, it still returns the tasks of the previous file
+    parsed_time = _parsed_time(dag)
+    if _is_stale(dag["dag_id"], parsed_time):
+        return
+    cache.set(_cache_key(dag["dag_id"]), {"parsed_time": parsed_time, "structure": structure}, STRUCTURE_CACHE_TIMEOUT)
+
+
+def invalidate_structure(dag_id):
+    """Discards the cached structure of a DAG, to be called once the factory has written its file
+
+    Structures read from Airflow are not cached, and structures cached by other workers are not used, until Airflow
+    has parsed the file again.
+    """
+    _written.set(_written_key(dag_id), datetime.now(timezone.utc), STRUCTURE_CACHE_TIMEOUT)
+    cache.delete(_cache_key(dag_id))
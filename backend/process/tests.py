@@ -0,0 +1,238 @@
+import threading
+import time
+from unittest import mock
+from datetime import datetime, timedelta, timezone
+import requests
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import RequestFactory, SimpleTestCase
+from utils.airflow import AirflowClient, AirflowUnavailable, CircuitBreaker
+from . import structure
+from .fetcher import AirflowFetcher
+from .views import ProcessRunView, ProcessView
+
+
+def make_response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return response
+
+
+def make_client(breaker, retries=0):
+    return AirflowClient(
+        url="http://airflow/api/v1", username="user", password="password", pool_size=1, connect_timeout=1,
+        read_timeout=1, retries=retries, backoff=0, breaker=breaker,
+    )
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+
+    def test_single_trial_after_reset_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        with mock.patch("utils.airflow.time.monotonic", return_value=time.monotonic() + 31):
+            self.assertTrue(breaker.allow())
+            self.assertFalse(breaker.allow())
+            breaker.record_success()
+        self.assertTrue(breaker.allow())
+
+    def test_failed_trial_opens_again(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        with mock.patch("utils.airflow.time.monotonic", return_value=time.monotonic() + 31):
+            self.assertTrue(breaker.allow())
+            breaker.record_failure()
+            self.assertFalse(breaker.allow())
+
+    def test_cancelled_trial_allows_a_new_one(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        with mock.patch("utils.airflow.time.monotonic", return_value=time.monotonic() + 31):
+            self.assertTrue(breaker.allow())
+            breaker.cancel_trial()
+            self.assertTrue(breaker.allow())
+
+
+class AirflowClientTest(SimpleTestCase):
+    def test_only_gateway_errors_are_failures(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        client = make_client(breaker)
+        with mock.patch.object(client.session, "request", return_value=make_response(500)):
+            self.assertEqual(client.get("/dags").status_code, 500)
+        self.assertTrue(breaker.allow())
+        with mock.patch.object(client.session, "request", return_value=make_response(503)):
+            self.assertEqual(client.get("/dags").status_code, 503)
+        with self.assertRaises(AirflowUnavailable):
+            client.get("/dags")
+
+    def test_gateway_errors_of_idempotent_calls_are_retried(self):
+        client = make_client(CircuitBreaker(failure_threshold=5, reset_timeout=30), retries=2)
+        responses = [make_response(502), make_response(200)]
+        with mock.patch.object(client.session, "request", side_effect=responses) as request:
+            self.assertEqual(client.get("/dags").status_code, 200)
+            self.assertEqual(request.call_count, 2)
+
+    def test_non_idempotent_calls_are_not_retried(self):
+        client = make_client(CircuitBreaker(failure_threshold=5, reset_timeout=30), retries=2)
+        with mock.patch.object(client.session, "request", side_effect=requests.exceptions.ConnectionError) as request:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                client.post("/dags/~/dagRuns/list")
+            self.assertEqual(request.call_count, 1)
+
+    def test_any_request_error_ends_the_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        client = make_client(breaker, retries=2)
+        breaker.record_failure()
+        with mock.patch("utils.airflow.time.monotonic", return_value=time.monotonic() + 31):
+            with mock.patch.object(client.session, "request", side_effect=requests.exceptions.ChunkedEncodingError) as request:
+                with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                    client.get("/dags")
+                self.assertEqual(request.call_count, 1)
+            self.assertFalse(breaker.allow())
+        with mock.patch("utils.airflow.time.monotonic", return_value=time.monotonic() + 62):
+            self.assertTrue(breaker.allow())
+
+
+class AirflowUnavailableViewTest(SimpleTestCase):
+    def call(self, view, actions, error, **kwargs):
+        with mock.patch("process.views.airflow_client") as client:
+            for method in ["get", "post", "put", "patch"]:
+                getattr(client, method).side_effect = error
+            return view.as_view(actions)(RequestFactory().get("/"), **kwargs)
+
+    def test_open_breaker_is_service_unavailable(self):
+        for view, action, kwargs in [
+            (ProcessView, "retrieve", {"dag_id": "dag"}),
+            (ProcessView, "partial_update", {"dag_id": "dag"}),
+            (ProcessRunView, "list", {"dag_id": "dag"}),
+            (ProcessRunView, "retrieve", {"dag_id": "dag", "dag_run_id": "run"}),
+        ]:
+            response = self.call(view, {"get": action}, AirflowUnavailable("open"), **kwargs)
+            self.assertEqual(response.status_code, 503, action)
+            self.assertIn("Retry-After", response)
+
+    def test_timeout_is_service_unavailable(self):
+        response = self.call(ProcessView, {"get": "retrieve"}, requests.exceptions.ReadTimeout("timeout"), dag_id="dag")
+        self.assertEqual(response.status_code, 503)
+        self.assertNotIn("Retry-After", response)
+
+
+class AirflowFetcherTest(SimpleTestCase):
+    def test_identical_requests_are_sent_once(self):
+        client = mock.Mock()
+        client.get.return_value = make_response(200)
+        with AirflowFetcher(client, max_workers=2) as fetcher:
+            first = fetcher.get("/dags/a/tasks", params={"a": 1, "b": 2})
+            second = fetcher.get("/dags/a/tasks", params={"b": 2, "a": 1})
+            fetcher.get("/dags/b/tasks")
+        self.assertIs(first, second)
+        self.assertEqual(client.get.call_count, 2)
+
+    def test_requests_are_bounded(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def get(path, params=None):
+            with lock:
+                running.append(path)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(path)
+            return make_response(200)
+
+        client = mock.Mock()
+        client.get.side_effect = get
+        with AirflowFetcher(client, max_workers=2) as fetcher:
+            results = fetcher.map(lambda dag_id: fetcher.get(f"/dags/{dag_id}").status_code, range(6))
+        self.assertEqual(results, [200] * 6)
+        self.assertLessEqual(max(peak), 2)
+
+
+class DagStructureCacheTest(SimpleTestCase):
+    def setUp(self):
+        for patcher in [
+            mock.patch.object(structure, "cache", LocMemCache("structure-test", {})),
+            mock.patch.object(structure, "_written", LocMemCache("structure-written-test", {})),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def dag(self, parsed_time):
+        return {"dag_id": "dag", "last_parsed_time": parsed_time.isoformat()}
+
+    def test_cached_until_the_file_is_written(self):
+        parsed_time = datetime.now(timezone.utc) - timedelta(minutes=1)
+        structure.cache_structure(self.dag(parsed_time), {"pipeline": "old"})
+        self.assertEqual(structure.get_cached_structure(self.dag(parsed_time)), {"pipeline": "old"})
+
+        structure.invalidate_structure("dag")
+        self.assertIsNone(structure.get_cached_structure(self.dag(parsed_time)))
+
+    def test_not_cached_until_the_written_file_is_parsed(self):
+        parsed_time = datetime.now(timezone.utc) - timedelta(minutes=1)
+        structure.invalidate_structure("dag")
+        # Airflow still returns the tasks of the previous file
+        structure.cache_structure(self.dag(parsed_time), {"pipeline": "old"})
+        self.assertIsNone(structure.get_cached_structure(self.dag(parsed_time)))
+
+        parsed_time = datetime.now(timezone.utc) + timedelta(seconds=1)
+        structure.cache_structure(self.dag(parsed_time), {"pipeline": "new"})
+        self.assertEqual(structure.get_cached_structure(self.dag(parsed_time)), {"pipeline": "new"})
+
+    def test_entries_of_other_workers_are_stale_once_the_file_is_written(self):
+        parsed_time = datetime.now(timezone.utc) - timedelta(minutes=1)
+        structure.cache_structure(self.dag(parsed_time), {"pipeline": "old"})
+        # Another worker wrote the file, only the shared write time is seen here
+        structure._written.set(structure._written_key("dag"), datetime.now(timezone.utc))
+        later_parse = datetime.now(timezone.utc) + timedelta(seconds=1)
+        self.assertIsNone(structure.get_cached_structure(self.dag(later_parse)))
+
+
+class ProcessListRequestsTest(SimpleTestCase):
+    def setUp(self):
+        dags_response = make_response(200)
+        dags_response.json = lambda: {
+            "dags": [{"dag_id": dag_id, "owners": ["user"], "last_parsed_time": "2024-01-01T00:00:00+00:00"}
+                     for dag_id in ["a", "b"]],
+            "total_entries": 2,
+        }
+        runs_response = make_response(200)
+        runs_response.json = lambda: {
+            "dag_runs": [{"dag_id": "a", "dag_run_id": "run", "state": "running"}], "total_entries": 1,
+        }
+        self.client = mock.Mock()
+        self.client.get.return_value = dags_response
+        self.client.post.return_value = runs_response
+        for patcher in [
+            mock.patch("process.views.airflow_client", self.client),
+            mock.patch("process.views.owner_tags_ready", return_value=True),
+            mock.patch.object(ProcessView, "_get_dag_structure", return_value=(None, {})),
+            mock.patch.object(ProcessView, "_augment_dag", side_effect=lambda dag, *args: dag["dag_id"]),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_dags_and_latest_runs_read_for_the_etag_are_not_requested_again(self):
+        request = RequestFactory().get("/")
+        request.userinfo = {"sub": "id", "preferred_username": "user"}
+        response = ProcessView.as_view({"get": "list"})(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["dags"], ["a", "b"])
+        self.assertIn("ETag", response)
+        self.assertEqual(self.client.get.call_count, 1)
+        # The latest runs of the ETag, and the latest successful runs
+        self.assertEqual(self.client.post.call_count, 2)
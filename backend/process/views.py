@@ -1,20 +1,23 @@
 from datetime import datetime, date
 import requests
+import json
 import os
 import re
 from rest_framework.viewsets import ViewSet
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from typing import Tuple, Union
 from utils.keycloak_auth import get_current_user_id, get_current_user_name
+from utils.conditional import conditional_get
+from django.conf import settings
+from utils.airflow import AirflowUnavailableMixin, airflow_client
+from .fetcher import AirflowFetcher
+from .owner_tags import owner_tag, owner_tags_ready
+from .structure import cache_structure, get_cached_structure, invalidate_structure
 
 
-class AirflowInstance:
-    url = os.getenv("AIRFLOW_API")
-    username = os.getenv("AIRFLOW_USER")
-    password = os.getenv("AIRFLOW_PASSWORD")
-
 class DruidInstance:
     url = os.getenv("DRUID_URL")
     username = "admin"
@@ -23,6 +26,7 @@ class DruidInstance:
 
 SupersetUrl = os.getenv("SUPERSET_PUBLIC_URL")
 
+
 class DruidSegment:
     def __init__(self, dataSource, interval, version, loadSpec, dimensions, metrics, shardSpec, binaryVersion, size, identifier):
         self.data_source = dataSource
@@ -130,7 +134,7 @@ class DagRun:
         self.state = state
 
 
-class ProcessView(ViewSet):
+class ProcessView(AirflowUnavailableMixin, ViewSet):
     """
     This view handles Dag logic
         - list:
@@ -150,73 +154,231 @@ class ProcessView(ViewSet):
         "PUT": "process:run",
         "DELETE": "process:delete",
     }
+    # Concurrent Airflow requests sent to build one process list
+    max_concurrent_requests = settings.AIRFLOW_CONFIG["AIRFLOW_MAX_CONCURRENT_REQUESTS"]
+    # Airflow's default maximum_page_limit, also the largest page of the process list
+    batch_page_limit = 100
+    # Fields of the dags used to list them
+    dag_fields = [
+        "dag_id", "dag_display_name", "owners", "description", "schedule_interval", "is_paused", "is_active",
+        "last_parsed_time", "next_dagrun", "file_token",
+    ]
 
     def __init__(self):
         self.permitted_characters_regex = re.compile(r'^[^\s!@#$%^&*()+=[\]{}\\|;:\'",<>/?]*$')
+        # Page of dags, their ids and batch of latest runs read by `get_version_token`
+        self._prefetched = None
+
+    def get_version_token(self, request, *args, **kwargs):
+        """Token of the user's DAGs and of their latest runs, from the two Airflow requests the list starts with
 
+        The page of DAGs and the batch of latest runs are kept for `list()`, so that they are not requested twice.
+        A new run, or a change of state of one of the latest runs, changes the token.
+        """
+        airflow_failed_response, airflow_json = self._get_dags(request)
+        if airflow_failed_response is not None:
+            return None
+        user_name = get_current_user_name(request)
+        dags = [dag for dag in airflow_json["dags"] if user_name in dag["owners"]]
+        dag_ids = [dag["dag_id"] for dag in dags]
+        latest_runs = self._list_dag_runs(dag_ids) if dag_ids else {"dag_runs": [], "total_entries": 0}
+        if latest_runs is None:
+            return None
+        self._prefetched = (airflow_json, dag_ids, latest_runs)
+        return json.dumps([
+            [
+                [dag["dag_id"], dag.get("last_parsed_time"), dag.get("is_paused"), dag.get("is_active"), dag.get("next_dagrun")]
+                for dag in dags
+            ],
+            airflow_json["total_entries"],
+            latest_runs["total_entries"],
+            [[run["dag_id"], run["dag_run_id"], run["state"]] for run in latest_runs["dag_runs"]],
+        ])
+
+    @conditional_get()
     def list(self, request):
         """List process chains"""
         try:
             # Get request params
-            query = request.GET.get("query")
             taskId = request.GET.get("taskId")
+            page, page_size = self._get_page(request)
 
             # Get username
             user_name = get_current_user_name(request)
 
-            # Define processes array to store Airflow response
-            processes = []
-
-            if query:
-                # Filter by query
-                # Get the list of process chains defined in Airflow over REST API
-                airflow_dags_response = requests.get(
-                    f"{AirflowInstance.url}/dags",
-                    auth=(AirflowInstance.username, AirflowInstance.password),
-                    params={"dag_id_pattern": query},
-                )
+            # Get the page of the user's process chains defined in Airflow over REST API, unless read for the ETag
+            if self._prefetched is not None:
+                airflow_failed_response = None
+                airflow_json, prefetched_dag_ids, prefetched_runs = self._prefetched
             else:
-                airflow_dags_response = requests.get(
-                    f"{AirflowInstance.url}/dags",
-                    auth=(AirflowInstance.username, AirflowInstance.password),
-                )
+                airflow_failed_response, airflow_json = self._get_dags(request)
+                prefetched_dag_ids, prefetched_runs = None, None
+
+            if airflow_failed_response is None:
+                # Only returns the dags which owners flag is the same as the username
+                dags = [dag for dag in airflow_json["dags"] if user_name in dag["owners"]]
+                with AirflowFetcher(airflow_client, self.max_concurrent_requests) as fetcher:
+                    # Tasks and start dates of the dags, from the cache unless their file has been parsed again
+                    structures = fetcher.map(lambda dag: self._get_dag_structure(dag, fetcher), dags)
+                    for airflow_failed_response, _ in structures:
+                        if airflow_failed_response is not None:
+                            return Response(
+                                {"status": "failed", "message": "Internal Server Error"},
+                                status=airflow_failed_response.status_code,
+                            )
+                    dags = [(dag, structure) for dag, (_, structure) in zip(dags, structures)]
+                    if taskId:
+                        # Filter by Task, only return dags having the specified task
+                        dags = [(dag, structure) for dag, structure in dags if self._dag_has_task(structure, taskId)]
+
+                    # Latest runs of all the dags, and latest successful runs for their datasets
+                    dag_ids = [dag["dag_id"] for dag, _ in dags]
+                    # The batch read for the ETag is reused unless dags have been filtered out by task
+                    batch = prefetched_runs if dag_ids == prefetched_dag_ids else None
+                    latest_runs, latest_successful_runs = fetcher.map(
+                        lambda query: self._get_latest_dag_runs(dag_ids, fetcher, **query),
+                        [{"batch": batch}, {"order_by": "-end_date", "states": ["success"]}],
+                    )
 
-            if airflow_dags_response.ok:
-                airflow_json = airflow_dags_response.json()["dags"]
-                for dag in airflow_json:
-                    # Only returns the dags which owners flag is the same as the username
-                    if user_name in dag["owners"]:
-                        if taskId:
-                            # Filter by Task
-                            airflow_dag_tasks_response, dag_has_task = self._dag_has_task(dag, taskId)
-                            if airflow_dag_tasks_response.ok:
-                                if not dag_has_task:
-                                    # Only return dags having the specified task
-                                    continue
-                            else:
-                                return Response(
-                                    {"status": "failed", "message": "Internal Server Error"},
-                                    status=airflow_dag_tasks_response.status_code,
-                                )
-
-                        # Get the latest dagRun status
-                        latest_dag_run_status = self._get_latest_dag_run_status(dag["dag_id"])
-
-                        augmentedDag = self._augment_dag(dag)
-                        augmentedDag["latest_dag_run_status"] = latest_dag_run_status
-                        processes.append(augmentedDag)
-                return Response({"dags": processes}, status=status.HTTP_200_OK)
+                    processes = fetcher.map(
+                        lambda item: self._augment_dag(*item, fetcher, latest_runs, latest_successful_runs), dags
+                    )
+                return Response(
+                    {
+                        "dags": processes,
+                        "total_entries": airflow_json["total_entries"],
+                        "page": page,
+                        "page_size": page_size,
+                    },
+                    status=status.HTTP_200_OK,
+                )
             else:
                 return Response(
                     {"status": "failed", "message": "Internal Server Error"},
-                    status=airflow_dags_response.status_code,
+                    status=airflow_failed_response.status_code,
                 )
+        except (ValidationError, requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            # Invalid pagination parameters are reported as bad requests, and an unreachable Airflow as unavailable
+            raise
         except:
             return Response(
                 {"status": "failed", "message": "Internal Server Error"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    def _get_page(self, request):
+        try:
+            page = int(request.GET.get("page", 1))
+            page_size = int(request.GET.get("page_size", self.batch_page_limit))
+        except ValueError:
+            raise ValidationError({"page": "page and page_size must be integers"})
+        if page < 1 or not 1 <= page_size <= self.batch_page_limit:
+            raise ValidationError(
+                {"page": f"page must be positive and page_size between 1 and {self.batch_page_limit}"}
+            )
+        return page, page_size
+
+    def _get_dags(self, request) -> Tuple[Union[requests.Response, None], Union[dict, None]]:
+        """Lists the page of the user's dags requested with `?page=` and `?page_size=`, filtered by `?query=`
+
+        The dags are filtered by owner tag and paged by Airflow, only the fields used by the process list are returned.
+        Returns the failed Airflow response or None, and the `/dags` response with the page of dags.
+        """
+        query = request.GET.get("query")
+        page, page_size = self._get_page(request)
+        params = {
+            "order_by": "dag_id",
+            "fields": self.dag_fields,
+        }
+        if query:
+            # Filter by query
+            params["dag_id_pattern"] = query
+        if not owner_tags_ready():
+            return self._get_untagged_dags(request, params, page, page_size)
+
+        airflow_response = airflow_client.get(
+            "/dags",
+            params={
+                **params,
+                "tags": owner_tag(get_current_user_name(request)),
+                "limit": page_size,
+                "offset": (page - 1) * page_size,
+            },
+        )
+        if not airflow_response.ok:
+            return airflow_response, None
+        return None, airflow_response.json()
+
+    def _get_untagged_dags(self, request, params, page, page_size):
+        """Filters the dags by owners while the dags generated before the owner tag are not all tagged
+
+        Every dag of Airflow is listed, see the `tag_process_chains` command.
+        """
+        user_name = get_current_user_name(request)
+        dags = []
+        offset = 0
+        while True:
+            airflow_response = airflow_client.get(
+                "/dags", params={**params, "limit": self.batch_page_limit, "offset": offset}
+            )
+            if not airflow_response.ok:
+                return airflow_response, None
+            airflow_json = airflow_response.json()
+            dags.extend(dag for dag in airflow_json["dags"] if user_name in dag["owners"])
+            offset += len(airflow_json["dags"])
+            if not airflow_json["dags"] or offset >= airflow_json["total_entries"]:
+                break
+        start = (page - 1) * page_size
+        return None, {"dags": dags[start:start + page_size], "total_entries": len(dags)}
+
+    def _list_dag_runs(self, dag_ids, order_by="-execution_date", states=None):
+        """Returns the first page of the runs of the dags in a single batch request, or None if it failed"""
+        body = {"dag_ids": dag_ids, "order_by": order_by, "page_limit": self.batch_page_limit}
+        if states:
+            body["states"] = states
+        try:
+            airflow_response = airflow_client.post("/dags/~/dagRuns/list", json=body, idempotent=True)
+        except requests.exceptions.RequestException:
+            return None
+        return airflow_response.json() if airflow_response.ok else None
+
+    def _get_latest_dag_runs(self, dag_ids, fetcher=None, order_by="-execution_date", states=None, batch=None):
+        """Returns the latest run of each dag, or None for the dags without runs
+
+        A single batch request returns the latest runs of all the dags, only the dags whose latest run is beyond its
+        page are queried one by one, for their latest run only. The dags whose runs could not be read are left out.
+        `batch` is the result of that request when it has already been sent.
+        """
+        latest_runs = {}
+        missing_dag_ids = list(dag_ids)
+        if batch is None and len(missing_dag_ids) > 1:
+            batch = self._list_dag_runs(missing_dag_ids, order_by, states)
+        if batch is not None:
+            for dag_run in batch["dag_runs"]:
+                latest_runs.setdefault(dag_run["dag_id"], dag_run)
+            if batch["total_entries"] <= len(batch["dag_runs"]):
+                # All the runs are in the page, the other dags have none
+                return {dag_id: latest_runs.get(dag_id) for dag_id in dag_ids}
+            missing_dag_ids = [dag_id for dag_id in dag_ids if dag_id not in latest_runs]
+
+        params = {"limit": 1, "order_by": order_by}
+        if states:
+            params["state"] = states
+        if fetcher is not None:
+            for dag_id in missing_dag_ids:
+                fetcher.submit(f"/dags/{dag_id}/dagRuns", params)
+        for dag_id in missing_dag_ids:
+            airflow_response = self._airflow_get(f"/dags/{dag_id}/dagRuns", fetcher, params)
+            if airflow_response.ok:
+                dag_runs = airflow_response.json().get("dag_runs", [])
+                latest_runs[dag_id] = dag_runs[0] if dag_runs else None
+        return latest_runs
+
+    def _airflow_get(self, path, fetcher=None, params=None):
+        if fetcher is not None:
+            return fetcher.get(path, params)
+        return airflow_client.get(path, params=params)
+
     def create(self, request):
         """Create a process chain"""
         try:
@@ -244,11 +406,7 @@ class ProcessView(ViewSet):
                 )
 
             # Checks if the process chain already exists or not
-            route = f"{AirflowInstance.url}/dags/{new_dag_config.dag_id}"
-
-            airflow_response = requests.get(
-                route, auth=(AirflowInstance.username, AirflowInstance.password)
-            )
+            airflow_response = airflow_client.get(f"/dags/{new_dag_config.dag_id}")
 
             if airflow_response.ok:
                 return Response(
@@ -257,11 +415,9 @@ class ProcessView(ViewSet):
                 )
 
             # Run factory by passing config to create a process chain
-            airflow_internal_url = AirflowInstance.url.removesuffix("/api/v1")
             pipeline_name_id = new_dag_config.pipeline_name.encode('idna').decode()
-            airflow_response = requests.post(
-                f"{airflow_internal_url}/factory",
-                auth=(AirflowInstance.username, AirflowInstance.password),
+            airflow_response = airflow_client.post(
+                airflow_client.factory_url,
                 json={
                     "dag_conf": {
                         "owner": f"{new_dag_config.owner}",
@@ -278,6 +434,8 @@ class ProcessView(ViewSet):
                 },
             )
 
+            # A dag previously created with the same id may still be cached
+            invalidate_structure(new_dag_config.dag_id)
             if airflow_response.ok:
                 return Response({"status": "success"}, status=status.HTTP_201_CREATED)
             else:
@@ -285,6 +443,9 @@ class ProcessView(ViewSet):
                     {"status": "failed", "message": "Internal Server Error"},
                     status=airflow_response.status_code,
                 )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            # Reported as unavailable by AirflowUnavailableMixin
+            raise
         except:
             return Response(
                 {"status": "failed", "message": "Internal Server Error"},
@@ -292,34 +453,59 @@ class ProcessView(ViewSet):
             )
 
     # Dag Pipeline
-    def retrieve(self, dag_id=None):
+    def retrieve(self, request, dag_id=None):
         """Get process pipeline"""
-        route = f"{AirflowInstance.url}/dags/{dag_id}/tasks"
-        airflow_response = requests.get(
-            route,
-            auth=(AirflowInstance.username, AirflowInstance.password),
+        airflow_response = airflow_client.get(f"/dags/{dag_id}")
+        if not airflow_response.ok:
+            return Response({"status": "failed"}, status=airflow_response.status_code)
+
+        airflow_failed_response, structure = self._get_dag_structure(airflow_response.json())
+        if airflow_failed_response is not None:
+            return Response({"status": "failed"}, status=airflow_failed_response.status_code)
+        return Response(
+            {"pipeline": structure["pipeline"]},
+            status=status.HTTP_200_OK,
         )
 
-        if airflow_response.ok:
-            airflow_json = airflow_response.json()["tasks"]
-            for task in airflow_json:
-                if task["operator_name"] == "HopPipelineOperator":
-                    return Response(
-                        {"pipeline": task["task_id"]},
-                        status=status.HTTP_200_OK,
-                    )
-        else:
-            return Response({"status": "failed"}, status=airflow_response.status_code)
+    def _get_dag_structure(self, dag, fetcher=None):
+        """Returns the failed Airflow response if any, and the tasks, Hop pipeline task id and start date of a dag
+
+        The structure of a dag only changes when its file is written by the factory and parsed again by Airflow,
+        so it is cached until then.
+        """
+        structure = get_cached_structure(dag)
+        if structure is not None:
+            return None, structure
+
+        tasks_route, details_route = f"/dags/{dag['dag_id']}/tasks", f"/dags/{dag['dag_id']}/details"
+        if fetcher is not None:
+            # Both are read concurrently
+            fetcher.submit(details_route)
+        airflow_tasks_response = self._airflow_get(tasks_route, fetcher)
+        airflow_details_response = self._airflow_get(details_route, fetcher)
+        for airflow_response in (airflow_tasks_response, airflow_details_response):
+            if not airflow_response.ok:
+                return airflow_response, None
+
+        tasks = [
+            {"task_id": task["task_id"], "operator_name": task["operator_name"]}
+            for task in airflow_tasks_response.json()["tasks"]
+        ]
+        structure = {
+            "tasks": tasks,
+            "pipeline": next((task["task_id"] for task in tasks if task["operator_name"] == "HopPipelineOperator"), None),
+            "start_date": airflow_details_response.json()["start_date"],
+        }
+        cache_structure(dag, structure)
+        return None, structure
 
     def update(self, request, dag_id=None):
         """update process chain pipeline"""
         old_pipeline = request.data["old_pipeline"]
         new_pipeline = request.data["new_pipeline"]
 
-        airflow_internal_url = AirflowInstance.url.removesuffix("/api/v1")
-        airflow_response = requests.put(
-            f"{airflow_internal_url}/factory",
-            auth=(AirflowInstance.username, AirflowInstance.password),
+        airflow_response = airflow_client.put(
+            airflow_client.factory_url,
             json={
                 "old_pipeline": f"{old_pipeline}",
                 "new_pipeline": f"{new_pipeline}",
@@ -327,6 +513,8 @@ class ProcessView(ViewSet):
             },
         )
 
+        # The pipeline task of the dag is renamed
+        invalidate_structure(dag_id)
         if airflow_response.ok:
             return Response({"status": "success"}, status=status.HTTP_201_CREATED)
         else:
@@ -336,17 +524,15 @@ class ProcessView(ViewSet):
         """
         Endpoint to enable, disable process chain
         """
-        route = f"{AirflowInstance.url}/dags/{dag_id}"
+        route = f"/dags/{dag_id}"
 
-        airflow_response = requests.get(
-            route, auth=(AirflowInstance.username, AirflowInstance.password)
-        )
+        airflow_response = airflow_client.get(route)
         is_paused = airflow_response.json()["is_paused"]
 
-        airflow_response = requests.patch(
+        airflow_response = airflow_client.patch(
             route,
-            auth=(AirflowInstance.username, AirflowInstance.password),
             json={"is_paused": not is_paused},
+            idempotent=True,
         )
 
         if airflow_response.ok:
@@ -354,20 +540,14 @@ class ProcessView(ViewSet):
         else:
             return Response({"status": "failed"}, status=airflow_response.status_code)
 
-    def _augment_dag(self, dag):
-        pipeline_response = self.retrieve(dag['dag_id'])
-        data_source_name = pipeline_response.data.get("pipeline") if pipeline_response.status_code == status.HTTP_200_OK else None
-        airflow_start_date_response = requests.get(
-                            f"{AirflowInstance.url}/dags/{dag['dag_id']}/details",
-                            auth=(AirflowInstance.username, AirflowInstance.password),
-                        )
-        dataset_info_success, dataset_info = self._get_dataset_info_internal(dag['dag_id'])
+    def _augment_dag(self, dag, structure, fetcher=None, latest_runs=None, latest_successful_runs=None):
+        dataset_info_success, dataset_info = self._get_dataset_info_internal(dag['dag_id'], fetcher, latest_successful_runs)
         augmentedDag= Dag(
                                 dag["dag_id"],
                                 dag["dag_id"],
                                 dag["dag_display_name"],
-                                data_source_name, 
-                                airflow_start_date_response.json()["start_date"],
+                                structure["pipeline"],
+                                structure["start_date"],
                                 dag["schedule_interval"]["value"],
                                 not dag["is_paused"],
                                 dag["description"],
@@ -377,51 +557,35 @@ class ProcessView(ViewSet):
                                 dataset_info[0] if dataset_info != None else None,
                                 dataset_info[1] if dataset_info != None else None
                             ).__dict__
+        if latest_runs is not None:
+            latest_run = latest_runs.get(dag['dag_id'])
+            augmentedDag["latest_dag_run_status"] = latest_run.get('state') if latest_run else None
 
         return augmentedDag
 
-    def _dag_has_task(self, dag, taskId):
-        result = False
-        route = f"{AirflowInstance.url}/dags/{dag['dag_id']}/tasks"
-        airflow_dag_tasks_response = requests.get(
-                        route,
-                        auth=(AirflowInstance.username, AirflowInstance.password),
-                    )
-        if airflow_dag_tasks_response.ok:
-            airflow_json = airflow_dag_tasks_response.json()["tasks"]
-            for task in airflow_json:
-                if (task["operator_name"] == "HopPipelineOperator") and (task["task_id"] == f"{taskId}.hpl"):
-                    result=True
-        return airflow_dag_tasks_response,result
-
-    def _get_dataset_info_internal(self, dag_id) -> Tuple[bool, Union[Tuple[int, str], None]]:
-        route = f"{AirflowInstance.url}/dags/{dag_id}/dagRuns"
-
-        get_runs_response = requests.get(
-            route, auth=(AirflowInstance.username, AirflowInstance.password)
+    def _dag_has_task(self, structure, taskId):
+        return any(
+            task["operator_name"] == "HopPipelineOperator" and task["task_id"] == f"{taskId}.hpl"
+            for task in structure["tasks"]
         )
 
-        if not get_runs_response.ok:
-            return [False, None]
-        successful_runs = sorted(
-            [dag for dag in get_runs_response.json()["dag_runs"] if dag["state"] == "success"],
-            key=lambda r: r["end_date"],
-            reverse=True
-        )
+    def _get_dataset_info_internal(self, dag_id, fetcher=None, latest_successful_runs=None) -> Tuple[bool, Union[Tuple[int, str], None]]:
+        if latest_successful_runs is None:
+            latest_successful_runs = self._get_latest_dag_runs(
+                [dag_id], fetcher, order_by="-end_date", states=["success"]
+            )
 
-        if len(successful_runs) == 0:
+        if dag_id not in latest_successful_runs:
+            return [False, None]
+        if latest_successful_runs[dag_id] is None:
             return [True, None]
-        last_run_id = successful_runs[0]["dag_run_id"]
-        get_dataset_id_route = f"{AirflowInstance.url}/dags/{dag_id}/dagRuns/{last_run_id}/taskInstances/link_dataset_to_superset/xcomEntries/superset_dataset_id"
-        get_dataset_id_response = requests.get(
-            get_dataset_id_route,
-            auth=(AirflowInstance.username, AirflowInstance.password)
-        )
-        get_dataset_url_route = f"{AirflowInstance.url}/dags/{dag_id}/dagRuns/{last_run_id}/taskInstances/link_dataset_to_superset/xcomEntries/superset_dataset_url"
-        get_dataset_url_response = requests.get(
-            get_dataset_url_route,
-            auth=(AirflowInstance.username, AirflowInstance.password)
-        )
+        last_run_id = latest_successful_runs[dag_id]["dag_run_id"]
+        xcom_route = f"/dags/{dag_id}/dagRuns/{last_run_id}/taskInstances/link_dataset_to_superset/xcomEntries"
+        if fetcher is not None:
+            # Both values are read concurrently
+            fetcher.submit(f"{xcom_route}/superset_dataset_url")
+        get_dataset_id_response = self._airflow_get(f"{xcom_route}/superset_dataset_id", fetcher)
+        get_dataset_url_response = self._airflow_get(f"{xcom_route}/superset_dataset_url", fetcher)
 
         if not (get_dataset_id_response.ok and get_dataset_url_response.ok):
             return [False, None]
@@ -505,25 +669,7 @@ class ProcessView(ViewSet):
         else:
             return Response({"error": "Failed to retrieve data from Druid"}, status=response.status_code)
 
-    def _get_latest_dag_run_status(self, dag_id):
-        route = f"{AirflowInstance.url}/dags/{dag_id}/dagRuns"
-        airflow_response = requests.get(
-            route,
-            auth=(AirflowInstance.username, AirflowInstance.password),
-        )
-
-        if not airflow_response.ok:
-            return None
-
-        dag_runs = airflow_response.json().get("dag_runs", [])
-        if not dag_runs:
-            return None
-
-        # Sort dagRuns by execution date
-        dag_runs = sorted(dag_runs, key=lambda x: x['execution_date'], reverse=True)
-        return dag_runs[0].get('state') if dag_runs else None
-
-class ProcessRunView(ViewSet):
+class ProcessRunView(AirflowUnavailableMixin, ViewSet):
     """
     This view handles Dag-Runs logic
         - list:
@@ -543,10 +689,9 @@ class ProcessRunView(ViewSet):
         """Listing the dag-runs of a specific dag""" 
         dag_runs = []
 
-        route = f"{AirflowInstance.url}/dags/{dag_id}/dagRuns"
-        airflow_response = requests.get(
+        route = f"/dags/{dag_id}/dagRuns"
+        airflow_response = airflow_client.get(
             route,
-            auth=(AirflowInstance.username, AirflowInstance.password),
             params={"limit": 5, "order_by": "-execution_date"},
         )
 
@@ -566,10 +711,9 @@ class ProcessRunView(ViewSet):
 
     def create(self, request, dag_id=None):
         """Endpoint to create a dag-run: run the dag"""
-        route = f"{AirflowInstance.url}/dags/{dag_id}/dagRuns"
-        airflow_response = requests.post(
+        route = f"/dags/{dag_id}/dagRuns"
+        airflow_response = airflow_client.post(
             route,
-            auth=(AirflowInstance.username, AirflowInstance.password),
             json={},
         )
 
@@ -580,12 +724,9 @@ class ProcessRunView(ViewSet):
 
     def retrieve(self, request, dag_id=None, dag_run_id=None):
         route = (
-            f"{AirflowInstance.url}/dags/{dag_id}/dagRuns/{dag_run_id}/taskInstances"
-        )
-        airflow_response = requests.get(
-            route,
-            auth=(AirflowInstance.username, AirflowInstance.password),
+            f"/dags/{dag_id}/dagRuns/{dag_run_id}/taskInstances"
         )
+        airflow_response = airflow_client.get(route)
 
         if airflow_response.ok:
             airflow_json = airflow_response.json()["task_instances"]
@@ -6,6 +6,10 @@ from rest_framework import status
 from rest_framework.permissions import AllowAny
 from utils.keycloak_auth import get_keycloak_admin
 from django.conf import settings
+from accounts.views import has_admin_role
+from core.authz_policy import policy_store
+from core.permission_cache import permission_cache
+from utils.clamav import scanner
 
 #Api to create and list all roles
 class RoleApiView(APIView):
@@ -50,3 +54,50 @@ class RoleApiView(APIView):
             print(err)
             return Response({'errorMessage': 'Unable to update the role'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+class AuthorizationPolicyApiView(APIView):
+    """
+    API view to reload the Keycloak authorization policy used to check the API scopes
+    """
+    keycloak_scopes = {
+        'POST': 'user:update'
+    }
+
+    def post(self, request, *args, **kwargs):
+        """
+        Endpoint for reloading the authorization policy from Keycloak
+        """
+        if not has_admin_role(request):
+            return Response({'errorMessage': 'You do not have permission to reload the authorization policy.'}, status=status.HTTP_403_FORBIDDEN)
+
+        if not policy_store.refresh():
+            return Response({'errorMessage': 'Unable to reload the authorization policy'}, status=status.HTTP_502_BAD_GATEWAY)
+        if policy_store.shared_cache is not None:
+            # Published in Redis, the other workers check for it every few seconds
+            message = 'Authorization policy reloaded successfully, the other workers pick it up within {} seconds'.format(
+                policy_store.version_check_interval)
+        else:
+            message = 'Authorization policy reloaded successfully by this worker, the other workers pick it up at their next refresh'
+        return Response({'message': message}, status=status.HTTP_200_OK)
+
+
+class StatsApiView(APIView):
+    """
+    API view to read the cache and scan counters of the worker serving the request
+    """
+    keycloak_scopes = {
+        'GET': 'user:read'
+    }
+
+    def get(self, request, *args, **kwargs):
+        """
+        Endpoint for monitoring the permission cache and the antivirus scans, the counters are per worker
+        """
+        if not has_admin_role(request):
+            return Response({'errorMessage': 'You do not have permission to read the statistics.'}, status=status.HTTP_403_FORBIDDEN)
+
+        return Response({
+            'pid': os.getpid(),
+            'permission_cache': permission_cache.stats(),
+            'antivirus': scanner.stats(),
+        }, status=status.HTTP_200_OK)
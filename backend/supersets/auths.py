@@ -5,11 +5,11 @@ from core.user_id import get_current_user_name
 from core.keycloak_impersonation import get_auth_token
 from keycloak import KeycloakPostError
 
-def get_csrf_token ():
+def get_csrf_token (request):
     url = f"{os.getenv('SUPERSET_BASE_URL')}/security/csrf_token/"
 
     try:
-        auth_token = get_auth_token()
+        auth_token = get_auth_token(request)
     except KeycloakPostError as err:
         return {'status': err.response_code, 'message': err.error_message}
 
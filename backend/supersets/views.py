@@ -1,3 +1,4 @@
+import json
 import logging
 import re
 import requests
@@ -9,11 +10,12 @@ from rest_framework import status
 from rest_framework.permissions import AllowAny
 from keycloak import KeycloakPostError
 from core.keycloak_impersonation import get_auth_token
+from utils.conditional import conditional_get
 log = logging.getLogger("SupersetAPI")
 
 class SupersetAPI(APIView):
     def authorize(self, headers):
-        token = get_auth_token()
+        token = get_auth_token(self.request)
         headers['Authorization'] = f"Bearer {token['access_token']}"
         log.debug("Added authorization header to Superset request")
         return headers
@@ -26,7 +28,37 @@ class ListDashboardsAPI(SupersetAPI):
     keycloak_scopes = {
         "GET": "dashboard:read",
     }
+    # The token only saves work, the list is built as usual when Superset is slow to answer it
+    version_token_timeout = (3.05, 5)  # seconds to connect, to read
 
+    def get_version_token(self, request, query=None):
+        """Number of dashboards and last change, from a single one-row Superset request"""
+        url = f"{os.getenv('SUPERSET_BASE_URL')}/dashboard/"
+        headers = self.authorize({
+            "Content-Type": "application/json",
+        })
+        params = {
+            "columns": ["changed_on_utc"],
+            "order_column": "changed_on",
+            "order_direction": "desc",
+            "page_size": 1,
+        }
+        if query:
+            params["filters"] = [{"col": "dashboard_title", "opr": "ct", "value": query}]
+        try:
+            superset_response = requests.get(
+                url=url, headers=headers, params={"q": json.dumps(params)}, timeout=self.version_token_timeout
+            )
+        except requests.exceptions.RequestException as e:
+            log.warning("Unable to get the version of the Superset dashboards: %s", e)
+            return None
+        if superset_response.status_code != 200:
+            return None
+        result = superset_response.json()
+        last_change = result["result"][0].get("changed_on_utc") if result["result"] else None
+        return f"{result['count']}:{last_change}"
+
+    @conditional_get()
     def get(self, request, query=None):
         """
         Endpoint for listing superset dashboards 
@@ -316,7 +348,7 @@ class CsrfTokenApi(SupersetAPI):
         url = f"{os.getenv('SUPERSET_BASE_URL')}/security/csrf_token/"
 
         try:
-            auth_token = get_auth_token()
+            auth_token = get_auth_token(request)
         except KeycloakPostError as err:
             return {
                 "status": err.response_code,
@@ -0,0 +1,168 @@
+import logging
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+_log = logging.getLogger('Airflow')
+
+
+class AirflowUnavailable(requests.exceptions.ConnectionError):
+    """Raised without calling Airflow while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Fails fast after `failure_threshold` consecutive failures, until a trial call succeeds after `reset_timeout` seconds"""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            # Half-open, a single call is let through to check whether Airflow is back
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                _log.info("Airflow is available again, closing the circuit")
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or (self._opened_at is None and self._failures >= self.failure_threshold):
+                _log.warning(f"Airflow is unavailable, failing fast for {self.reset_timeout} seconds")
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+    def cancel_trial(self):
+        """Ends a trial call that failed for another reason than Airflow, the next call is a new trial"""
+        with self._lock:
+            self._trial = False
+
+
+class AirflowClient:
+    """Client of the Airflow REST API shared by the views of a process
+
+    Connections are kept alive in a pool of `pool_size` connections, calls time out after `connect_timeout` and
+    `read_timeout` seconds, idempotent calls are retried with a jittered exponential backoff on connection errors
+    and gateway errors, and calls fail fast with `AirflowUnavailable` while the circuit breaker is open.
+    """
+
+    IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+    RETRIED_STATUSES = {502, 503, 504}
+
+    def __init__(self, url, username, password, pool_size, connect_timeout, read_timeout, retries, backoff, breaker):
+        self.url = url
+        # The factory plugin is served by the webserver outside of the REST API
+        self.factory_url = f"{url.removesuffix('/api/v1')}/factory" if url else None
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker
+        self.session = requests.Session()
+        self.session.auth = (username, password)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, idempotent=None, **kwargs) -> requests.Response:
+        """Calls `{url}{path}`, or `path` if it is an absolute URL
+
+        Calls are retried if `idempotent`, which defaults to whether the HTTP method is idempotent.
+        """
+        url = path if path.startswith(("http://", "https://")) else f"{self.url}{path}"
+        if idempotent is None:
+            idempotent = method.upper() in self.IDEMPOTENT_METHODS
+        retries = self.retries if idempotent else 0
+        kwargs.setdefault("timeout", self.timeout)
+
+        for attempt in range(retries + 1):
+            if not self.breaker.allow():
+                raise AirflowUnavailable(f"Airflow is unavailable, {method} {path} not sent")
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self.breaker.record_failure()
+                retried = isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+                if not retried or attempt == retries:
+                    raise
+                _log.warning(f"{method} {path} failed, retrying: {e}")
+            except BaseException:
+                self.breaker.cancel_trial()
+                raise
+            else:
+                # Other errors are answers of Airflow, only gateway errors show that it is unavailable
+                if response.status_code in self.RETRIED_STATUSES:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code not in self.RETRIED_STATUSES or attempt == retries:
+                    return response
+                _log.warning(f"{method} {path} returned {response.status_code}, retrying")
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def get(self, path, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs) -> requests.Response:
+        return self.request("PUT", path, **kwargs)
+
+    def patch(self, path, **kwargs) -> requests.Response:
+        return self.request("PATCH", path, **kwargs)
+
+
+class AirflowUnavailableMixin:
+    """Mixin of the views calling Airflow, answering 503 when it cannot be reached instead of an unhandled error
+
+    Covers calls refused while the circuit breaker is open and connection errors and timeouts left after retries.
+    """
+
+    def handle_exception(self, exc):
+        if not isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return super().handle_exception(exc)
+        _log.error(f"Airflow is unavailable: {exc}")
+        headers = {}
+        if isinstance(exc, AirflowUnavailable):
+            headers["Retry-After"] = str(int(airflow_client.breaker.reset_timeout))
+        return Response(
+            {"status": "failed", "message": "Airflow is unavailable"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers=headers,
+        )
+
+
+airflow_client = AirflowClient(
+    url=settings.AIRFLOW_CONFIG['AIRFLOW_API'],
+    username=settings.AIRFLOW_CONFIG['AIRFLOW_USER'],
+    password=settings.AIRFLOW_CONFIG['AIRFLOW_PASSWORD'],
+    pool_size=settings.AIRFLOW_CONFIG['AIRFLOW_POOL_SIZE'],
+    connect_timeout=settings.AIRFLOW_CONFIG['AIRFLOW_CONNECT_TIMEOUT'],
+    read_timeout=settings.AIRFLOW_CONFIG['AIRFLOW_READ_TIMEOUT'],
+    retries=settings.AIRFLOW_CONFIG['AIRFLOW_RETRIES'],
+    backoff=settings.AIRFLOW_CONFIG['AIRFLOW_RETRY_BACKOFF'],
+    breaker=CircuitBreaker(
+        failure_threshold=settings.AIRFLOW_CONFIG['AIRFLOW_BREAKER_THRESHOLD'],
+        reset_timeout=settings.AIRFLOW_CONFIG['AIRFLOW_BREAKER_RESET_TIMEOUT'],
+    ),
+)
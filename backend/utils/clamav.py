@@ -0,0 +1,281 @@
+import hashlib
+import logging
+import queue
+import re
+import socket
+import struct
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+
+_log = logging.getLogger('ClamAV')
+
+# Replies are prefixed with the command id in a session, e.g. "1: stream: OK"
+_SESSION_REPLY_PREFIX = re.compile(r"^\d+: ")
+
+
+class ClamdScanError(Exception):
+    pass
+
+
+def file_sha256(file) -> str:
+    """Hashes a file already fully received, e.g. an uploaded file in memory or in a temporary file"""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+class ClamdConnection:
+    """Connection to clamd in IDSESSION mode, so that it can be reused to scan several streams"""
+
+    def __init__(self, host, port, timeout):
+        self.socket = socket.create_connection((host, port), timeout=timeout)
+        self.socket.sendall(b"zIDSESSION\0")
+        self.last_used = time.monotonic()
+
+    def start_stream(self):
+        self.socket.sendall(b"zINSTREAM\0")
+
+    def feed(self, chunk: bytes):
+        if chunk:
+            self.socket.sendall(struct.pack("!L", len(chunk)) + chunk)
+
+    def end_stream(self) -> str:
+        """Ends the stream and returns the reply of clamd, e.g. "stream: OK" """
+        self.socket.sendall(struct.pack("!L", 0))
+        reply = b""
+        while not reply.endswith(b"\0"):
+            data = self.socket.recv(4096)
+            if not data:
+                raise ConnectionResetError("Connection closed by clamd")
+            reply += data
+        self.last_used = time.monotonic()
+        return _SESSION_REPLY_PREFIX.sub("", reply.rstrip(b"\0").decode("utf-8", "replace"))
+
+    def close(self):
+        try:
+            self.socket.sendall(b"zEND\0")
+        except OSError:
+            pass
+        self.socket.close()
+
+
+def _parse_reply(reply: str):
+    # stream: OK | stream: <signature> FOUND | <message> ERROR
+    if reply.endswith("OK"):
+        return None
+    if reply.endswith("FOUND"):
+        return reply.removeprefix("stream:").removesuffix("FOUND").strip()
+    raise ClamdScanError(reply or "No reply from clamd")
+
+
+class ClamdScanner:
+    """Scans files with a pool of clamd connections, caching verdicts by content hash and signature database version"""
+    # Upper bounds in seconds of the buckets of the scan time histogram
+    SCAN_TIME_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, host, port, pool_size, max_concurrent_scans, cache, cache_ttl,
+                 timeout=60, idle_timeout=20, version_check_interval=300):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        # Below the IdleTimeout of clamd (30 seconds by default) after which it closes sessions
+        self.idle_timeout = idle_timeout
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        self.version_check_interval = version_check_interval
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._slots = threading.BoundedSemaphore(max_concurrent_scans)
+        self._lock = threading.Lock()
+        self._database_version = None
+        self._database_version_checked = 0
+        self.scans = 0
+        self.hits = 0
+        self.misses = 0
+        self.scan_time = 0.0
+        self.max_scan_time = 0.0
+        self.scan_time_buckets = [0] * len(self.SCAN_TIME_BUCKETS)
+
+    def get_database_version(self):
+        """Returns the version of the signature database, e.g. "26885" for "ClamAV 1.0.1/26885/Tue Apr 11 07:52:33 2023" """
+        now = time.monotonic()
+        if now - self._database_version_checked > self.version_check_interval:
+            try:
+                with socket.create_connection((self.host, self.port), timeout=self.timeout) as connection:
+                    connection.sendall(b"zVERSION\0")
+                    reply = connection.recv(4096).rstrip(b"\0").decode("utf-8", "replace")
+                parts = reply.split("/")
+                self._database_version = parts[1] if len(parts) > 1 else None
+            except OSError as e:
+                _log.warning(f"Unable to get the clamd signature database version: {e}")
+                self._database_version = None
+            self._database_version_checked = now
+        return self._database_version
+
+    def scan_bytes(self, data: bytes):
+        # Hashing bytes already in memory is cheap, so their verdict is looked up before scanning
+        return self.scan_file(ContentFile(data), sha256=hashlib.sha256(data).hexdigest())
+
+    def scan_file(self, file, consumers=(), sha256=None):
+        """Returns None if a file is clean or the name of the signature found
+
+        `file` is an uploaded file or any file with `chunks()`, its chunks are also given to the `consumers`
+        callables unless the file is known to be infected. The cached verdict is only looked up when the `sha256`
+        of the file is given, see `file_sha256` for uploaded files. Otherwise the file is hashed while it is
+        scanned, so that objects read from MinIO are only streamed once.
+        """
+        scan = self.iter_scan(file, consumers, sha256=sha256)
+        while True:
+            try:
+                next(scan)
+            except StopIteration as stop:
+                return stop.value
+
+    def iter_scan(self, file, consumers=(), sha256=None):
+        """Generator scanning a file while yielding its chunks, returns None if it is clean or the name of the signature
+
+        Lets the caller stream the file elsewhere in the same pass, the verdict is only known once every chunk has
+        been yielded. Nothing is yielded for a file known to be infected.
+        """
+        database_version = self.get_database_version()
+        if sha256 and database_version:
+            verdict = self.cache.get(f"clamav-verdict:{database_version}:{sha256}")
+            if verdict is not None:
+                self._record(hit=True)
+                if verdict:
+                    return verdict
+                for chunk in file.chunks():
+                    for consumer in consumers:
+                        consumer(chunk)
+                    yield chunk
+                return None
+
+        digest = None if sha256 else hashlib.sha256()
+        started = time.monotonic()
+        with self._slots:
+            signature = yield from self._scan(file, consumers, digest)
+        self._record(hit=False, scan_time=time.monotonic() - started)
+        # Verdicts are only cached when they can be discarded on a signature update
+        if database_version:
+            sha256 = sha256 or digest.hexdigest()
+            self.cache.set(f"clamav-verdict:{database_version}:{sha256}", signature or "", self.cache_ttl)
+        return signature
+
+    def _scan(self, file, consumers, digest):
+        connection = self._call(self._acquire(), "start_stream")
+        try:
+            for chunk in file.chunks():
+                if digest is not None:
+                    digest.update(chunk)
+                connection = self._call(connection, "feed", chunk)
+                for consumer in consumers:
+                    consumer(chunk)
+                yield chunk
+        except BaseException:
+            if connection is not None:
+                connection.close()
+            raise
+        reply = None
+        if connection is not None:
+            try:
+                reply = connection.end_stream()
+            except OSError:
+                connection.close()
+
+        if reply is None:
+            # The pooled session was closed by clamd, scan the file again on a new connection
+            file.seek(0)
+            connection = self._connect()
+            try:
+                connection.start_stream()
+                for chunk in file.chunks():
+                    connection.feed(chunk)
+                reply = connection.end_stream()
+            except OSError:
+                connection.close()
+                raise
+        try:
+            signature = _parse_reply(reply)
+        except ClamdScanError:
+            # clamd ends the session on errors such as exceeding StreamMaxLength
+            connection.close()
+            raise
+        self._release(connection)
+        return signature
+
+    def _call(self, connection, method, *args):
+        """Calls a method of a connection, returns None instead of the connection if it failed"""
+        if connection is None:
+            return None
+        try:
+            getattr(connection, method)(*args)
+            return connection
+        except OSError:
+            connection.close()
+            return None
+
+    def _connect(self):
+        return ClamdConnection(self.host, self.port, self.timeout)
+
+    def _acquire(self):
+        while True:
+            try:
+                connection = self._pool.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - connection.last_used < self.idle_timeout:
+                return connection
+            connection.close()
+
+    def _release(self, connection):
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _record(self, hit, scan_time=0.0):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.scans += 1
+                self.scan_time += scan_time
+                self.max_scan_time = max(self.max_scan_time, scan_time)
+                for i, bound in enumerate(self.SCAN_TIME_BUCKETS):
+                    if scan_time <= bound:
+                        self.scan_time_buckets[i] += 1
+        _log.debug('Scan %s', 'cache hit' if hit else f'took {scan_time:.3f}s')
+
+    def stats(self) -> dict:
+        """Counters of this worker, the scan time histogram is cumulative like a Prometheus histogram"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'scans': self.scans,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'scan_time_sum': self.scan_time,
+                'average_scan_time': self.scan_time / self.scans if self.scans else 0.0,
+                'max_scan_time': self.max_scan_time,
+                'scan_time_buckets': {
+                    **{str(bound): count for bound, count in zip(self.SCAN_TIME_BUCKETS, self.scan_time_buckets)},
+                    '+Inf': self.scans,
+                },
+            }
+
+
+scanner = ClamdScanner(
+    host=settings.CLAMAV_CONFIG['CLAMAV_HOST'],
+    port=settings.CLAMAV_CONFIG['CLAMAV_PORT'],
+    pool_size=settings.CLAMAV_CONFIG['CLAMAV_POOL_SIZE'],
+    max_concurrent_scans=settings.CLAMAV_CONFIG['CLAMAV_MAX_CONCURRENT_SCANS'],
+    # Shared between the workers when Redis is configured, so a file is scanned once for all of them
+    cache=caches[settings.SHARED_CACHE],
+    cache_ttl=settings.CLAMAV_CONFIG['CLAMAV_VERDICT_CACHE_TTL'],
+)
@@ -0,0 +1,53 @@
+import hashlib
+from functools import wraps
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from utils.keycloak_auth import get_current_user_id
+
+
+def _matches(etag: str, if_none_match: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # GZipMiddleware turns the ETags of compressed responses into weak ones
+    return etag in (tag.removeprefix("W/") for tag in parse_etags(if_none_match))
+
+
+def conditional_get(version_token=None):
+    """Decorator of the GET handlers of DRF views answering `If-None-Match` with a 304 before building the response
+
+    `version_token(view, request, *args, **kwargs)`, by default the `get_version_token(request, *args, **kwargs)`
+    method of the view, returns a cheap token of the state the response is built from (e.g. the last update time
+    of the listed objects), or None to build the response as usual. The ETag of the response is derived from the
+    token, the user and the request URL.
+    """
+    if version_token is None:
+        def version_token(view, request, *args, **kwargs):
+            return view.get_version_token(request, *args, **kwargs)
+
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            try:
+                token = version_token(view, request, *args, **kwargs)
+            except Exception:
+                token = None
+            if token is None:
+                return handler(view, request, *args, **kwargs)
+
+            digest = hashlib.sha256(
+                f"{token}|{get_current_user_id(request)}|{request.get_full_path()}".encode()
+            ).hexdigest()[:32]
+            etag = f'"{digest}"'
+            if_none_match = request.headers.get("If-None-Match")
+            if if_none_match and _matches(etag, if_none_match):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+            response = handler(view, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                response["ETag"] = etag
+                # Browsers keep the response but revalidate it on every request
+                response["Cache-Control"] = "private, no-cache"
+            return response
+        return wrapper
+    return decorator
@@ -1,4 +1,6 @@
-from keycloak import KeycloakAdmin, KeycloakOpenID
+import threading
+from datetime import datetime
+from keycloak import KeycloakAdmin, KeycloakOpenID, KeycloakOpenIDConnection
 from django.conf import settings
 from typing import Union
 from core.user_id import get_current_user_id, get_current_user_name
@@ -26,15 +28,50 @@ def get_current_user_name(request):
     else:
         return get_current_user_name() or get_current_user_id()
 
-def get_keycloak_admin():
-    config = settings.KEYCLOAK_CONFIG
-    return KeycloakAdmin(
-        server_url=config['KEYCLOAK_INTERNAL_SERVER_URL'] + "/auth",
-        username=config['KEYCLOAK_ADMIN_USERNAME'],
-        password=config['KEYCLOAK_ADMIN_PASSWORD'],
-        realm_name=config['KEYCLOAK_REALM'],
-        user_realm_name="master",
-        verify=False)
+class SharedKeycloakConnection(KeycloakOpenIDConnection):
+    """Keep-alive admin connection whose token is refreshed (before it expires) by one thread at a time"""
+    def __init__(self, *args, **kwargs):
+        self._refresh_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _refresh_if_required(self):
+        if datetime.now() >= self.expires_at:
+            with self._refresh_lock:
+                if datetime.now() >= self.expires_at:
+                    self.refresh_token()
+
+
+class SharedKeycloakAdmin(KeycloakAdmin):
+    """KeycloakAdmin memoizing lookups that never change during the life of the process"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._client_ids = {}
+
+    def get_client_id(self, client_id):
+        if client_id not in self._client_ids:
+            self._client_ids[client_id] = super().get_client_id(client_id)
+        return self._client_ids[client_id]
+
+
+_keycloak_admin = None
+_keycloak_admin_lock = threading.Lock()
+
+def get_keycloak_admin() -> KeycloakAdmin:
+    """Returns the process-wide Keycloak admin client, reusing its connection and admin token"""
+    global _keycloak_admin
+    if _keycloak_admin is None:
+        with _keycloak_admin_lock:
+            if _keycloak_admin is None:
+                config = settings.KEYCLOAK_CONFIG
+                connection = SharedKeycloakConnection(
+                    server_url=config['KEYCLOAK_INTERNAL_SERVER_URL'] + "/auth",
+                    username=config['KEYCLOAK_ADMIN_USERNAME'],
+                    password=config['KEYCLOAK_ADMIN_PASSWORD'],
+                    realm_name=config['KEYCLOAK_REALM'],
+                    user_realm_name="master",
+                    verify=False)
+                _keycloak_admin = SharedKeycloakAdmin(connection=connection)
+    return _keycloak_admin
 
 
 def get_keycloak_openid(request = None) -> KeycloakOpenID:
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.cache import caches
+from jose import jwt
+from typing import Iterable, Union
+from utils.keycloak_auth import get_keycloak_admin, get_current_user_id
+
+
+# Shared between workers when a Keycloak cache (Redis) is configured, so that invalidations reach all of them
+cache = caches[settings.KEYCLOAK_CONFIG.get('KEYCLOAK_PERMISSION_CACHE') or 'default']
+
+
+def _cache_key(user_id: str) -> str:
+    return f'user_roles_{user_id}'
+
+
+def get_user_roles(user_id: str) -> dict:
+    """Returns the realm and client roles of a user, as `{'realm': [...], 'client': [...]}` role representations
+
+    Roles are cached for KEYCLOAK_ROLE_CACHE_TTL seconds, use `invalidate_user_roles` after changing them.
+    """
+    roles = cache.get(_cache_key(user_id))
+    if roles is None:
+        keycloak_admin = get_keycloak_admin()
+        client_id = keycloak_admin.get_client_id(settings.KEYCLOAK_CONFIG['KEYCLOAK_CLIENT_ID'])
+        roles = {
+            'realm': keycloak_admin.get_realm_roles_of_user(user_id=user_id),
+            'client': keycloak_admin.get_client_roles_of_user(user_id=user_id, client_id=client_id),
+        }
+        cache.set(_cache_key(user_id), roles, settings.KEYCLOAK_CONFIG.get('KEYCLOAK_ROLE_CACHE_TTL', 60))
+    return roles
+
+
+def invalidate_user_roles(user_id: str):
+    cache.delete(_cache_key(user_id))
+
+
+def _get_token_roles(request) -> Union[set, None]:
+    """Returns the role names carried by the bearer token of a request already authenticated by KeycloakMiddleware"""
+    if not hasattr(request, 'userinfo') or 'HTTP_AUTHORIZATION' not in request.META:
+        return None
+    auth_header = request.META['HTTP_AUTHORIZATION'].split()
+    token = auth_header[1] if len(auth_header) == 2 else auth_header[0]
+    try:
+        claims = jwt.get_unverified_claims(token)
+    except jwt.JWTError:
+        return None
+    if 'realm_access' not in claims and 'resource_access' not in claims:
+        return None
+    client_access = claims.get('resource_access', {}).get(settings.KEYCLOAK_CONFIG['KEYCLOAK_CLIENT_ID'], {})
+    return set(claims.get('realm_access', {}).get('roles', [])) | set(client_access.get('roles', []))
+
+
+def user_has_role(request, role_names: Iterable[str]) -> bool:
+    """Checks if the user making the request has one of `role_names`, from the token claims when available"""
+    role_names = set(role_names)
+    token_roles = _get_token_roles(request)
+    if token_roles is not None:
+        return not token_roles.isdisjoint(role_names)
+    roles = get_user_roles(get_current_user_id(request))
+    return any(role['name'] in role_names for role in roles['realm'] + roles['client'])
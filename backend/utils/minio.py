@@ -1,15 +1,157 @@
 from datetime import timedelta
 from minio import Minio
+from utils.clamav import file_sha256, scanner
+from itertools import islice
+from urllib.parse import urlparse
 import os
 
 class MinioInstance:
     url=os.getenv("MINIO_URL")
     access_key=os.getenv("MINIO_ACCESS_KEY")
     secret_key=os.getenv("MINIO_SECRET_KEY")
+    # URL of MinIO reachable by browsers, e.g. https://minio.example.org, to presign download URLs
+    public_url=os.getenv("MINIO_PUBLIC_URL")
     
 client = Minio(
     MinioInstance.url,
     access_key=MinioInstance.access_key,
     secret_key=MinioInstance.secret_key,
     secure=False
-)
\ No newline at end of file
+)
+
+# Presigned URLs are signed for the host they are sent to, so they need a client of the public URL.
+# The region is given so that presigning does not query the (possibly unreachable) public URL.
+presign_client = Minio(
+    urlparse(MinioInstance.public_url).netloc,
+    access_key=MinioInstance.access_key,
+    secret_key=MinioInstance.secret_key,
+    secure=urlparse(MinioInstance.public_url).scheme == "https",
+    region=os.getenv("MINIO_REGION", "us-east-1"),
+) if MinioInstance.public_url else None
+
+def iter_objects(bucket_name, prefix=None, start_after=None, suffix=None, recursive=False,
+                 include_user_meta=False, page_size=1000):
+    """Lists the objects of a prefix `page_size` keys per request, stop iterating to stop listing
+
+    Objects can be filtered on a name `suffix`. S3 has no such filter, so it is applied while listing.
+    """
+    # The public list_objects cannot set max_keys, hence minio being pinned to an exact version in requirements.txt
+    objects = client._list_objects(
+        bucket_name,
+        delimiter=None if recursive else "/",
+        include_user_meta=include_user_meta,
+        max_keys=page_size,
+        prefix=prefix,
+        start_after=start_after,
+        encoding_type="url",
+    )
+    for object in objects:
+        if suffix is None or object.object_name.endswith(suffix):
+            yield object
+
+
+def list_objects_page(bucket_name, prefix=None, limit=100, cursor=None, suffix=None, recursive=False,
+                      include_user_meta=False):
+    """Returns a page of at most `limit` objects after the `cursor` object name, and the cursor of the next page
+
+    Only the keys needed for the page are listed, the next cursor is None on the last page.
+    """
+    objects = list(islice(
+        iter_objects(
+            bucket_name,
+            prefix=prefix,
+            start_after=cursor,
+            suffix=suffix,
+            recursive=recursive,
+            include_user_meta=include_user_meta,
+            page_size=min(limit + 1, 1000),
+        ),
+        limit + 1,
+    ))
+    if len(objects) <= limit:
+        return objects, None
+    return objects[:limit], objects[limit - 1].object_name
+
+
+# S3 requires all the parts of a multipart upload, but the last one, to be at least 5 MiB
+MULTIPART_PART_SIZE = 5 * 1024 * 1024
+
+
+class InfectedUpload(Exception):
+    def __init__(self, signature):
+        super().__init__(f"Malicious file: {signature}")
+        self.signature = signature
+
+
+class ScanningReader:
+    """Reader of a file for `put_object`, scanning it with clamd and giving its chunks to consumers as it is read
+
+    `InfectedUpload` is raised instead of the end of the file when a signature is found, so that `put_object`
+    stops before completing the upload and nothing is visible in the bucket.
+    """
+
+    def __init__(self, file, consumers=(), sha256=None):
+        self._scan = scanner.iter_scan(file, consumers, sha256=sha256)
+        self._buffer = bytearray()
+
+    def read(self, size=-1) -> bytes:
+        while self._scan is not None and (size < 0 or len(self._buffer) < size):
+            try:
+                self._buffer += next(self._scan)
+            except StopIteration as stop:
+                self._scan = None
+                if stop.value is not None:
+                    raise InfectedUpload(stop.value)
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def close(self):
+        # Releases the clamd session when the upload failed before the end of the file
+        if self._scan is not None:
+            self._scan.close()
+            self._scan = None
+
+
+class ObjectFile:
+    """Object read with the `chunks()` interface of Django files, each call streams the object again"""
+
+    def __init__(self, bucket_name, object_name, chunk_size=64 * 1024):
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.chunk_size = chunk_size
+
+    def chunks(self):
+        response = client.get_object(self.bucket_name, self.object_name)
+        try:
+            yield from response.stream(self.chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
+
+    def seek(self, offset):
+        pass
+
+
+def upload_scanned_file(uploaded_file, bucket_name, object_name, content_type="application/octet-stream",
+                        metadata=None, consumers=()):
+    """Streams an uploaded file to clamd and to MinIO at once
+
+    Every chunk is also given to the `consumers` callables. The object is only completed when the file is
+    clean, returns the signature found (None when clean) and the upload result (None when infected).
+    The file is read twice: it is hashed first, so that a file whose verdict is cached is not scanned again.
+    It has been fully received in memory or in a temporary file, so this read is cheap next to a scan.
+    """
+    reader = ScanningReader(uploaded_file, consumers, sha256=file_sha256(uploaded_file))
+    try:
+        result = client.put_object(
+            bucket_name, object_name, reader, length=-1, part_size=MULTIPART_PART_SIZE,
+            content_type=content_type, metadata=metadata,
+        )
+    except InfectedUpload as e:
+        return e.signature, None
+    finally:
+        reader.close()
+    return None, result